@@ -1,40 +1,81 @@
+import asyncio
+import hashlib
+import json
 import logging
+import time
 import typing
 from datetime import datetime
+from pathlib import Path
 
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableConfig
 from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import StateGraph
 from langgraph.graph.graph import CompiledGraph
-from langgraph.prebuilt import ToolNode
 from mem0 import Memory
 
-from app import prompts, schemas, utils
+from app import instrumentation, prompts, schemas, utils
+from app.cache import CACHEABLE_TOOLS, CacheLookup, SemanticCache
 from app.config import AgentConfiguration, settings
-from app.tools import AgentToolkit
+from app.knowledge_base import KnowledgeBaseIndex, get_knowledge_base_index
+from app.memory import get_ingestion_queue
+from app.recall import get_recall_cache, recall_lookups
+from app.tools import AgentToolkit, ConcurrentToolNode
 
 logger = logging.getLogger(__name__)
 
 
 class Agent:
     def __init__(
-        self, llm: BaseChatModel, checkpoint: BaseCheckpointSaver[str], memory: Memory
+        self,
+        llm: BaseChatModel,
+        checkpoint: BaseCheckpointSaver[str],
+        memory: Memory,
+        knowledge_base: KnowledgeBaseIndex | None = None,
     ):
         self._llm = llm
+        self._max_tokens = typing.cast(int | None, getattr(llm, "max_tokens", None))
         self._checkpoint = checkpoint
-        self._memory_store = memory
+        self._memory_queue = get_ingestion_queue(memory)
+        self._knowledge_base = knowledge_base or get_knowledge_base_index()
+        self._cache = (
+            SemanticCache(
+                self._knowledge_base.embeddings,
+                threshold=settings.semantic_cache_threshold,
+                max_entries=settings.semantic_cache_max_entries,
+                ttl=settings.semantic_cache_ttl_seconds,
+            )
+            if settings.semantic_cache_enabled
+            else None
+        )
         self._graph = self._setup_graph()
 
+    @property
+    def cache(self) -> SemanticCache | None:
+        return self._cache
+
     async def stream(
         self, message: str, config: RunnableConfig
     ) -> typing.AsyncIterator[str]:
+        config, _ = instrumentation.instrument(config)
+        started = time.perf_counter()
+        lookup = await self._cache_lookup(message, config)
+        if lookup is not None and lookup.entry is not None:
+            await self._save_cached_turn(message, lookup.entry.answer, config)
+            instrumentation.first_chunk_seconds.observe(time.perf_counter() - started)
+            instrumentation.turn_seconds.observe(
+                time.perf_counter() - started, cached="true"
+            )
+            yield lookup.entry.answer
+            return
+
         inputs = {
             "messages": [HumanMessage(content=message)],
             "today": datetime.now().isoformat(),
         }
+        first_chunk = True
         async for msg, metadata in self._graph.astream(
             inputs,
             config=config,
@@ -42,34 +83,137 @@ class Agent:
         ):
             msg = typing.cast(BaseMessage, msg)
             metadata = typing.cast(dict[str, typing.Any], metadata)
+            # empty and tool call chunks are the most common, skipped first
+            content = msg.content
             if (
-                msg.content
-                and not isinstance(msg, HumanMessage)
-                and metadata["langgraph_node"] == "agent"
+                not content
+                or metadata["langgraph_node"] != "agent"
+                or isinstance(msg, HumanMessage)
             ):
-                yield utils.get_message_text(msg)
+                continue
+            if first_chunk:
+                first_chunk = False
+                instrumentation.first_chunk_seconds.observe(
+                    time.perf_counter() - started
+                )
+            yield content if isinstance(content, str) else utils.get_message_text(msg)
+
+        if lookup is not None:
+            state = await self._graph.aget_state(config)
+            self._cache_turn(lookup, message, state.values)
+        instrumentation.turn_seconds.observe(
+            time.perf_counter() - started, cached="false"
+        )
 
     async def invoke(self, message: str, config: RunnableConfig) -> str:
+        config, _ = instrumentation.instrument(config)
+        started = time.perf_counter()
+        lookup = await self._cache_lookup(message, config)
+        if lookup is not None and lookup.entry is not None:
+            await self._save_cached_turn(message, lookup.entry.answer, config)
+            instrumentation.turn_seconds.observe(
+                time.perf_counter() - started, cached="true"
+            )
+            return lookup.entry.answer
+
         inputs = {
             "messages": [HumanMessage(content=message)],
             "today": datetime.now().isoformat(),
         }
         reply = await self._graph.ainvoke(inputs, config)
+
+        if lookup is not None:
+            self._cache_turn(lookup, message, reply)
+        instrumentation.turn_seconds.observe(
+            time.perf_counter() - started, cached="false"
+        )
         return utils.get_message_text(reply["messages"][-1])
 
+    async def _cache_lookup(
+        self, message: str, config: RunnableConfig
+    ) -> CacheLookup | None:
+        """Look ``message`` up in the semantic cache on a thread's first turn.
+
+        Later messages may refer to the conversation, e.g. "and to Canada?",
+        so their turns are neither answered from nor added to the cache.
+        Answers are scoped to the session's model and its settings.
+        """
+        if self._cache is None:
+            return None
+        state = await self._graph.aget_state(config)
+        if state.values.get("messages"):
+            return None
+        cfg = AgentConfiguration.from_runnable_config(config)
+        scope = json.dumps({"model": cfg.model, **cfg.model_kwargs()}, sort_keys=True)
+        return await self._cache.alookup(message, scope)
+
+    async def _save_cached_turn(
+        self, message: str, answer: str, config: RunnableConfig
+    ) -> None:
+        """Record a turn answered from the cache in the thread's history."""
+        await self._graph.aupdate_state(
+            config,
+            {"messages": [HumanMessage(content=message), AIMessage(content=answer)]},
+            as_node="save_memories",
+        )
+
+    def _cache_turn(
+        self,
+        lookup: CacheLookup,
+        message: str,
+        state: dict[str, typing.Any],
+    ) -> None:
+        """Cache the turn's answer if it only relied on user-independent tools.
+
+        Recalled memories are in the prompt, so an answer written with any may
+        hold the user's personal details and is never shared.
+        """
+        if state.get("recall_memories"):
+            return
+        messages: typing.Sequence[BaseMessage] = state["messages"]
+        turn: list[BaseMessage] = []
+        for msg in reversed(messages):
+            if isinstance(msg, HumanMessage):
+                break
+            turn.append(msg)
+
+        tools_used = {
+            tool_call["name"]
+            for msg in turn
+            if isinstance(msg, AIMessage)
+            for tool_call in msg.tool_calls
+        }
+        # answers without a knowledge base lookup depend on the conversation
+        if not tools_used or not tools_used <= CACHEABLE_TOOLS or not turn:
+            return
+
+        answer = utils.get_message_text(turn[0])
+        if answer:
+            typing.cast(SemanticCache, self._cache).add(lookup, message, answer)
+
     def _setup_graph(self) -> CompiledGraph:
-        agent_tools = AgentToolkit(llm=self._llm).get_tools()
+        agent_tools = AgentToolkit(
+            llm=self._llm, knowledge_base=self._knowledge_base
+        ).get_tools()
 
         system_prompt = ChatPromptTemplate.from_messages(
             [
                 ("system", prompts.AGENT_PROMPT),
-                ("system", "Today is {today}"),
+                ("system", "Today is {today}\n{recall_memory}"),
                 ("placeholder", "{messages}"),
             ]
         )
-        self._model = system_prompt | self._llm.bind_tools(agent_tools)
+        self._prompt = system_prompt
+        self._llm_with_tools = self._llm.bind_tools(agent_tools)
+        self._model = system_prompt | self._llm_with_tools
 
-        tool_node = ToolNode(agent_tools)
+        tool_node = ConcurrentToolNode(
+            agent_tools,
+            timeouts=settings.tool_timeouts,
+            default_timeout=settings.tool_timeout_seconds,
+            concurrency=settings.tool_concurrency,
+            default_concurrency=settings.tool_max_concurrency,
+        )
         workflow = StateGraph(schemas.State)
         workflow.add_node("agent", self._call_model)
         workflow.add_node("tools", tool_node)
@@ -87,30 +231,114 @@ class Agent:
         workflow.add_edge("tools", "agent")
         workflow.set_finish_point("save_memories")
 
-        graph = workflow.compile(checkpointer=self._checkpoint, debug=settings.debug)
-        graph_bytes = graph.get_graph().draw_mermaid_png()
+        return workflow.compile(checkpointer=self._checkpoint, debug=settings.debug)
+
+    def graph_topology_hash(self) -> str:
+        """Hash of the graph nodes and edges, independent of the bound model."""
+        drawable = self._graph.get_graph()
+        topology = {
+            "nodes": sorted(drawable.nodes),
+            "edges": sorted(
+                [edge.source, edge.target, edge.conditional] for edge in drawable.edges
+            ),
+        }
+        return hashlib.sha256(json.dumps(topology, sort_keys=True).encode()).hexdigest()
+
+    def export_graph(self, force: bool = False) -> Path | None:
+        """Render the graph to ``graphs_dir`` when its topology has changed.
 
+        Rendering is slow and the default Mermaid renderer calls a remote API,
+        so this is only run from the ``export-graph`` command or once at startup.
+
+        Args:
+            force (bool, optional): Render even if the topology is unchanged.
+        """
         file_name = settings.graphs_dir / "graph.png"
+        hash_file = file_name.with_suffix(".sha256")
+        topology_hash = self.graph_topology_hash()
+
+        if (
+            not force
+            and file_name.exists()
+            and hash_file.exists()
+            and hash_file.read_text().strip() == topology_hash
+        ):
+            logger.debug("Agent graph is up to date at %s", file_name)
+            return None
+
+        graph_bytes = self._graph.get_graph().draw_mermaid_png()
         with open(file_name, "wb") as f:
             f.write(graph_bytes)
+        hash_file.write_text(topology_hash + "\n")
         logger.info("Saved agent graph to %s", file_name)
 
-        return graph
+        return file_name
 
-    def _call_model(
+    async def _call_model(
         self, state: schemas.State, config: RunnableConfig
-    ) -> dict[str, typing.Sequence[BaseMessage]]:
-        messages = utils.trim_agent_messages(state["messages"])
+    ) -> dict[str, typing.Any]:
+        cfg = AgentConfiguration.from_runnable_config(config)
+        # a new user message starts a memory search, run while the history is
+        # trimmed, so the model sees the memories without a search tool call
+        last_message = state["messages"][-1]
+        recall = None
+        if settings.recall_memory_enabled and isinstance(last_message, HumanMessage):
+            recall = asyncio.ensure_future(
+                get_recall_cache().search(
+                    cfg.memory_store,
+                    cfg.user_id,
+                    utils.get_message_text(last_message),
+                )
+            )
 
-        response = self._model.invoke(
+        # loading a tokenizer the first time may download it
+        token_counter = await utils.run_blocking(utils.get_token_counter, cfg.model)
+        messages = utils.trim_agent_messages(
+            state["messages"],
+            max_tokens=utils.get_history_budget(
+                cfg.model, cfg.max_tokens or self._max_tokens
+            ),
+            token_counter=token_counter,
+        )
+        recall_memories = (
+            await self._await_recall(recall)
+            if recall is not None
+            else state.get("recall_memories", [])
+        )
+
+        model = self._model
+        model_kwargs = cfg.model_kwargs()
+        if model_kwargs:
+            # bound for this call only, the agent is shared across sessions
+            model = self._prompt | self._llm_with_tools.bind(**model_kwargs)
+        response = await model.ainvoke(
             {
                 "messages": messages,
                 "today": datetime.now().isoformat(),
+                "recall_memory": utils.prepare_recall_memory(recall_memories),
             },
             config,
         )
         # We return a list, because this will get added to the existing list
-        return {"messages": [response]}
+        return {"messages": [response], "recall_memories": recall_memories}
+
+    @staticmethod
+    async def _await_recall(recall: asyncio.Future[list[str]]) -> list[str]:
+        """Wait for the memory search, answering without memories if it fails."""
+        try:
+            # shielded, so a slow search still fills the cache for next time
+            return await asyncio.wait_for(
+                asyncio.shield(recall), settings.recall_memory_timeout_seconds
+            )
+        except TimeoutError:
+            # retrieve a late failure so it is not reported as never retrieved
+            recall.add_done_callback(lambda f: f.cancelled() or f.exception())
+            recall_lookups.inc(result="timeout")
+            logger.warning("Memory recall timed out, answering without it")
+        except Exception:
+            recall_lookups.inc(result="error")
+            logger.exception("Memory recall failed, answering without it")
+        return []
 
     @staticmethod
     def _should_continue(
@@ -121,11 +349,19 @@ class Agent:
             return "tools"
         return "save_memories"
 
-    def _save_memories(self, state: schemas.State, config: RunnableConfig) -> None:
+    async def _save_memories(
+        self, state: schemas.State, config: RunnableConfig
+    ) -> dict[str, typing.Any]:
         cfg = AgentConfiguration.from_runnable_config(config)
-        messages = utils.prepare_memory_messages(state["messages"])
-
-        self._memory_store.add(messages, user_id=cfg.user_id)
+        messages = state["messages"]
+        saved_id = state.get("saved_message_id")
+        start = next(
+            (idx + 1 for idx, msg in enumerate(messages) if msg.id == saved_id), 0
+        )
+        # mem0 runs its own LLM and embedding calls, which do not change the
+        # reply, so they are persisted in the background
+        self._memory_queue.enqueue(cfg.user_id, cfg.thread_id, messages[start:])
+        return {"saved_message_id": messages[-1].id}
 
     def get_state(self, user_id: str, thread_id: str) -> dict[str, typing.Any]:
         config = RunnableConfig(
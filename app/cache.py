@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+import typing
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+Vector = npt.NDArray[np.float32]
+
+# tools whose results are the same for every user, answers built only from
+# them can be reused across sessions
+CACHEABLE_TOOLS = frozenset({"company_knowledge_base"})
+
+
+@dataclass
+class CacheEntry:
+    query: str
+    answer: str
+    created_at: float
+
+
+@dataclass
+class CacheLookup:
+    vector: Vector
+    entry: CacheEntry | None = None
+    score: float = 0.0
+    scope: str = ""
+
+
+class SemanticCache:
+    """Answers to past questions, looked up by embedding similarity.
+
+    Query vectors are normalised and kept in a preallocated NumPy matrix, so a
+    lookup is a single matrix-vector product. Answers are only reused within
+    the ``scope`` they were added for, such as the model that wrote them.
+    Entries expire after ``ttl`` seconds and the least recently used entry is
+    replaced once the cache holds ``max_entries`` answers.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        threshold: float = 0.92,
+        max_entries: int = 1024,
+        ttl: float | None = 3600,
+    ) -> None:
+        self._embeddings = embeddings
+        self._threshold = threshold
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._vectors: Vector | None = None
+        self._valid = np.zeros(max_entries, dtype=bool)
+        # slot -> id of the entry's scope, ids are assigned in ``_scope_ids``
+        self._scopes = np.full(max_entries, -1, dtype=np.int32)
+        self._scope_ids: dict[str, int] = {}
+        # slot -> entry, ordered from least to most recently used
+        self._entries: OrderedDict[int, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    async def alookup(self, query: str, scope: str = "") -> CacheLookup:
+        vector = self._normalize(await self._embeddings.aembed_query(query))
+        with self._lock:
+            lookup = self._search(vector, scope)
+        if lookup.entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            logger.debug("Semantic cache hit (%.3f) for %r", lookup.score, query)
+        return lookup
+
+    def add(self, lookup: CacheLookup, query: str, answer: str) -> None:
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros(
+                    (self._max_entries, lookup.vector.shape[0]), dtype=np.float32
+                )
+
+            free = np.flatnonzero(~self._valid)
+            if free.size:
+                slot = int(free[0])
+            else:
+                slot, _ = self._entries.popitem(last=False)
+
+            self._vectors[slot] = lookup.vector
+            self._valid[slot] = True
+            self._scopes[slot] = self._scope_ids.setdefault(
+                lookup.scope, len(self._scope_ids)
+            )
+            self._entries[slot] = CacheEntry(query, answer, time.monotonic())
+
+    def _search(self, vector: Vector, scope: str) -> CacheLookup:
+        scope_id = self._scope_ids.get(scope)
+        if self._vectors is None or not self._entries or scope_id is None:
+            return CacheLookup(vector, scope=scope)
+
+        scores = self._vectors @ vector
+        scores[~self._valid | (self._scopes != scope_id)] = -1.0
+        slot = int(np.argmax(scores))
+        score = float(scores[slot])
+        if score < self._threshold:
+            return CacheLookup(vector, score=score, scope=scope)
+
+        entry = self._entries[slot]
+        if self._ttl is not None and time.monotonic() - entry.created_at > self._ttl:
+            del self._entries[slot]
+            self._valid[slot] = False
+            return CacheLookup(vector, score=score, scope=scope)
+
+        self._entries.move_to_end(slot)
+        return CacheLookup(vector, entry, score, scope)
+
+    @staticmethod
+    def _normalize(vector: typing.Sequence[float]) -> Vector:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return typing.cast(Vector, array / norm) if norm else array
@@ -0,0 +1,666 @@
+import builtins
+import hashlib
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+import typing
+import weakref
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.types import TASKS
+
+from app.sqlite import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS threads_last_access ON threads (last_access);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    thread_id TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB NOT NULL,
+    PRIMARY KEY (thread_id, digest)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB NOT NULL,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+# blob types that are not produced by the serializer
+EMPTY_BLOB = "empty"
+MESSAGES_BLOB = "messages"
+
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver[str]):
+    """Checkpointer backed by a local SQLite database.
+
+    Checkpoints only store the channels that changed since their parent, one
+    row per channel version, and message lists are stored as digests of
+    messages kept once per thread, so a long conversation does not copy its
+    whole history on every step. Only the messages added since the previous
+    step are serialized. Storage is bounded by keeping the latest
+    ``max_checkpoints_per_thread`` checkpoints and evicting threads idle for
+    longer than ``ttl`` or beyond ``max_threads``, least recently written first.
+
+    The database runs in WAL mode, so several workers can share one file.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        *,
+        serde: SerializerProtocol | None = None,
+        ttl: float | None = None,
+        max_threads: int | None = None,
+        max_checkpoints_per_thread: int = 20,
+        prune_batch: int = 10,
+        eviction_interval: int = 100,
+    ) -> None:
+        super().__init__(serde=serde)
+        self._pool = pool
+        self._ttl = ttl
+        self._max_threads = max_threads
+        self._max_checkpoints_per_thread = max_checkpoints_per_thread
+        self._prune_batch = prune_batch
+        self._eviction_interval = eviction_interval
+        self._puts = 0
+        self._lock = threading.Lock()
+        # (thread id, message id) -> message and digest, while the message lives
+        self._digests: dict[tuple[str, str], tuple[weakref.ref[BaseMessage], str]] = {}
+        self._pool.run(self._setup, write=True)
+
+    @staticmethod
+    def _setup(conn: sqlite3.Connection) -> None:
+        for statement in SCHEMA.split(";"):
+            conn.execute(statement)
+
+    # sync API
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return self._pool.run(lambda conn: self._get_tuple(conn, config))
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, typing.Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> typing.Iterator[CheckpointTuple]:
+        yield from self._pool.run(
+            lambda conn: self._list(conn, config, filter, before, limit)
+        )
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = self._pool.run(
+            lambda conn: self._put(conn, config, checkpoint, metadata, new_versions),
+            write=True,
+        )
+        if self._should_evict():
+            self._pool.run(self._evict, write=True)
+        return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: typing.Sequence[tuple[str, typing.Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self._pool.run(
+            lambda conn: self._put_writes(conn, config, writes, task_id, task_path),
+            write=True,
+        )
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._pool.run(lambda conn: self._delete_threads(conn, [thread_id]), True)
+
+    # async API
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await self._pool.arun(lambda conn: self._get_tuple(conn, config))
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, typing.Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> typing.AsyncIterator[CheckpointTuple]:
+        items = await self._pool.arun(
+            lambda conn: self._list(conn, config, filter, before, limit)
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = await self._pool.arun(
+            lambda conn: self._put(conn, config, checkpoint, metadata, new_versions),
+            write=True,
+        )
+        if self._should_evict():
+            await self._pool.arun(self._evict, write=True)
+        return next_config
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: typing.Sequence[tuple[str, typing.Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await self._pool.arun(
+            lambda conn: self._put_writes(conn, config, writes, task_id, task_path),
+            write=True,
+        )
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self._pool.arun(
+            lambda conn: self._delete_threads(conn, [thread_id]), True
+        )
+
+    def get_next_version(self, current: str | None, channel: typing.Any) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # queries
+
+    def _get_tuple(
+        self, conn: sqlite3.Connection, config: RunnableConfig
+    ) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = (
+            "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint,"
+            " metadata_type, metadata FROM checkpoints"
+            " WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        params: tuple[str, ...] = (thread_id, checkpoint_ns)
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id = ?"
+            params += (checkpoint_id,)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+
+        row = conn.execute(query, params).fetchone()
+        if row is None:
+            return None
+        return self._load_tuple(conn, thread_id, checkpoint_ns, row)
+
+    def _list(
+        self,
+        conn: sqlite3.Connection,
+        config: RunnableConfig | None,
+        filter: dict[str, typing.Any] | None,
+        before: RunnableConfig | None,
+        limit: int | None,
+    ) -> builtins.list[CheckpointTuple]:
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,"
+            " type, checkpoint, metadata_type, metadata FROM checkpoints WHERE 1 = 1"
+        )
+        params: builtins.list[str] = []
+        if config is not None:
+            query += " AND thread_id = ?"
+            params.append(config["configurable"]["thread_id"])
+            if (
+                checkpoint_ns := config["configurable"].get("checkpoint_ns")
+            ) is not None:
+                query += " AND checkpoint_ns = ?"
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(checkpoint_id)
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            query += " AND checkpoint_id < ?"
+            params.append(before_id)
+        query += " ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC"
+
+        results: builtins.list[CheckpointTuple] = []
+        for thread_id, checkpoint_ns, *row in conn.execute(query, params).fetchall():
+            if limit is not None and len(results) >= limit:
+                break
+            metadata = self.serde.loads_typed((row[4], row[5]))
+            if filter and not all(metadata.get(k) == v for k, v in filter.items()):
+                continue
+            results.append(self._load_tuple(conn, thread_id, checkpoint_ns, row))
+        return results
+
+    def _load_tuple(
+        self,
+        conn: sqlite3.Connection,
+        thread_id: str,
+        checkpoint_ns: str,
+        row: typing.Sequence[typing.Any],
+    ) -> CheckpointTuple:
+        checkpoint_id, parent_id, type_, blob, metadata_type, metadata = row
+        checkpoint = self.serde.loads_typed((type_, blob))
+        checkpoint["channel_values"] = self._load_channel_values(
+            conn, thread_id, checkpoint_ns, checkpoint["channel_versions"]
+        )
+
+        pending_sends = []
+        if parent_id:
+            pending_sends = [
+                self.serde.loads_typed((w_type, w_blob))
+                for w_type, w_blob in conn.execute(
+                    "SELECT type, blob FROM writes WHERE thread_id = ?"
+                    " AND checkpoint_ns = ? AND checkpoint_id = ? AND channel = ?"
+                    " ORDER BY task_path, task_id, idx",
+                    (thread_id, checkpoint_ns, parent_id, TASKS),
+                )
+            ]
+        checkpoint["pending_sends"] = pending_sends
+
+        pending_writes = [
+            (task_id, channel, self.serde.loads_typed((w_type, w_blob)))
+            for task_id, channel, w_type, w_blob in conn.execute(
+                "SELECT task_id, channel, type, blob FROM writes WHERE thread_id = ?"
+                " AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            )
+        ]
+
+        def config_for(checkpoint_id: str) -> RunnableConfig:
+            return {
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            }
+
+        return CheckpointTuple(
+            config=config_for(checkpoint_id),
+            checkpoint=checkpoint,
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=config_for(parent_id) if parent_id else None,
+            pending_writes=pending_writes,
+        )
+
+    def _load_channel_values(
+        self,
+        conn: sqlite3.Connection,
+        thread_id: str,
+        checkpoint_ns: str,
+        channel_versions: ChannelVersions,
+    ) -> dict[str, typing.Any]:
+        values: dict[str, typing.Any] = {}
+        for channel, version in channel_versions.items():
+            row = conn.execute(
+                "SELECT type, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?"
+                " AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if row is None or row[0] == EMPTY_BLOB:
+                continue
+            if row[0] == MESSAGES_BLOB:
+                values[channel] = self._load_messages(conn, thread_id, row[1])
+            else:
+                values[channel] = self.serde.loads_typed((row[0], row[1]))
+        return values
+
+    def _load_messages(
+        self, conn: sqlite3.Connection, thread_id: str, blob: bytes
+    ) -> builtins.list[BaseMessage]:
+        digests: builtins.list[str] = json.loads(blob)
+        if not digests:
+            return []
+        stored: dict[str, tuple[str, bytes]] = {}
+        # stay below SQLite's bound parameter limit
+        for start in range(0, len(digests), 500):
+            chunk = digests[start : start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for digest, type_, msg_blob in conn.execute(
+                "SELECT digest, type, blob FROM messages WHERE thread_id = ?"
+                f" AND digest IN ({placeholders})",
+                (thread_id, *chunk),
+            ):
+                stored[digest] = (type_, msg_blob)
+        messages = []
+        for digest in digests:
+            message = self.serde.loads_typed(stored[digest])
+            self._remember(thread_id, message, digest)
+            messages.append(message)
+        return messages
+
+    def _put(
+        self,
+        conn: sqlite3.Connection,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+
+        values = checkpoint["channel_values"]
+        stored = {
+            k: v
+            for k, v in checkpoint.items()
+            if k not in ("channel_values", "pending_sends")
+        }
+        # only channels updated by this step are written, the others are
+        # shared with the parent checkpoint through their version
+        for channel, version in new_versions.items():
+            type_, blob = self._dump_channel(
+                conn,
+                thread_id,
+                checkpoint_ns,
+                channel,
+                str(version),
+                values.get(channel),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, channel, str(version), type_, blob),
+            )
+
+        type_, blob = self.serde.dumps_typed(stored)
+        metadata_type, metadata_blob = self.serde.dumps_typed(metadata)
+        conn.execute(
+            "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                thread_id,
+                checkpoint_ns,
+                checkpoint["id"],
+                config["configurable"].get("checkpoint_id"),
+                type_,
+                blob,
+                metadata_type,
+                metadata_blob,
+            ),
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO threads VALUES (?, ?)", (thread_id, time.time())
+        )
+        self._prune_thread(conn, thread_id, checkpoint_ns)
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def _dump_channel(
+        self,
+        conn: sqlite3.Connection,
+        thread_id: str,
+        checkpoint_ns: str,
+        channel: str,
+        version: str,
+        value: typing.Any,
+    ) -> tuple[str, bytes | None]:
+        if value is None:
+            return EMPTY_BLOB, None
+        if isinstance(value, list) and all(isinstance(v, BaseMessage) for v in value):
+            stored = self._previous_digests(
+                conn, thread_id, checkpoint_ns, channel, version
+            )
+            digests = []
+            for message in value:
+                digest = self._cached_digest(thread_id, message)
+                if digest is None or digest not in stored:
+                    digest = self._dump_message(conn, thread_id, message)
+                digests.append(digest)
+            return MESSAGES_BLOB, json.dumps(digests).encode()
+        return self.serde.dumps_typed(value)
+
+    def _previous_digests(
+        self,
+        conn: sqlite3.Connection,
+        thread_id: str,
+        checkpoint_ns: str,
+        channel: str,
+        version: str,
+    ) -> set[str]:
+        """Digests of the channel's previous version, their messages are stored."""
+        row = conn.execute(
+            "SELECT blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?"
+            " AND channel = ? AND version < ? AND type = ?"
+            " ORDER BY version DESC LIMIT 1",
+            (thread_id, checkpoint_ns, channel, version, MESSAGES_BLOB),
+        ).fetchone()
+        return set(json.loads(row[0])) if row else set()
+
+    def _cached_digest(self, thread_id: str, message: BaseMessage) -> str | None:
+        """Digest of ``message`` if this very object was stored or loaded.
+
+        A message updated through its id is a new object, so it is stored
+        again. Only messages new since the previous step are serialized.
+        """
+        if message.id is None:
+            return None
+        cached = self._digests.get((thread_id, message.id))
+        if cached is None or cached[0]() is not message:
+            return None
+        return cached[1]
+
+    def _dump_message(
+        self, conn: sqlite3.Connection, thread_id: str, message: BaseMessage
+    ) -> str:
+        type_, blob = self.serde.dumps_typed(message)
+        digest = hashlib.blake2b(blob, digest_size=16).hexdigest()
+        conn.execute(
+            "INSERT OR IGNORE INTO messages VALUES (?, ?, ?, ?)",
+            (thread_id, digest, type_, blob),
+        )
+        self._remember(thread_id, message, digest)
+        return digest
+
+    def _remember(self, thread_id: str, message: BaseMessage, digest: str) -> None:
+        if message.id is None:
+            return
+        key = (thread_id, message.id)
+
+        def forget(ref: weakref.ref[BaseMessage]) -> None:
+            if self._digests.get(key, (None, ""))[0] is ref:
+                self._digests.pop(key, None)
+
+        self._digests[key] = (weakref.ref(message, forget), digest)
+
+    def _put_writes(
+        self,
+        conn: sqlite3.Connection,
+        config: RunnableConfig,
+        writes: typing.Sequence[tuple[str, typing.Any]],
+        task_id: str,
+        task_path: str,
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        for idx, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, idx)
+            type_, blob = self.serde.dumps_typed(value)
+            # regular writes are idempotent, special channels keep the latest
+            verb = "INSERT OR IGNORE" if idx >= 0 else "INSERT OR REPLACE"
+            conn.execute(
+                f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint_id,
+                    task_id,
+                    idx,
+                    channel,
+                    type_,
+                    blob,
+                    task_path,
+                ),
+            )
+
+    # retention
+
+    def _prune_thread(
+        self, conn: sqlite3.Connection, thread_id: str, checkpoint_ns: str
+    ) -> None:
+        """Drop checkpoints beyond the retention limit and what only they used.
+
+        Pruning walks every blob of the thread, so it waits until
+        ``prune_batch`` checkpoints are past the limit.
+        """
+        stale = [
+            row[0]
+            for row in conn.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ?"
+                " AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                (thread_id, checkpoint_ns, self._max_checkpoints_per_thread),
+            )
+        ]
+        if len(stale) < self._prune_batch:
+            return
+
+        for table in ("checkpoints", "writes"):
+            conn.executemany(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ?"
+                " AND checkpoint_id = ?",
+                [(thread_id, checkpoint_ns, checkpoint_id) for checkpoint_id in stale],
+            )
+
+        live_versions: set[tuple[str, str]] = set()
+        for type_, blob in conn.execute(
+            "SELECT type, checkpoint FROM checkpoints WHERE thread_id = ?"
+            " AND checkpoint_ns = ?",
+            (thread_id, checkpoint_ns),
+        ):
+            versions = self.serde.loads_typed((type_, blob))["channel_versions"]
+            live_versions.update((c, str(v)) for c, v in versions.items())
+
+        live_digests: set[str] = set()
+        for channel, version, type_, blob in conn.execute(
+            "SELECT channel, version, type, blob FROM blobs WHERE thread_id = ?"
+            " AND checkpoint_ns = ?",
+            (thread_id, checkpoint_ns),
+        ).fetchall():
+            if (channel, version) not in live_versions:
+                conn.execute(
+                    "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?"
+                    " AND channel = ? AND version = ?",
+                    (thread_id, checkpoint_ns, channel, version),
+                )
+            elif type_ == MESSAGES_BLOB:
+                live_digests.update(json.loads(blob))
+
+        # messages are shared between namespaces of a thread
+        if checkpoint_ns == "":
+            conn.executemany(
+                "DELETE FROM messages WHERE thread_id = ? AND digest = ?",
+                [
+                    (thread_id, digest)
+                    for (digest,) in conn.execute(
+                        "SELECT digest FROM messages WHERE thread_id = ?", (thread_id,)
+                    ).fetchall()
+                    if digest not in live_digests
+                ],
+            )
+
+    def _should_evict(self) -> bool:
+        if self._ttl is None and self._max_threads is None:
+            return False
+        with self._lock:
+            self._puts += 1
+            return self._puts % self._eviction_interval == 0
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Remove threads idle past the TTL, then the least recently used ones."""
+        expired: builtins.list[str] = []
+        if self._ttl is not None:
+            expired += [
+                row[0]
+                for row in conn.execute(
+                    "SELECT thread_id FROM threads WHERE last_access < ?",
+                    (time.time() - self._ttl,),
+                )
+            ]
+        if self._max_threads is not None:
+            expired += [
+                row[0]
+                for row in conn.execute(
+                    "SELECT thread_id FROM threads ORDER BY last_access DESC"
+                    " LIMIT -1 OFFSET ?",
+                    (self._max_threads,),
+                )
+            ]
+        if expired:
+            self._delete_threads(conn, list(set(expired)))
+            logger.info("Evicted %d checkpoint threads", len(set(expired)))
+
+    @staticmethod
+    def _delete_threads(
+        conn: sqlite3.Connection, thread_ids: builtins.list[str]
+    ) -> None:
+        for table in ("threads", "checkpoints", "blobs", "messages", "writes"):
+            conn.executemany(
+                f"DELETE FROM {table} WHERE thread_id = ?",
+                [(thread_id,) for thread_id in thread_ids],
+            )
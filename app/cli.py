@@ -0,0 +1,201 @@
+"""Offline maintenance commands, run with ``python -m app.cli <command>``."""
+
+import argparse
+import asyncio
+import json
+import logging
+import re
+import tempfile
+import typing
+from pathlib import Path
+
+import dotenv
+from langchain_core.language_models import BaseChatModel
+from langgraph.checkpoint.memory import MemorySaver
+from mem0 import Memory
+
+from app import logging_config
+from app import memory as memory_ingestion
+from app import utils
+from app.agent import Agent
+from app.checkpoint import SQLiteCheckpointSaver
+from app.config import settings
+from app.customers import get_customer_repository
+from app.fakes import FakeChatModel, FakeEmbeddings, FakeMemory
+from app.ingestion import KnowledgeBaseIngestor, iter_sources
+from app.knowledge_base import KnowledgeBaseIndex
+from app.replay import ReplayRunner, ReplayStats, iter_conversations
+from app.sqlite import ConnectionPool
+from app.vector_index import IndexSpec
+
+logger = logging.getLogger(__name__)
+
+
+def export_graph(args: argparse.Namespace) -> None:
+    """Render the agent graph to the assets folder if its topology changed."""
+    llm = utils.load_chat_model(settings.default_model)
+    agent = Agent(llm, MemorySaver(), utils.get_memory())
+
+    file_name = agent.export_graph(force=args.force)
+    if file_name is None:
+        logger.info("Agent graph is unchanged, nothing to export")
+
+
+def ingest(args: argparse.Namespace) -> None:
+    """Add new and changed documents to the knowledge base, in place."""
+    ingestor = KnowledgeBaseIngestor(
+        args.output,
+        embeddings=utils.load_embeddings_model(),
+        embeddings_model=settings.embeddings_model,
+        chunk_size=settings.ingest_chunk_size,
+        chunk_overlap=settings.ingest_chunk_overlap,
+        batch_size=settings.embeddings_batch_size,
+        index_spec=IndexSpec.from_settings(),
+    )
+    try:
+        sources = iter_sources(args.path, args.text_field, args.id_field)
+        stats = ingestor.ingest(sources, prune=args.prune)
+    finally:
+        ingestor.close()
+    print(json.dumps(vars(stats)))
+
+
+def replay(args: argparse.Namespace) -> None:
+    """Replay a JSONL file of conversations through the agent."""
+    output = args.output or settings.data_dir / "replay" / f"{args.path.stem}.jsonl"
+    checkpoint = SQLiteCheckpointSaver(
+        ConnectionPool(output.with_suffix(".checkpoints.sqlite"), size=4),
+        max_checkpoints_per_thread=settings.checkpoint_max_per_thread,
+    )
+    run_id = args.run_id or output.stem
+    if args.fake:
+        # offline load testing, no API keys or network needed
+        llm: BaseChatModel = FakeChatModel(
+            latency=args.fake_latency, token_latency=args.fake_latency / 50
+        )
+        memory = typing.cast(Memory, FakeMemory(max_users=1000))
+        knowledge_base = KnowledgeBaseIndex(
+            Path(tempfile.mkdtemp()), FakeEmbeddings(size=64), "fake"
+        )
+        agent = Agent(llm, checkpoint, memory, knowledge_base)
+    else:
+        # temperature 0, so nightly runs can be compared
+        llm = utils.load_chat_model(args.model, max_tokens=settings.default_max_tokens)
+        # created and seeded here rather than by the first tool call on the loop
+        get_customer_repository()
+        # kept out of the users' memories, and resumed with the run
+        memory_dir = output.with_suffix(".memory")
+        collection = re.sub(r"[^\w-]", "_", f"replay_{run_id}")
+        memory = utils.create_memory(
+            memory_dir,
+            collection=collection,
+            db_path=memory_dir / settings.memory_db_path.name,
+        )
+        agent = Agent(llm, checkpoint, memory)
+
+    runner = ReplayRunner(
+        agent,
+        memory,
+        output,
+        run_id=run_id,
+        model="fake" if args.fake else args.model,
+        concurrency=args.concurrency,
+    )
+    conversations = iter_conversations(args.path, args.message_field, args.id_field)
+
+    async def run() -> ReplayStats:
+        try:
+            return await runner.run(conversations)
+        finally:
+            # background memory writes of the last turns
+            await memory_ingestion.shutdown()
+
+    stats = asyncio.run(run())
+    print(json.dumps({**vars(stats), "output": str(output)}))
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    graph_parser = commands.add_parser(
+        "export-graph", help="Render the agent graph to assets/graph.png"
+    )
+    graph_parser.add_argument(
+        "--force", action="store_true", help="Render even if the graph is unchanged"
+    )
+    graph_parser.set_defaults(func=export_graph)
+
+    ingest_parser = commands.add_parser(
+        "ingest", help="Ingest a folder or JSONL file into the knowledge base"
+    )
+    ingest_parser.add_argument("path", type=Path, help="Folder, text or JSONL file")
+    ingest_parser.add_argument(
+        "--output",
+        type=Path,
+        default=settings.ingested_knowledge_base_dir,
+        help="Knowledge base folder, updated in place",
+    )
+    ingest_parser.add_argument(
+        "--text-field", help="JSONL field holding the text, guessed by default"
+    )
+    ingest_parser.add_argument(
+        "--id-field", help="JSONL field identifying a record, the line by default"
+    )
+    ingest_parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Delete documents that are no longer in the input",
+    )
+    ingest_parser.set_defaults(func=ingest)
+
+    replay_parser = commands.add_parser(
+        "replay", help="Replay JSONL conversations through the agent"
+    )
+    replay_parser.add_argument("path", type=Path, help="JSONL file of conversations")
+    replay_parser.add_argument(
+        "--output",
+        type=Path,
+        help="Results JSONL, appended to and resumed from, data/replay/ by default",
+    )
+    replay_parser.add_argument(
+        "--concurrency", type=int, default=8, help="Conversations replayed at once"
+    )
+    replay_parser.add_argument(
+        "--model", default=settings.default_model, help="Chat model to replay with"
+    )
+    replay_parser.add_argument(
+        "--fake",
+        action="store_true",
+        help="Use a scripted fake model and memory, for offline load tests",
+    )
+    replay_parser.add_argument(
+        "--fake-latency",
+        type=float,
+        default=0.05,
+        help="Seconds the fake model takes to answer",
+    )
+    replay_parser.add_argument(
+        "--run-id", help="Prefix of the thread ids, the output name by default"
+    )
+    replay_parser.add_argument(
+        "--message-field", help="JSONL field holding the messages, guessed by default"
+    )
+    replay_parser.add_argument(
+        "--id-field", help="JSONL field identifying a conversation, the line by default"
+    )
+    replay_parser.set_defaults(func=replay)
+
+    return parser
+
+
+def main(argv: typing.Sequence[str] | None = None) -> None:
+    dotenv.load_dotenv(settings.root_dir / ".env")
+    logging_config.configure()
+
+    args = get_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,11 +19,158 @@ class Settings(BaseSettings):
     log_level: str = "INFO"
     log_format: typing.Literal["json", "console"] = "console"
     graphs_dir: Path = root_dir / "assets"
+    export_graph_on_startup: bool = False
+    # expose Prometheus metrics on /metrics
+    metrics_enabled: bool = True
+    data_dir: Path = root_dir / "data"
+    knowledge_base_dir: Path = data_dir / "knowledge_base"
+    # knowledge base index layout, exact unless an approximate type is chosen,
+    # see benchmarks/ann_bench.py for the recall and latency of each
+    knowledge_base_index_type: typing.Literal["flat", "ivf_flat", "ivf_pq", "hnsw"] = (
+        "flat"
+    )
+    knowledge_base_quantizer: typing.Literal["none", "sq8", "sq4", "fp16"] = "none"
+    knowledge_base_ann_min_vectors: int = 10_000
+    knowledge_base_train_sample: int = 50_000
+    ivf_nlist: int | None = None
+    ivf_nprobe: int = 16
+    pq_m: int = 32
+    pq_nbits: int = 8
+    pq_refine: typing.Literal["none", "sq8", "sq4", "fp16"] = "sq8"
+    pq_refine_k_factor: int = 10
+    hnsw_m: int = 32
+    hnsw_ef_construction: int = 200
+    hnsw_ef_search: int = 64
+    # knowledge base built by `python -m app.cli ingest`, used when present
+    ingested_knowledge_base_dir: Path = data_dir / "ingested"
+    ingest_chunk_size: int = 1000
+    ingest_chunk_overlap: int = 100
+    # user id for sessions without an authenticated user
+    default_user_id: str = "123"
+    # customer records
+    customers_db_path: Path = data_dir / "customers.sqlite"
+    customers_pool_size: int = 4
+    customer_cache_max_entries: int = 10_000
+    customer_cache_ttl_seconds: float = 300
+    # conversation checkpoints
+    checkpoint_db_path: Path = data_dir / "checkpoints.sqlite"
+    checkpoint_pool_size: int = 4
+    checkpoint_ttl_seconds: float | None = 7 * 24 * 3600
+    checkpoint_max_threads: int | None = 100_000
+    checkpoint_max_per_thread: int = 20
+    # long-term memory (mem0), stored in an embedded Qdrant database under
+    # `memory_dir` unless `memory_qdrant_url` points at a Qdrant server, with
+    # one collection per user named after `memory_collection`
+    memory_dir: Path = data_dir / "memory"
+    memory_qdrant_url: str | None = None
+    memory_qdrant_api_key: pydantic.SecretStr | None = None
+    memory_collection: str = "memories"
+    memory_embedding_dims: int = 1536
+    memory_llm_model: str = "openai:gpt-4o-mini"
+    memory_telemetry: bool = False
+    # several worker processes serving the same sessions; without a Qdrant
+    # server, memories and recall cache invalidations go through this SQLite
+    # database, shared by the workers like the checkpoints
+    multi_worker: bool = False
+    memory_db_path: Path = data_dir / "memory" / "memory.sqlite"
     langchain_tracing_v2: str = "true"
     langchain_api_key: str = ""
     langchain_project: str = "react-agent"
+    default_model: str = "openai:gpt-4o"
+    default_temperature: float = 0.2
+    # agents are shared by sessions using the same model and dropped when idle
+    agent_pool_max_size: int = 8
+    agent_pool_idle_seconds: float | None = 1800
+    # requests move to the other models when the session's model is rate
+    # limited or failing, and are hedged to the next one when it is slow.
+    # Opt-in, as it changes which provider answers
+    router_enabled: bool = False
+    router_models: list[str] = [
+        "openai:gpt-4o",
+        "anthropic:claude-3-5-sonnet-20241022",
+        "openai:gpt-4o-mini",
+    ]
+    # answers short user messages, e.g. "openai:gpt-4o-mini"
+    router_cheap_model: str | None = None
+    router_simple_max_chars: int = 200
+    router_model_retries: int = 0
+    router_window: int = 100
+    router_min_samples: int = 20
+    router_max_error_rate: float = 0.5
+    router_cooldown_seconds: float = 30.0
+    # hedge delay until `router_min_samples` latencies, then their quantile
+    router_hedge_after_seconds: float | None = 5.0
+    router_hedge_quantile: float = 0.95
     embeddings_model: str = "openai:text-embedding-3-small"
+    # on-disk cache of document vectors, query vectors (user text) are only
+    # kept in memory, for the most recent ones
+    embeddings_cache_dir: Path = data_dir / "embeddings"
+    embeddings_cache_max_queries: int = 10_000
+    embeddings_batch_size: int = 256
     retriever_threshold: float = 0.3
+    # fuse dense hits with BM25 keyword hits by reciprocal rank, so exact
+    # terms like emails and SKUs are found on the first search
+    retriever_hybrid: bool = True
+    retriever_fetch_k: int = 20
+    retriever_rrf_k: int = 60
+    # chat history budget, the prompt keeps the most recent messages that fit
+    # in the model's context window minus the completion and prompt reserves
+    history_max_tokens: int = 16_000
+    prompt_reserved_tokens: int = 2_000
+    default_max_tokens: int = 1024
+    default_context_window: int = 16_000
+    model_context_windows: dict[str, int] = {
+        "openai:gpt-4o": 128_000,
+        "openai:gpt-4o-mini": 128_000,
+        "anthropic:claude-3-5-sonnet-20241022": 200_000,
+    }
+    # opt-in cache of knowledge base answers, looked up by query similarity
+    semantic_cache_enabled: bool = False
+    semantic_cache_threshold: float = 0.92
+    semantic_cache_max_entries: int = 1024
+    semantic_cache_ttl_seconds: float | None = 3600
+    # memories recalled into the prompt at the start of a turn, searched while
+    # the prompt is assembled and cached until the user's memories change
+    recall_memory_enabled: bool = True
+    recall_memory_limit: int = 3
+    recall_memory_threshold: float = 0.3
+    recall_memory_timeout_seconds: float = 2.0
+    recall_cache_max_entries: int = 10_000
+    recall_cache_ttl_seconds: float | None = 300
+    # streamed tokens are sent to the client in frames of up to this many
+    # characters or this delay, the first token right away
+    stream_coalesce_enabled: bool = True
+    stream_frame_delay_seconds: float = 0.03
+    stream_frame_max_chars: int = 64
+    stream_max_pending_tokens: int = 1024
+    # tool calls of a turn run concurrently, each tool under its own timeout
+    # and process-wide concurrency limit
+    tool_timeout_seconds: float = 30.0
+    tool_max_concurrency: int = 16
+    tool_timeouts: dict[str, float] = {
+        "search_memory": 5.0,
+        "save_memory": 10.0,
+        "company_knowledge_base": 5.0,
+        "get_customer_info": 5.0,
+    }
+    tool_concurrency: dict[str, int] = {
+        "search_memory": 4,
+        "save_memory": 4,
+    }
+    # size of the thread pool used for blocking clients such as mem0
+    blocking_io_workers: int = 8
+    # background mem0 writes
+    memory_ingestion_workers: int = 2
+    memory_ingestion_max_retries: int = 3
+    memory_ingestion_retry_backoff: float = 0.5
+    # http clients shared by every model and embeddings instance, per provider
+    http2: bool = True
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry_seconds: float = 60.0
+    http_timeout_seconds: float = 60.0
+    http_connect_timeout_seconds: float = 5.0
+    http_stats_log_interval_seconds: float | None = 300.0
     # openai config
     openai_api_key: pydantic.SecretStr = pydantic.SecretStr("")
     # chainlit
@@ -40,6 +187,9 @@ class AgentConfiguration:
     user_id: str
     model: str
     memory_store: Memory
+    # per-request overrides of the agent's model settings
+    temperature: float | None = None
+    max_tokens: int | None = None
 
     @classmethod
     def from_runnable_config(
@@ -51,5 +201,10 @@ class AgentConfiguration:
         _fields = {f.name for f in fields(cls) if f.init}
         return cls(**{k: v for k, v in configurable.items() if k in _fields})
 
+    def model_kwargs(self) -> dict[str, typing.Any]:
+        """Model call arguments overriding the agent's defaults."""
+        kwargs = {"temperature": self.temperature, "max_tokens": self.max_tokens}
+        return {key: value for key, value in kwargs.items() if value is not None}
+
 
 settings = Settings()
@@ -0,0 +1,158 @@
+import abc
+import functools
+import json
+import logging
+import sqlite3
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+from app.config import settings
+from app.sqlite import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Sample customer data, loaded into an empty database
+SAMPLE_CUSTOMERS: dict[str, dict[str, typing.Any]] = {
+    "123": {"name": "Alice Smith", "email": "alice@example.com", "orders": 5},
+    "456": {"name": "Bob Johnson", "email": "bob@example.com", "orders": 2},
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    customer_id TEXT PRIMARY KEY,
+    record TEXT NOT NULL
+) WITHOUT ROWID
+"""
+
+
+def serialize(record: dict[str, typing.Any]) -> str:
+    """Compact JSON form of a customer record, as returned to the model."""
+    return json.dumps(record, separators=(",", ":"), ensure_ascii=False)
+
+
+class CustomerRepository(abc.ABC):
+    """Lookup of customer records, returned pre-serialized."""
+
+    @abc.abstractmethod
+    async def get(self, customer_id: str) -> str | None:
+        """Return the serialized record of a customer, or None if unknown."""
+
+
+class InMemoryCustomerRepository(CustomerRepository):
+    """Customers held in a dict, for development and benchmarks."""
+
+    def __init__(self, customers: dict[str, dict[str, typing.Any]]) -> None:
+        self._records = {key: serialize(value) for key, value in customers.items()}
+
+    async def get(self, customer_id: str) -> str | None:
+        return self._records.get(customer_id)
+
+
+class SQLiteCustomerRepository(CustomerRepository):
+    """Customers stored in SQLite, one primary key lookup per customer.
+
+    Records are stored serialized in a ``WITHOUT ROWID`` table clustered on
+    the customer id, so a lookup is a single B-tree search however many
+    customers there are, run on the pool's executor off the event loop.
+    """
+
+    def __init__(self, pool: ConnectionPool) -> None:
+        self._pool = pool
+        self._pool.run(lambda conn: conn.execute(SCHEMA), write=True)
+
+    async def get(self, customer_id: str) -> str | None:
+        def select(conn: sqlite3.Connection) -> str | None:
+            row = conn.execute(
+                "SELECT record FROM customers WHERE customer_id = ?", (customer_id,)
+            ).fetchone()
+            return typing.cast(str, row[0]) if row else None
+
+        return await self._pool.arun(select)
+
+    def upsert(
+        self, customers: typing.Iterable[tuple[str, dict[str, typing.Any]]]
+    ) -> int:
+        rows = [(key, serialize(value)) for key, value in customers]
+
+        def insert(conn: sqlite3.Connection) -> None:
+            conn.executemany(
+                "INSERT INTO customers (customer_id, record) VALUES (?, ?) "
+                "ON CONFLICT (customer_id) DO UPDATE SET record = excluded.record",
+                rows,
+            )
+
+        self._pool.run(insert, write=True)
+        return len(rows)
+
+    def is_empty(self) -> bool:
+        return self._pool.run(
+            lambda conn: conn.execute("SELECT 1 FROM customers LIMIT 1").fetchone()
+            is None
+        )
+
+
+class CachedCustomerRepository(CustomerRepository):
+    """Read-through LRU cache in front of another repository.
+
+    Entries, including unknown ids, expire after ``ttl`` seconds so updates
+    made by other processes are picked up.
+    """
+
+    def __init__(
+        self,
+        repository: CustomerRepository,
+        max_entries: int = 10_000,
+        ttl: float = 300,
+    ) -> None:
+        self._repository = repository
+        self._max_entries = max_entries
+        self._ttl = ttl
+        # customer id -> (record, expiry), least recently used first
+        self._entries: OrderedDict[str, tuple[str | None, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    async def get(self, customer_id: str) -> str | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(customer_id)
+                self.hits += 1
+                return entry[0]
+
+        self.misses += 1
+        record = await self._repository.get(customer_id)
+        with self._lock:
+            self._entries[customer_id] = (record, now + self._ttl)
+            self._entries.move_to_end(customer_id)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return record
+
+    def invalidate(self, customer_id: str) -> None:
+        with self._lock:
+            self._entries.pop(customer_id, None)
+
+
+@functools.cache
+def get_customer_repository() -> CustomerRepository:
+    """Return the customer repository shared by every session."""
+    pool = ConnectionPool(settings.customers_db_path, size=settings.customers_pool_size)
+    repository = SQLiteCustomerRepository(pool)
+    if repository.is_empty():
+        repository.upsert(SAMPLE_CUSTOMERS.items())
+        logger.info("Loaded sample customers into %s", settings.customers_db_path)
+
+    return CachedCustomerRepository(
+        repository,
+        max_entries=settings.customer_cache_max_entries,
+        ttl=settings.customer_cache_ttl_seconds,
+    )
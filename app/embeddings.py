@@ -0,0 +1,346 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+import typing
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from mem0.embeddings.base import EmbeddingBase
+
+logger = logging.getLogger(__name__)
+
+KEY_SIZE = hashlib.sha256().digest_size
+
+
+class VectorFile:
+    """Append-only store of float32 vectors keyed by content hash.
+
+    Vectors live in a memory-mapped ``vectors.f32`` file and their keys in
+    ``keys.bin``, one fixed-size digest per row, so the index is rebuilt by
+    reading the keys file once. Appends take an exclusive file lock and pick
+    up rows written by other processes first, so workers can share a cache.
+    Async callers run on a dedicated thread, keeping the event loop free.
+    """
+
+    def __init__(self, path: Path, initial_capacity: int = 1024) -> None:
+        path.mkdir(parents=True, exist_ok=True)
+        self._keys_path = path / "keys.bin"
+        self._vectors_path = path / "vectors.f32"
+        self._meta_path = path / "meta.json"
+        self._initial_capacity = initial_capacity
+        self._keys_path.touch()
+        self._vectors_path.touch()
+
+        self._rows: dict[bytes, int] = {}
+        self._dimensions: int | None = None
+        self._vectors: np.memmap[typing.Any, np.dtype[np.float32]] | None = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="vector-file"
+        )
+        self._refresh()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, keys: typing.Iterable[bytes]) -> dict[bytes, list[float]]:
+        with self._lock:
+            if any(key not in self._rows for key in keys):
+                self._refresh()
+            if self._vectors is None:
+                return {}
+            return {
+                key: self._vectors[self._rows[key]].tolist()
+                for key in keys
+                if key in self._rows
+            }
+
+    def add(self, keys: list[bytes], vectors: typing.Sequence[list[float]]) -> None:
+        array = np.asarray(vectors, dtype=np.float32)
+        with self._lock, open(self._keys_path, "ab") as keys_file:
+            fcntl.flock(keys_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                if self._dimensions is None:
+                    self._dimensions = array.shape[1]
+                    self._meta_path.write_text(
+                        json.dumps({"dimensions": self._dimensions})
+                    )
+                new = [
+                    (key, vector)
+                    for key, vector in zip(keys, array)
+                    if key not in self._rows
+                ]
+                if not new:
+                    return
+
+                start = len(self._rows)
+                vectors_map = self._reserve(start + len(new))
+                for offset, (_, vector) in enumerate(new):
+                    vectors_map[start + offset] = vector
+                vectors_map.flush()
+                # keys are written last, a row is only visible once its vector is
+                keys_file.write(b"".join(key for key, _ in new))
+                keys_file.flush()
+                for offset, (key, _) in enumerate(new):
+                    self._rows[key] = start + offset
+            finally:
+                fcntl.flock(keys_file, fcntl.LOCK_UN)
+
+    async def aget(self, keys: list[bytes]) -> dict[bytes, list[float]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.get, keys)
+
+    async def aadd(
+        self, keys: list[bytes], vectors: typing.Sequence[list[float]]
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.add, keys, vectors)
+
+    def _refresh(self) -> None:
+        """Load keys appended since the last refresh, possibly by other processes."""
+        if self._dimensions is None and self._meta_path.exists():
+            self._dimensions = int(
+                json.loads(self._meta_path.read_text())["dimensions"]
+            )
+
+        known = len(self._rows) * KEY_SIZE
+        if self._keys_path.stat().st_size > known:
+            with open(self._keys_path, "rb") as keys_file:
+                keys_file.seek(known)
+                data = keys_file.read()
+            rows = len(self._rows)
+            for idx in range(len(data) // KEY_SIZE):
+                self._rows[data[idx * KEY_SIZE : (idx + 1) * KEY_SIZE]] = rows + idx
+            self._open()
+
+    def _open(self) -> None:
+        if not self._dimensions:
+            return
+        capacity = self._vectors_path.stat().st_size // (self._dimensions * 4)
+        if capacity and (self._vectors is None or self._vectors.shape[0] != capacity):
+            self._vectors = np.memmap(
+                self._vectors_path,
+                dtype=np.float32,
+                mode="r+",
+                shape=(capacity, self._dimensions),
+            )
+
+    def _reserve(self, rows: int) -> np.memmap[typing.Any, np.dtype[np.float32]]:
+        dimensions = typing.cast(int, self._dimensions)
+        capacity = self._vectors_path.stat().st_size // (dimensions * 4)
+        if rows > capacity:
+            capacity = max(rows, capacity * 2, self._initial_capacity)
+            os.truncate(self._vectors_path, capacity * dimensions * 4)
+        self._open()
+        return typing.cast(np.memmap[typing.Any, np.dtype[np.float32]], self._vectors)
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only calls the model for unseen texts.
+
+    Document vectors are persisted in a :class:`VectorFile` keyed by a hash of
+    the model name and the text. Queries, which hold user text, are only kept
+    in memory for the ``max_queries`` most recently used. Cache misses are
+    embedded in batches, and concurrent requests for the same text share a
+    single model call.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model_name: str,
+        cache_dir: Path,
+        batch_size: int = 256,
+        max_queries: int = 10_000,
+    ) -> None:
+        self._underlying = underlying
+        self._model_name = model_name
+        self._batch_size = batch_size
+        self._max_queries = max_queries
+        slug = hashlib.sha256(model_name.encode()).hexdigest()[:16]
+        self._store = VectorFile(cache_dir / slug)
+        self._queries: OrderedDict[bytes, list[float]] = OrderedDict()
+        self._inflight: dict[bytes, Future[list[float]]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "vectors": len(self._store),
+            "queries": len(self._queries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(texts, "document", self._underlying.embed_documents)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(
+            [text], "query", lambda texts: [self._underlying.embed_query(texts[0])]
+        )[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self._aembed(texts, "document", self._underlying.aembed_documents)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        async def embed(texts: list[str]) -> list[list[float]]:
+            return [await self._underlying.aembed_query(texts[0])]
+
+        return (await self._aembed([text], "query", embed))[0]
+
+    def _key(self, text: str, kind: str) -> bytes:
+        return hashlib.sha256(f"{self._model_name}\0{kind}\0{text}".encode()).digest()
+
+    def _cached_queries(self, keys: list[bytes]) -> dict[bytes, list[float]]:
+        found: dict[bytes, list[float]] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._queries:
+                    self._queries.move_to_end(key)
+                    found[key] = self._queries[key]
+        return found
+
+    def _save_queries(
+        self, keys: list[bytes], vectors: typing.Sequence[list[float]]
+    ) -> None:
+        with self._lock:
+            self._queries.update(zip(keys, vectors))
+            while len(self._queries) > self._max_queries:
+                self._queries.popitem(last=False)
+
+    def _claim(
+        self, keys: list[bytes], texts: list[str], found: dict[bytes, list[float]]
+    ) -> tuple[dict[bytes, str], dict[bytes, Future[list[float]]]]:
+        """Split uncached texts into texts to embed and texts in flight."""
+        owned: dict[bytes, str] = {}
+        waiting: dict[bytes, Future[list[float]]] = {}
+        with self._lock:
+            for key, text in zip(keys, texts):
+                if key in found or key in owned or key in waiting:
+                    continue
+                if key in self._inflight:
+                    waiting[key] = self._inflight[key]
+                else:
+                    self._inflight[key] = Future()
+                    owned[key] = text
+
+        self.hits += len(keys) - len(owned) - len(waiting)
+        self.misses += len(owned)
+        return owned, waiting
+
+    def _resolve(
+        self,
+        batch: list[bytes],
+        vectors: typing.Sequence[list[float]] | None,
+        error: BaseException | None = None,
+    ) -> None:
+        with self._lock:
+            futures = [self._inflight.pop(key) for key in batch]
+        for idx, future in enumerate(futures):
+            if vectors is not None:
+                future.set_result(list(vectors[idx]))
+            else:
+                future.set_exception(typing.cast(BaseException, error))
+
+    def _batches(self, owned: dict[bytes, str]) -> list[list[bytes]]:
+        keys = list(owned)
+        return [
+            keys[start : start + self._batch_size]
+            for start in range(0, len(keys), self._batch_size)
+        ]
+
+    def _embed(
+        self,
+        texts: list[str],
+        kind: str,
+        embed: typing.Callable[[list[str]], list[list[float]]],
+    ) -> list[list[float]]:
+        keys = [self._key(text, kind) for text in texts]
+        found = (
+            self._store.get(keys) if kind == "document" else self._cached_queries(keys)
+        )
+        owned, waiting = self._claim(keys, texts, found)
+        batches = self._batches(owned)
+        for idx, batch in enumerate(batches):
+            try:
+                vectors = _float32(embed([owned[key] for key in batch]))
+            except BaseException as exc:
+                for pending in batches[idx:]:
+                    self._resolve(pending, None, exc)
+                raise
+            try:
+                if kind == "document":
+                    self._store.add(batch, vectors)
+                else:
+                    self._save_queries(batch, vectors)
+            finally:
+                self._resolve(batch, vectors)
+            found.update(zip(batch, vectors))
+
+        for key, future in waiting.items():
+            found[key] = future.result()
+        return [found[key] for key in keys]
+
+    async def _aembed(
+        self,
+        texts: list[str],
+        kind: str,
+        embed: typing.Callable[[list[str]], typing.Awaitable[list[list[float]]]],
+    ) -> list[list[float]]:
+        keys = [self._key(text, kind) for text in texts]
+        # the vector file takes file locks and flushes, kept off the event loop
+        found = (
+            await self._store.aget(keys)
+            if kind == "document"
+            else self._cached_queries(keys)
+        )
+        owned, waiting = self._claim(keys, texts, found)
+        batches = self._batches(owned)
+        for idx, batch in enumerate(batches):
+            try:
+                vectors = _float32(await embed([owned[key] for key in batch]))
+            except BaseException as exc:
+                for pending in batches[idx:]:
+                    self._resolve(pending, None, exc)
+                raise
+            try:
+                if kind == "document":
+                    await self._store.aadd(batch, vectors)
+                else:
+                    self._save_queries(batch, vectors)
+            finally:
+                self._resolve(batch, vectors)
+            found.update(zip(batch, vectors))
+
+        for key, future in waiting.items():
+            found[key] = await asyncio.wrap_future(future)
+        return [found[key] for key in keys]
+
+
+def _float32(vectors: list[list[float]]) -> list[list[float]]:
+    """Round to the precision stored in the cache, so hits and misses agree."""
+    return typing.cast(
+        list[list[float]], np.asarray(vectors, dtype=np.float32).tolist()
+    )
+
+
+class Mem0Embedder(EmbeddingBase):  # type: ignore[misc]
+    """mem0 embedder backed by the process-wide cached embeddings."""
+
+    def __init__(self, embeddings: Embeddings) -> None:
+        super().__init__()
+        self._embeddings = embeddings
+
+    def embed(self, text: str) -> list[float]:
+        return self._embeddings.embed_query(text.replace("\n", " "))
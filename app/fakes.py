@@ -0,0 +1,313 @@
+"""Offline stand-ins for the LLM, embeddings and mem0, for ``replay --fake``,
+the benchmarks and the tests."""
+
+import asyncio
+import json
+import random
+import re
+import time
+import typing
+import uuid
+import zlib
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.messages.ai import UsageMetadata
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+
+def usage(input_tokens: int, output_tokens: int) -> UsageMetadata:
+    return UsageMetadata(
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        total_tokens=input_tokens + output_tokens,
+    )
+
+
+class FakeChatModel(BaseChatModel):
+    """Scripted chat model with configurable latency, streaming and tool calls.
+
+    When ``tool_calls`` is set, the first call of a turn (the last message is
+    from the user) requests those tools and the call after the tool results
+    answers with ``reply``. Streaming waits ``latency`` before the first token
+    and ``token_latency`` between the following ones. Token usage is
+    reported as word counts.
+    """
+
+    reply: str = "Shipping takes 2-3 days."
+    latency: float = 0.0
+    token_latency: float = 0.0
+    tool_calls: list[dict[str, typing.Any]] = []
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def bind_tools(self, tools: typing.Any, **kwargs: typing.Any) -> "FakeChatModel":
+        return self
+
+    def _respond(self, messages: list[BaseMessage]) -> AIMessage:
+        self.calls += 1
+        input_tokens = sum(len(str(message.content).split()) for message in messages)
+        if self.tool_calls and isinstance(messages[-1], HumanMessage):
+            return AIMessage(
+                content="",
+                tool_calls=[
+                    {**tool_call, "id": f"call_{uuid.uuid4().hex[:8]}"}
+                    for tool_call in self.tool_calls
+                ],
+                usage_metadata=usage(input_tokens, len(self.tool_calls)),
+            )
+        output_tokens = len(self.reply.split())
+        return AIMessage(self.reply, usage_metadata=usage(input_tokens, output_tokens))
+
+    def _chunks(self, message: AIMessage) -> list[ChatGenerationChunk]:
+        if message.tool_calls:
+            chunk = AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    tool_call_chunk(
+                        name=tool_call["name"],
+                        args=json.dumps(tool_call["args"]),
+                        id=tool_call["id"],
+                        index=idx,
+                    )
+                    for idx, tool_call in enumerate(message.tool_calls)
+                ],
+                usage_metadata=message.usage_metadata,
+            )
+            return [ChatGenerationChunk(message=chunk)]
+        tokens = re.findall(r"\S+\s*", str(message.content))
+        # the usage is reported with the last chunk, as OpenAI streams do
+        return [
+            ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content=token,
+                    usage_metadata=(
+                        message.usage_metadata if idx == len(tokens) - 1 else None
+                    ),
+                )
+            )
+            for idx, token in enumerate(tokens)
+        ]
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> typing.Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for idx, chunk in enumerate(self._chunks(self._respond(messages))):
+            if idx:
+                time.sleep(self.token_latency)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> typing.AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for idx, chunk in enumerate(self._chunks(self._respond(messages))):
+            if idx:
+                await asyncio.sleep(self.token_latency)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class FakeRateLimitError(Exception):
+    """Stand-in for a provider SDK's HTTP 429 error."""
+
+    status_code = 429
+
+
+class FlakyChatModel(FakeChatModel):
+    """Fake provider with a latency tail and rate limits.
+
+    Every call waits ``latency``, or ``tail_latency`` with probability
+    ``tail_probability``. With probability ``rate_limit_probability`` it
+    fails with a rate limit error after ``latency`` instead. Draws are
+    seeded, so runs are reproducible.
+    """
+
+    tail_latency: float = 0.0
+    tail_probability: float = 0.0
+    rate_limit_probability: float = 0.0
+    seed: int = 0
+    _rng: random.Random = PrivateAttr(default_factory=random.Random)
+
+    def model_post_init(self, __context: typing.Any) -> None:
+        self._rng.seed(self.seed)
+
+    async def _wait(self) -> None:
+        slow = self._rng.random() < self.tail_probability
+        if self._rng.random() < self.rate_limit_probability:
+            await asyncio.sleep(self.latency)
+            raise FakeRateLimitError("rate limited")
+        await asyncio.sleep(self.tail_latency if slow else self.latency)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> ChatResult:
+        await self._wait()
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> typing.AsyncIterator[ChatGenerationChunk]:
+        await self._wait()
+        for idx, chunk in enumerate(self._chunks(self._respond(messages))):
+            if idx:
+                await asyncio.sleep(self.token_latency)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class FakeEmbeddings(DeterministicFakeEmbedding):
+    """Deterministic embeddings paying a fixed latency per API call."""
+
+    latency: float = 0.0
+    calls: int = 0
+
+    def _embed(self, texts: list[str]) -> list[list[float]]:
+        return super().embed_documents(texts)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return self._embed(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return self._embed([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self._embed(texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self._embed([text])[0]
+
+
+class NgramEmbeddings(FakeEmbeddings):
+    """Hashed character trigram embeddings, similar texts get similar vectors.
+
+    Like a real model, it ranks paraphrases close together but blurs exact
+    identifiers: ``SKU-01234`` and ``SKU-01243`` share most of their trigrams.
+    """
+
+    def _embed(self, texts: list[str]) -> list[list[float]]:
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.size
+            padded = f"  {text.lower()} "
+            for idx in range(len(padded) - 2):
+                digest = zlib.crc32(padded[idx : idx + 3].encode())
+                vector[digest % self.size] += 1.0 if digest & 1 << 31 else -1.0
+            vectors.append(vector)
+        return vectors
+
+
+class FakeMem0LLM:
+    """mem0 LLM stand-in extracting ``facts`` new facts from every ``add``.
+
+    The first call of an ``add`` returns the facts, the second one adds each
+    of them as a new memory.
+    """
+
+    def __init__(self, facts: int = 3) -> None:
+        self.facts = facts
+        self._pending: list[str] = []
+
+    def generate_response(
+        self, messages: list[dict[str, str]], **kwargs: typing.Any
+    ) -> str:
+        if messages[0]["role"] == "system":
+            self._pending = [
+                f"User fact {uuid.uuid4().hex[:8]}" for _ in range(self.facts)
+            ]
+            return json.dumps({"facts": self._pending})
+        actions = [
+            {"id": str(idx), "text": fact, "event": "ADD"}
+            for idx, fact in enumerate(self._pending)
+        ]
+        return json.dumps({"memory": actions})
+
+
+class FakeMemory:
+    """Blocking mem0 stand-in: every call sleeps like a remote LLM round-trip.
+
+    With ``max_users`` set, the memories of the oldest users are dropped.
+    """
+
+    def __init__(self, latency: float = 0.0, max_users: int | None = None) -> None:
+        self.latency = latency
+        self.max_users = max_users
+        self.memories: dict[str, list[str]] = {}
+
+    def add(
+        self, messages: typing.Any, user_id: str, **kwargs: typing.Any
+    ) -> dict[str, typing.Any]:
+        time.sleep(self.latency)
+        self.memories.setdefault(user_id, []).append(str(messages))
+        if self.max_users is not None and len(self.memories) > self.max_users:
+            del self.memories[next(iter(self.memories))]
+        return {"results": []}
+
+    def search(
+        self, query: str, user_id: str, limit: int = 100, **kwargs: typing.Any
+    ) -> dict[str, typing.Any]:
+        time.sleep(self.latency)
+        results = [
+            {"memory": memory, "score": 1.0}
+            for memory in self.memories.get(user_id, [])[-limit:]
+        ]
+        return {"results": results}
@@ -0,0 +1,240 @@
+import functools
+import importlib.util
+import logging
+import threading
+import time
+import typing
+from dataclasses import asdict, dataclass
+
+import httpx
+from langchain_core.language_models import BaseChatModel
+
+from app import instrumentation
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# providers whose langchain integrations accept `http_client` and
+# `http_async_client`, anthropic clients are swapped in by `attach`
+CLIENT_KWARGS_PROVIDERS = {"openai", "azure_openai"}
+
+http_requests = instrumentation.registry.counter(
+    "agent_http_requests_total", "Requests sent to model providers.", ("provider",)
+)
+http_connections = instrumentation.registry.counter(
+    "agent_http_connections_total",
+    "Connections opened to model providers, the rest of the requests reuse one.",
+    ("provider",),
+)
+
+
+@dataclass
+class ConnectionStats:
+    requests: int = 0
+    connections: int = 0
+    tls_handshakes: int = 0
+
+    @property
+    def reuse_ratio(self) -> float:
+        if not self.requests:
+            return 0.0
+        return max(0.0, 1 - self.connections / self.requests)
+
+    def as_dict(self) -> dict[str, typing.Any]:
+        return {**asdict(self), "reuse_ratio": round(self.reuse_ratio, 3)}
+
+
+class _Tracer:
+    """Counts requests and new connections from httpcore trace events."""
+
+    def __init__(self, provider: str, stats: ConnectionStats) -> None:
+        self.provider = provider
+        self.stats = stats
+
+    def request(self, request: httpx.Request, trace: typing.Any) -> None:
+        request.extensions = {**request.extensions, "trace": trace}
+        self.stats.requests += 1
+        http_requests.inc(provider=self.provider)
+
+    def event(self, name: str, info: dict[str, typing.Any]) -> None:
+        if name == "connection.connect_tcp.complete":
+            self.stats.connections += 1
+            http_connections.inc(provider=self.provider)
+        elif name == "connection.start_tls.complete":
+            self.stats.tls_handshakes += 1
+
+    async def aevent(self, name: str, info: dict[str, typing.Any]) -> None:
+        self.event(name, info)
+
+
+class TracedTransport(httpx.HTTPTransport):
+    def __init__(self, tracer: _Tracer, **kwargs: typing.Any) -> None:
+        super().__init__(**kwargs)
+        self._tracer = tracer
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self._tracer.request(request, self._tracer.event)
+        return super().handle_request(request)
+
+
+class AsyncTracedTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, tracer: _Tracer, **kwargs: typing.Any) -> None:
+        super().__init__(**kwargs)
+        self._tracer = tracer
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self._tracer.request(request, self._tracer.aevent)
+        return await super().handle_async_request(request)
+
+
+class HttpClients:
+    """Process-wide httpx clients, one sync and one async per provider.
+
+    Every chat model and embeddings instance of a provider shares the same
+    connection pool, so connections and TLS sessions are kept alive across
+    agents and sessions instead of each model opening its own. HTTP/2 is used
+    when the ``h2`` package is installed, multiplexing concurrent requests
+    over one connection. Connection reuse is logged every ``log_interval``
+    seconds and exported as Prometheus counters.
+    """
+
+    def __init__(
+        self,
+        limits: httpx.Limits,
+        timeout: httpx.Timeout,
+        http2: bool = True,
+        log_interval: float | None = 300,
+    ) -> None:
+        self._limits = limits
+        self._timeout = timeout
+        self._http2 = http2 and importlib.util.find_spec("h2") is not None
+        if http2 and not self._http2:
+            logger.warning("Install h2 to use HTTP/2, falling back to HTTP/1.1")
+        self._log_interval = log_interval
+        self._logged_at = time.monotonic()
+        self._clients: dict[str, httpx.Client] = {}
+        self._async_clients: dict[str, httpx.AsyncClient] = {}
+        self._stats: dict[str, ConnectionStats] = {}
+        self._lock = threading.Lock()
+
+    def client(self, provider: str) -> httpx.Client:
+        with self._lock:
+            if provider not in self._clients:
+                transport = TracedTransport(
+                    self._tracer(provider), limits=self._limits, http2=self._http2
+                )
+                self._clients[provider] = httpx.Client(
+                    transport=transport,
+                    timeout=self._timeout,
+                    event_hooks={"response": [self._maybe_log_sync]},
+                )
+            return self._clients[provider]
+
+    def async_client(self, provider: str) -> httpx.AsyncClient:
+        with self._lock:
+            if provider not in self._async_clients:
+                transport = AsyncTracedTransport(
+                    self._tracer(provider), limits=self._limits, http2=self._http2
+                )
+                self._async_clients[provider] = httpx.AsyncClient(
+                    transport=transport,
+                    timeout=self._timeout,
+                    event_hooks={"response": [self._maybe_log]},
+                )
+            return self._async_clients[provider]
+
+    def _tracer(self, provider: str) -> _Tracer:
+        # sync and async clients of a provider report together
+        return _Tracer(provider, self._stats.setdefault(provider, ConnectionStats()))
+
+    def stats(self) -> dict[str, dict[str, typing.Any]]:
+        return {provider: stats.as_dict() for provider, stats in self._stats.items()}
+
+    def log_stats(self) -> None:
+        self._logged_at = time.monotonic()
+        for provider, stats in self.stats().items():
+            logger.info(
+                "HTTP connection reuse for %s",
+                provider,
+                extra={"event_name": "http_connections", "provider": provider, **stats},
+            )
+
+    def _maybe_log_sync(self, response: httpx.Response) -> None:
+        if (
+            self._log_interval is not None
+            and time.monotonic() - self._logged_at > self._log_interval
+        ):
+            self.log_stats()
+
+    async def _maybe_log(self, response: httpx.Response) -> None:
+        self._maybe_log_sync(response)
+
+    def client_kwargs(self, provider: str) -> dict[str, typing.Any]:
+        """Keyword arguments sharing this provider's clients with a new model.
+
+        The timeout is passed along as the provider SDKs set one per request,
+        which would otherwise override the client's.
+
+        Args:
+            provider (str): Provider prefix of the model name, e.g. 'openai'.
+        """
+        if provider not in CLIENT_KWARGS_PROVIDERS:
+            return {}
+        return {
+            "http_client": self.client(provider),
+            "http_async_client": self.async_client(provider),
+            "timeout": self._timeout,
+        }
+
+    def attach(self, llm: BaseChatModel, provider: str) -> None:
+        """Share the provider's clients with a model that takes no client kwargs.
+
+        Args:
+            llm (BaseChatModel): Chat model returned by ``init_chat_model``.
+            provider (str): Provider prefix of the model name.
+        """
+        if provider != "anthropic":
+            return
+        import anthropic
+
+        # ChatAnthropic builds its SDK clients in cached properties, seeding
+        # them makes it use the shared connection pools
+        params = {**getattr(llm, "_client_params"), "timeout": self._timeout}
+        llm.__dict__["_client"] = anthropic.Client(
+            **params, http_client=self.client(provider)
+        )
+        llm.__dict__["_async_client"] = anthropic.AsyncClient(
+            **params, http_client=self.async_client(provider)
+        )
+
+    def close(self) -> None:
+        self.log_stats()
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+    async def aclose(self) -> None:
+        with self._lock:
+            clients = list(self._async_clients.values())
+            self._async_clients.clear()
+        for client in clients:
+            await client.aclose()
+        self.close()
+
+
+@functools.cache
+def get_http_clients() -> HttpClients:
+    """Return the HTTP clients shared by every model in the process."""
+    return HttpClients(
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry_seconds,
+        ),
+        timeout=httpx.Timeout(
+            settings.http_timeout_seconds, connect=settings.http_connect_timeout_seconds
+        ),
+        http2=settings.http2,
+        log_interval=settings.http_stats_log_interval_seconds,
+    )
@@ -0,0 +1,407 @@
+import hashlib
+import json
+import logging
+import pickle
+import shutil
+import sqlite3
+import typing
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app import vector_index
+from app.knowledge_base import INDEX_NAME, INDEX_VERSION, MANIFEST_FILE
+from app.lexical import BM25Index
+from app.sqlite import ConnectionPool
+from app.vector_index import IndexSpec
+
+logger = logging.getLogger(__name__)
+
+TEXT_SUFFIXES = {".md", ".txt", ".rst"}
+TEXT_FIELDS = ("page_content", "text", "content", "body")
+MANIFEST_DB = "manifest.sqlite"
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sources (
+        source TEXT PRIMARY KEY,
+        digest TEXT NOT NULL,
+        run_id TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chunks (
+        source TEXT NOT NULL,
+        chunk_id TEXT NOT NULL,
+        PRIMARY KEY (source, chunk_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS chunks_chunk_id ON chunks (chunk_id)",
+)
+
+Source = tuple[str, list[Document]]
+
+
+def iter_jsonl(
+    path: Path, text_field: str | None = None, id_field: str | None = None
+) -> typing.Iterator[Source]:
+    """Stream one source per JSON line, keeping the other fields as metadata."""
+    with open(path) as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            key = text_field or next((k for k in TEXT_FIELDS if k in record), None)
+            if key is None:
+                logger.warning("No text field in %s:%s, skipping", path, line_no)
+                continue
+            source_id = record.get(id_field) if id_field else None
+            source = f"{path}#{source_id if source_id is not None else line_no}"
+            metadata = {
+                k: v
+                for k, v in record.items()
+                if k != key and isinstance(v, (str, int, float, bool))
+            }
+            text = str(record[key])
+            if "title" in metadata:
+                text = f"{metadata['title']}\n\n{text}"
+            yield source, [
+                Document(page_content=text, metadata={**metadata, "source": source})
+            ]
+
+
+def iter_sources(
+    path: Path, text_field: str | None = None, id_field: str | None = None
+) -> typing.Iterator[Source]:
+    """Stream sources from a text file, a JSONL file or a directory of them."""
+    paths = (
+        sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    )
+    for file_path in paths:
+        if file_path.suffix == ".jsonl":
+            yield from iter_jsonl(file_path, text_field, id_field)
+        elif file_path.suffix in TEXT_SUFFIXES:
+            source = str(file_path)
+            text = file_path.read_text(errors="replace")
+            yield source, [Document(page_content=text, metadata={"source": source})]
+
+
+@dataclass
+class IngestStats:
+    sources: int = 0
+    unchanged: int = 0
+    chunks_added: int = 0
+    chunks_deleted: int = 0
+    sources_deleted: int = 0
+
+
+class KnowledgeBaseIngestor:
+    """Incrementally maintained FAISS collection fed from streamed sources.
+
+    A SQLite manifest next to the index records a digest per source and the
+    content hashes of its chunks. Unchanged sources are skipped before they
+    are chunked, new chunks are embedded in batches and appended to the
+    index, and chunks no source references any more are deleted from it, so
+    the index is never rebuilt. Sources are streamed one at a time and a run
+    that changes nothing never loads the collection. A run that does loads
+    the whole index, docstore and BM25 index and rewrites them when it ends,
+    so its memory use and writes still grow with the collection.
+    The collection starts flat and is converted once to the approximate layout
+    of ``index_spec`` when it grows past ``index_spec.min_vectors``. The BM25
+    keyword index saved next to it is updated in step.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        embeddings: Embeddings,
+        embeddings_model: str,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 100,
+        batch_size: int = 256,
+        index_spec: IndexSpec | None = None,
+    ) -> None:
+        self._path = path
+        self._embeddings = embeddings
+        self._embeddings_model = embeddings_model
+        self._batch_size = batch_size
+        self._index_spec = index_spec or IndexSpec()
+        self._splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap
+        )
+        path.mkdir(parents=True, exist_ok=True)
+        self._pool = ConnectionPool(path / MANIFEST_DB, size=1)
+        self._pool.run(self._setup, write=True)
+        # loaded by the first change, unchanged corpora never need it
+        self._opened = False
+        self._store: FAISS | None = None
+        self._lexical = BM25Index()
+
+    def _setup(self, conn: sqlite3.Connection) -> None:
+        for statement in SCHEMA:
+            conn.execute(statement)
+        row = conn.execute(
+            "SELECT value FROM meta WHERE key = 'embeddings_model'"
+        ).fetchone()
+        if row is None:
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('embeddings_model', ?)",
+                (self._embeddings_model,),
+            )
+        elif row[0] != self._embeddings_model:
+            raise ValueError(
+                f"{self._path} was built with {row[0]}, "
+                f"re-ingest into a new folder to use {self._embeddings_model}"
+            )
+
+    def _load(self) -> FAISS | None:
+        index_dir = self._path / INDEX_NAME
+        if not (index_dir / f"{INDEX_NAME}.faiss").exists():
+            return None
+        # loaded writable, unlike the memory-mapped copy used for serving
+        index = faiss.read_index(str(index_dir / f"{INDEX_NAME}.faiss"))
+        vector_index.tune(index, self._index_spec)
+        with open(index_dir / f"{INDEX_NAME}.pkl", "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return FAISS(
+            embedding_function=self._embeddings,
+            index=index,
+            docstore=typing.cast(InMemoryDocstore, docstore),
+            index_to_docstore_id=index_to_docstore_id,
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
+            normalize_L2=True,
+        )
+
+    def _open(self) -> None:
+        if not self._opened:
+            self._store = self._load()
+            self._lexical = self._load_lexical()
+            self._opened = True
+
+    def _load_lexical(self) -> BM25Index:
+        if self._store is None:
+            return BM25Index()
+        return BM25Index.load(self._path / INDEX_NAME) or BM25Index.from_store(
+            self._store
+        )
+
+    def ingest(
+        self, sources: typing.Iterable[Source], prune: bool = False
+    ) -> IngestStats:
+        """Apply ``sources`` to the collection, adding and deleting chunks.
+
+        The manifest changes are committed only once the index is saved.
+
+        Args:
+            sources (Iterable[Source]): ``(source, documents)`` pairs.
+            prune (bool, optional): Delete sources not seen in this run.
+        """
+        stats = IngestStats()
+        run_id = uuid.uuid4().hex
+        pending: dict[str, Document] = {}
+        deleted: set[str] = set()
+
+        with self._pool.connection(write=True) as conn:
+            for source, docs in sources:
+                stats.sources += 1
+                digest = self._digest(docs)
+                row = conn.execute(
+                    "SELECT digest FROM sources WHERE source = ?", (source,)
+                ).fetchone()
+                conn.execute(
+                    "INSERT INTO sources (source, digest, run_id) VALUES (?, ?, ?) "
+                    "ON CONFLICT (source) DO UPDATE "
+                    "SET digest = excluded.digest, run_id = excluded.run_id",
+                    (source, digest, run_id),
+                )
+                if row is not None and row[0] == digest:
+                    stats.unchanged += 1
+                    continue
+
+                chunks = {
+                    self._chunk_id(source, chunk): chunk
+                    for chunk in self._splitter.split_documents(docs)
+                }
+                deleted.update(self._replace_chunks(conn, source, chunks, pending))
+                if len(pending) >= self._batch_size:
+                    stats.chunks_added += self._add(pending)
+
+            if prune:
+                for (source,) in conn.execute(
+                    "SELECT source FROM sources WHERE run_id != ?", (run_id,)
+                ).fetchall():
+                    deleted.update(self._replace_chunks(conn, source, {}, pending))
+                    conn.execute("DELETE FROM sources WHERE source = ?", (source,))
+                    stats.sources_deleted += 1
+
+            stats.chunks_added += self._add(pending)
+            stats.chunks_deleted = self._delete(deleted)
+            if stats.chunks_added or stats.chunks_deleted:
+                self._save()
+
+        logger.info("Ingested knowledge base into %s", self._path, extra=vars(stats))
+        return stats
+
+    def _replace_chunks(
+        self,
+        conn: sqlite3.Connection,
+        source: str,
+        chunks: dict[str, Document],
+        pending: dict[str, Document],
+    ) -> set[str]:
+        """Point ``source`` at ``chunks``, returning chunk ids left unreferenced."""
+        old = {
+            chunk_id
+            for (chunk_id,) in conn.execute(
+                "SELECT chunk_id FROM chunks WHERE source = ?", (source,)
+            )
+        }
+        removed = old - chunks.keys()
+        conn.executemany(
+            "DELETE FROM chunks WHERE source = ? AND chunk_id = ?",
+            [(source, chunk_id) for chunk_id in removed],
+        )
+
+        added = chunks.keys() - old
+        conn.executemany(
+            "INSERT INTO chunks (source, chunk_id) VALUES (?, ?)",
+            [(source, chunk_id) for chunk_id in added],
+        )
+        pending.update((chunk_id, chunks[chunk_id]) for chunk_id in added)
+        # a source listed twice in a run replaces the chunks it queued
+        for chunk_id in removed:
+            pending.pop(chunk_id, None)
+        # ids of collections ingested before they included the source may
+        # still be shared by several sources
+        return {chunk_id for chunk_id in removed if not self._indexed(conn, chunk_id)}
+
+    def _indexed(self, conn: sqlite3.Connection, chunk_id: str) -> bool:
+        return (
+            conn.execute(
+                "SELECT 1 FROM chunks WHERE chunk_id = ? LIMIT 1", (chunk_id,)
+            ).fetchone()
+            is not None
+        )
+
+    def _add(self, pending: dict[str, Document]) -> int:
+        if not pending:
+            return 0
+        self._open()
+        if self._store is not None:
+            # left over from a run that saved the index but failed to commit
+            for chunk_id in list(pending):
+                if isinstance(self._store.docstore.search(chunk_id), Document):
+                    pending.pop(chunk_id)
+        if not pending:
+            return 0
+
+        ids, docs = list(pending.keys()), list(pending.values())
+        if self._store is None:
+            self._store = FAISS.from_documents(
+                docs,
+                self._embeddings,
+                ids=ids,
+                distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
+                normalize_L2=True,
+            )
+        else:
+            self._store.add_documents(docs, ids=ids)
+        for chunk_id, doc in zip(ids, docs):
+            self._lexical.add(chunk_id, doc.page_content)
+        pending.clear()
+        return len(ids)
+
+    def _delete(self, chunk_ids: set[str]) -> int:
+        """Like ``FAISS.delete``, but for every index layout.
+
+        ``vector_index.remove`` shifts the positions after a removed vector
+        down, so the docstore mapping is renumbered the same way.
+        """
+        if not chunk_ids:
+            return 0
+        self._open()
+        store = self._store
+        if store is None:
+            return 0
+        positions = {
+            idx
+            for idx, chunk_id in store.index_to_docstore_id.items()
+            if chunk_id in chunk_ids
+        }
+        if not positions:
+            return 0
+
+        store.index = vector_index.remove(store.index, sorted(positions))
+        for idx in positions:
+            chunk_id = store.index_to_docstore_id[idx]
+            doc = store.docstore.search(chunk_id)
+            self._lexical.remove(
+                chunk_id, doc.page_content if isinstance(doc, Document) else None
+            )
+        store.docstore.delete([store.index_to_docstore_id[idx] for idx in positions])
+        remaining = [
+            chunk_id
+            for idx, chunk_id in sorted(store.index_to_docstore_id.items())
+            if idx not in positions
+        ]
+        store.index_to_docstore_id = dict(enumerate(remaining))
+        return len(positions)
+
+    def _save(self) -> None:
+        store = typing.cast(FAISS, self._store)
+        store.index = vector_index.convert(store.index, self._index_spec)
+        index_dir = self._path / INDEX_NAME
+        tmp_dir = index_dir.with_suffix(".tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        store.save_local(str(tmp_dir), INDEX_NAME)
+        self._lexical.save(tmp_dir)
+        manifest = {
+            "index_version": INDEX_VERSION,
+            "embeddings_model": self._embeddings_model,
+            "documents": store.index.ntotal,
+            "dimensions": store.index.d,
+            "index_type": vector_index.describe(store.index),
+            "faiss_version": faiss.__version__,
+            "created_at": datetime.now().isoformat(),
+        }
+        (tmp_dir / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+        shutil.rmtree(index_dir, ignore_errors=True)
+        tmp_dir.rename(index_dir)
+
+    @staticmethod
+    def _digest(docs: list[Document]) -> str:
+        digest = hashlib.sha256()
+        for doc in docs:
+            digest.update(doc.page_content.encode())
+            digest.update(json.dumps(doc.metadata, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _chunk_id(source: str, chunk: Document) -> str:
+        """Hash of the chunk within its source.
+
+        Identical chunks of different sources get their own entries, each
+        with its source's metadata and removed with its source.
+        """
+        digest = hashlib.sha256(source.encode())
+        digest.update(b"\0")
+        digest.update(chunk.page_content.encode())
+        return digest.hexdigest()
+
+    def close(self) -> None:
+        self._pool.close()
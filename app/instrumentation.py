@@ -0,0 +1,522 @@
+import bisect
+import logging
+import threading
+import time
+import typing
+import uuid
+from collections import defaultdict
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.runnables import RunnableConfig
+from tenacity import RetryCallState
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# loggers of provider SDKs that report their own HTTP retries
+RETRY_LOGGERS = {"openai": "openai._base_client", "anthropic": "anthropic._base_client"}
+# chat model runs made on behalf of another measured one, e.g. routing attempts
+NESTED_MODEL_TAG = "agent:nested_model"
+
+Labels = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric:
+    """Base class of the metrics rendered in the Prometheus text format."""
+
+    kind = ""
+
+    def __init__(self, name: str, description: str, labels: Labels = ()) -> None:
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: dict[str, str]) -> Labels:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _format_labels(self, values: Labels, **extra: str) -> str:
+        pairs = list(zip(self.labels, values)) + list(extra.items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.kind}",
+            *self._samples(),
+        ]
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: Labels = ()) -> None:
+        super().__init__(name, description, labels)
+        self._values: dict[Labels, float] = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._label_values(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}{self._format_labels(key)} {value}" for key, value in values
+        ]
+
+
+class Gauge(Metric):
+    """Current value, set directly or read from a function when rendered."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, labels: Labels = ()) -> None:
+        super().__init__(name, description, labels)
+        self._values: dict[Labels, float] = {}
+        self._functions: dict[Labels, typing.Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, func: typing.Callable[[], float], **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._functions[key] = func
+
+    def value(self, **labels: str) -> float:
+        key = self._label_values(labels)
+        func = self._functions.get(key)
+        return func() if func is not None else self._values.get(key, 0.0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            keys = list(self._values.keys() | self._functions.keys())
+        return [
+            f"{self.name}{self._format_labels(key)} "
+            f"{self.value(**dict(zip(self.labels, key)))}"
+            for key in keys
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Labels = (),
+        buckets: typing.Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: bucket counts (the last one is +Inf), sum
+        self._values: dict[Labels, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(
+                key, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[idx] += 1
+            total[0] += value
+
+    def count(self, **labels: str) -> int:
+        counts, _ = self._values.get(self._label_values(labels), ([], [0.0]))
+        return sum(counts)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = [
+                (key, list(counts), total[0])
+                for key, (counts, total) in self._values.items()
+            ]
+
+        lines = []
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], counts):
+                cumulative += count
+                labels = self._format_labels(key, le=str(bound))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide set of metrics exposed on the ``/metrics`` endpoint."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def counter(self, name: str, description: str, labels: Labels = ()) -> Counter:
+        return typing.cast(Counter, self._register(Counter(name, description, labels)))
+
+    def gauge(self, name: str, description: str, labels: Labels = ()) -> Gauge:
+        return typing.cast(Gauge, self._register(Gauge(name, description, labels)))
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labels: Labels = (),
+        buckets: typing.Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return typing.cast(
+            Histogram, self._register(Histogram(name, description, labels, buckets))
+        )
+
+    def _register(self, metric: Metric) -> Metric:
+        return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+turn_seconds = registry.histogram(
+    "agent_turn_seconds", "Wall time of an agent turn.", ("cached",)
+)
+first_chunk_seconds = registry.histogram(
+    "agent_first_chunk_seconds",
+    "Time from the user message to the first streamed chunk.",
+)
+node_seconds = registry.histogram(
+    "agent_node_seconds", "Wall time of a graph node run.", ("node", "status")
+)
+tool_seconds = registry.histogram(
+    "agent_tool_seconds", "Wall time of a tool call.", ("tool", "status")
+)
+retriever_seconds = registry.histogram(
+    "agent_retriever_seconds", "Wall time of a knowledge base search.", ("retriever",)
+)
+llm_seconds = registry.histogram(
+    "agent_llm_seconds", "Wall time of a chat model call.", ("model", "status")
+)
+llm_first_token_seconds = registry.histogram(
+    "agent_llm_first_token_seconds",
+    "Time from a chat model call to its first streamed token.",
+    ("model",),
+)
+llm_tokens = registry.counter(
+    "agent_llm_tokens_total", "Tokens used by chat model calls.", ("model", "kind")
+)
+llm_retries = registry.counter(
+    "agent_llm_retries_total", "Chat model requests retried.", ("source",)
+)
+memory_write_seconds = registry.histogram(
+    "agent_memory_write_seconds", "Wall time of a background mem0 write.", ("status",)
+)
+
+
+class InstrumentationHandler(BaseCallbackHandler):
+    """Callback handler timing graph nodes, tools and model calls of one turn.
+
+    Observations go to the process-wide histograms and a summary of the turn
+    is logged as a structured ``agent_turn`` event when the graph run ends.
+    """
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.nodes: dict[str, float] = defaultdict(float)
+        self.tools: dict[str, float] = defaultdict(float)
+        self.first_token: float | None = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.retries = 0
+        self.errors = 0
+        # run id -> (label, start time)
+        self._runs: dict[uuid.UUID, tuple[str, float]] = {}
+        self._first_tokens: set[uuid.UUID] = set()
+        self._lock = threading.Lock()
+
+    def summary(self) -> dict[str, typing.Any]:
+        return {
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "first_token_ms": (
+                round((self.first_token - self.started) * 1000, 2)
+                if self.first_token is not None
+                else None
+            ),
+            "nodes_ms": {k: round(v * 1000, 2) for k, v in self.nodes.items()},
+            "tools_ms": {k: round(v * 1000, 2) for k, v in self.tools.items()},
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "retries": self.retries,
+            "errors": self.errors,
+        }
+
+    def _start(self, run_id: uuid.UUID, label: str) -> None:
+        with self._lock:
+            self._runs[run_id] = (label, time.perf_counter())
+
+    def _stop(self, run_id: uuid.UUID) -> tuple[str, float] | None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return None
+        label, started = run
+        return label, time.perf_counter() - started
+
+    def on_chain_start(
+        self,
+        serialized: dict[str, typing.Any],
+        inputs: dict[str, typing.Any],
+        *,
+        run_id: uuid.UUID,
+        parent_run_id: uuid.UUID | None = None,
+        tags: list[str] | None = None,
+        metadata: dict[str, typing.Any] | None = None,
+        **kwargs: typing.Any,
+    ) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        is_node_run = kwargs.get("name") == node and any(
+            tag.startswith("graph:step:") for tag in tags or ()
+        )
+        if parent_run_id is None:
+            self._start(run_id, "")
+        elif is_node_run:
+            self._start(run_id, typing.cast(str, node))
+
+    def on_chain_end(
+        self,
+        outputs: dict[str, typing.Any],
+        *,
+        run_id: uuid.UUID,
+        parent_run_id: uuid.UUID | None = None,
+        **kwargs: typing.Any,
+    ) -> None:
+        self._end_chain(run_id, parent_run_id, "ok")
+
+    def on_chain_error(
+        self,
+        error: BaseException,
+        *,
+        run_id: uuid.UUID,
+        parent_run_id: uuid.UUID | None = None,
+        **kwargs: typing.Any,
+    ) -> None:
+        self._end_chain(run_id, parent_run_id, "error")
+
+    def _end_chain(
+        self, run_id: uuid.UUID, parent_run_id: uuid.UUID | None, status: str
+    ) -> None:
+        run = self._stop(run_id)
+        if run is None:
+            return
+        node, elapsed = run
+        if parent_run_id is not None:
+            self.nodes[node] += elapsed
+            node_seconds.observe(elapsed, node=node, status=status)
+            return
+
+        if status == "error":
+            self.errors += 1
+        logger.info("agent_turn", extra={"status": status, **self.summary()})
+
+    def on_tool_start(
+        self,
+        serialized: dict[str, typing.Any],
+        input_str: str,
+        *,
+        run_id: uuid.UUID,
+        **kwargs: typing.Any,
+    ) -> None:
+        self._start(run_id, serialized.get("name") or kwargs.get("name") or "unknown")
+
+    def on_tool_end(
+        self, output: typing.Any, *, run_id: uuid.UUID, **kwargs: typing.Any
+    ) -> None:
+        self._end_tool(run_id, "ok")
+
+    def on_tool_error(
+        self, error: BaseException, *, run_id: uuid.UUID, **kwargs: typing.Any
+    ) -> None:
+        self.errors += 1
+        self._end_tool(run_id, "error")
+
+    def _end_tool(self, run_id: uuid.UUID, status: str) -> None:
+        run = self._stop(run_id)
+        if run is not None:
+            tool, elapsed = run
+            self.tools[tool] += elapsed
+            tool_seconds.observe(elapsed, tool=tool, status=status)
+
+    def on_retriever_start(
+        self,
+        serialized: dict[str, typing.Any],
+        query: str,
+        *,
+        run_id: uuid.UUID,
+        **kwargs: typing.Any,
+    ) -> None:
+        self._start(run_id, kwargs.get("name") or serialized.get("name") or "unknown")
+
+    def on_retriever_end(
+        self, documents: typing.Any, *, run_id: uuid.UUID, **kwargs: typing.Any
+    ) -> None:
+        run = self._stop(run_id)
+        if run is not None:
+            retriever_seconds.observe(run[1], retriever=run[0])
+
+    def on_retriever_error(
+        self, error: BaseException, *, run_id: uuid.UUID, **kwargs: typing.Any
+    ) -> None:
+        self._stop(run_id)
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, typing.Any],
+        messages: list[list[BaseMessage]],
+        *,
+        run_id: uuid.UUID,
+        tags: list[str] | None = None,
+        metadata: dict[str, typing.Any] | None = None,
+        **kwargs: typing.Any,
+    ) -> None:
+        if NESTED_MODEL_TAG in (tags or ()):
+            return
+        metadata = metadata or {}
+        model = (
+            metadata.get("ls_model_name") or metadata.get("ls_provider") or "unknown"
+        )
+        self._start(run_id, str(model))
+
+    def on_llm_new_token(
+        self, token: str, *, run_id: uuid.UUID, **kwargs: typing.Any
+    ) -> None:
+        with self._lock:
+            if run_id in self._first_tokens or run_id not in self._runs:
+                return
+            self._first_tokens.add(run_id)
+            model, started = self._runs[run_id]
+        now = time.perf_counter()
+        if self.first_token is None:
+            self.first_token = now
+        llm_first_token_seconds.observe(now - started, model=model)
+
+    def on_llm_end(
+        self, response: LLMResult, *, run_id: uuid.UUID, **kwargs: typing.Any
+    ) -> None:
+        self._first_tokens.discard(run_id)
+        run = self._stop(run_id)
+        if run is None:
+            return
+        model, elapsed = run
+        llm_seconds.observe(elapsed, model=model, status="ok")
+
+        for generations in response.generations:
+            for generation in generations:
+                usage = (
+                    getattr(generation.message, "usage_metadata", None)
+                    if isinstance(generation, ChatGeneration)
+                    else None
+                )
+                if not usage:
+                    continue
+                self.prompt_tokens += usage["input_tokens"]
+                self.completion_tokens += usage["output_tokens"]
+                llm_tokens.inc(usage["input_tokens"], model=model, kind="prompt")
+                llm_tokens.inc(usage["output_tokens"], model=model, kind="completion")
+
+    def on_llm_error(
+        self,
+        error: BaseException,
+        *,
+        run_id: uuid.UUID,
+        tags: list[str] | None = None,
+        **kwargs: typing.Any,
+    ) -> None:
+        if NESTED_MODEL_TAG in (tags or ()):
+            return
+        self.errors += 1
+        self._first_tokens.discard(run_id)
+        run = self._stop(run_id)
+        if run is not None:
+            llm_seconds.observe(run[1], model=run[0], status="error")
+
+    def on_retry(
+        self, retry_state: RetryCallState, *, run_id: uuid.UUID, **kwargs: typing.Any
+    ) -> None:
+        self.retries += 1
+        llm_retries.inc(source="runnable")
+
+
+def get_handler(config: RunnableConfig) -> InstrumentationHandler | None:
+    callbacks = config.get("callbacks")
+    handlers = (
+        callbacks if isinstance(callbacks, list) else getattr(callbacks, "handlers", [])
+    )
+    for handler in handlers or ():
+        if isinstance(handler, InstrumentationHandler):
+            return handler
+    return None
+
+
+def instrument(config: RunnableConfig) -> tuple[RunnableConfig, InstrumentationHandler]:
+    """Return ``config`` with an instrumentation handler, reusing one if present."""
+    handler = get_handler(config)
+    if handler is not None:
+        return config, handler
+
+    handler = InstrumentationHandler()
+    callbacks = config.get("callbacks")
+    if callbacks is None:
+        callbacks = [handler]
+    elif isinstance(callbacks, list):
+        callbacks = [*callbacks, handler]
+    else:
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler)
+    return RunnableConfig(**{**config, "callbacks": callbacks}), handler
+
+
+class RetryLogCounter(logging.Handler):
+    """Count the HTTP retries provider SDKs only report through their logs."""
+
+    def __init__(self, source: str) -> None:
+        super().__init__(level=logging.INFO)
+        self.source = source
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if str(record.msg).startswith("Retrying request"):
+            llm_retries.inc(source=self.source)
+
+
+def install_retry_counters() -> None:
+    for source, logger_name in RETRY_LOGGERS.items():
+        sdk_logger = logging.getLogger(logger_name)
+        if any(isinstance(h, RetryLogCounter) for h in sdk_logger.handlers):
+            continue
+        sdk_logger.addHandler(RetryLogCounter(source))
+        # retries are logged at INFO, the SDKs default to WARNING
+        if sdk_logger.getEffectiveLevel() > logging.INFO:
+            sdk_logger.setLevel(logging.INFO)
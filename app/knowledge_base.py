@@ -0,0 +1,260 @@
+import contextlib
+import functools
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import threading
+import time
+import typing
+import warnings
+import weakref
+from datetime import datetime
+from pathlib import Path
+
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app import utils, vector_index
+from app.config import settings
+from app.lexical import BM25Index
+from app.vector_index import IndexSpec
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "index"
+MANIFEST_FILE = "manifest.json"
+# bump when the index layout changes so stale indexes are rebuilt
+INDEX_VERSION = 2
+# temporary folders younger than this may still be written by another process
+STALE_TMP_SECONDS = 60 * 60
+
+# langchain warns about `normalize_L2` with inner product, but still normalises
+# the vectors, which is what turns inner product scores into cosine similarity
+warnings.filterwarnings(
+    "ignore", message="Normalizing L2 is not applicable", category=UserWarning
+)
+
+
+class KnowledgeBaseIndex:
+    """Process-wide manager for the knowledge base FAISS index.
+
+    Indexes are keyed by a hash of the corpus and the embeddings model, persisted
+    with ``save_local`` next to a manifest and memory-mapped when loaded back, so
+    only the first build of a given corpus pays for embedding calls. Vectors are
+    normalised and searched by inner product, so scores are cosine similarities.
+    Large corpora are indexed with the approximate layout of ``index_spec``.
+    A BM25 keyword index of the same documents is saved alongside.
+    """
+
+    def __init__(
+        self,
+        index_dir: Path,
+        embeddings: Embeddings,
+        embeddings_model: str,
+        index_spec: IndexSpec | None = None,
+    ) -> None:
+        self._index_dir = index_dir
+        self._embeddings = embeddings
+        self._embeddings_model = embeddings_model
+        self._index_spec = index_spec or IndexSpec()
+        self._stores: dict[str, FAISS] = {}
+        # keys built by this process, the only ones it prunes
+        self._built: set[str] = set()
+        self._lexical: weakref.WeakKeyDictionary[FAISS, BM25Index] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embeddings
+
+    def content_hash(self, docs: typing.Sequence[Document]) -> str:
+        """Hash the corpus together with the embeddings model and index layout."""
+        digest = hashlib.sha256(
+            f"{INDEX_VERSION}:{self._embeddings_model}:{self._index_spec.key()}".encode()
+        )
+        for doc in docs:
+            digest.update(doc.page_content.encode())
+            digest.update(json.dumps(doc.metadata, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def load(self, docs: typing.Sequence[Document]) -> FAISS:
+        """Return the index for ``docs``, building and persisting it if needed."""
+        key = self.content_hash(docs)
+        with self._lock:
+            if key in self._stores:
+                return self._stores[key]
+
+            path = self._index_dir / key
+            if self._read_manifest(path).get("content_hash") == key:
+                store = self._load_local(path)
+                logger.info("Loaded knowledge base index from %s", path)
+            else:
+                store = self._build(docs, path, key)
+                logger.info("Built knowledge base index at %s", path)
+
+            self._stores[key] = store
+            return store
+
+    def load_ingested(self, path: Path) -> FAISS | None:
+        """Return the collection written by the ingestion pipeline, if any.
+
+        Args:
+            path (Path): Folder passed to ``KnowledgeBaseIngestor``.
+        """
+        index_dir = path / INDEX_NAME
+        manifest = self._read_manifest(index_dir)
+        if not manifest:
+            return None
+        if (
+            manifest.get("embeddings_model") != self._embeddings_model
+            or manifest.get("index_version") != INDEX_VERSION
+        ):
+            logger.warning("Ignoring ingested knowledge base at %s, re-ingest it", path)
+            return None
+
+        key = f"ingested:{index_dir}:{manifest.get('created_at')}"
+        with self._lock:
+            if key not in self._stores:
+                self._stores[key] = self._load_local(index_dir)
+                logger.info("Loaded ingested knowledge base from %s", index_dir)
+            return self._stores[key]
+
+    def lexical(self, store: FAISS) -> BM25Index:
+        """Return the keyword index saved with ``store``, or build one."""
+        with self._lock:
+            if store not in self._lexical:
+                self._lexical[store] = BM25Index.from_store(store)
+            return self._lexical[store]
+
+    def _build(self, docs: typing.Sequence[Document], path: Path, key: str) -> FAISS:
+        store = FAISS.from_documents(
+            list(docs),
+            self._embeddings,
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
+            normalize_L2=True,
+        )
+        store.index = vector_index.convert(store.index, self._index_spec)
+
+        # write into a temporary folder first so a crash never leaves a
+        # half-written index behind a valid manifest, one per process as
+        # several workers may build the same corpus at once
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        store.save_local(str(tmp_path), INDEX_NAME)
+        lexical = BM25Index.from_store(store)
+        lexical.save(tmp_path)
+        self._lexical[store] = lexical
+        manifest = {
+            "content_hash": key,
+            "index_version": INDEX_VERSION,
+            "embeddings_model": self._embeddings_model,
+            "documents": len(docs),
+            "dimensions": store.index.d,
+            "index_type": vector_index.describe(store.index),
+            "faiss_version": faiss.__version__,
+            "created_at": datetime.now().isoformat(),
+        }
+        (tmp_path / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+
+        if not self._publish(tmp_path, path, key):
+            # another process published the same index first, serve theirs
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return self._load_local(path)
+        self._built.add(key)
+        self._prune(keep=key)
+        return store
+
+    def _publish(self, tmp_path: Path, path: Path, key: str) -> bool:
+        """Move a built index into place, ``False`` if ``path`` already has it."""
+        try:
+            tmp_path.rename(path)
+            return True
+        except OSError:
+            if self._read_manifest(path).get("content_hash") == key:
+                return False
+        # a broken index is in the way, moved aside for `_prune` to remove
+        with contextlib.suppress(FileNotFoundError):
+            path.rename(path.with_name(f"{path.name}.{os.getpid()}.broken.tmp"))
+        try:
+            tmp_path.rename(path)
+        except OSError:
+            if self._read_manifest(path).get("content_hash") != key:
+                raise
+            return False
+        return True
+
+    def _load_local(self, path: Path) -> FAISS:
+        # IO_FLAG_MMAP alone still reads flat codes into memory
+        index = faiss.read_index(
+            str(path / f"{INDEX_NAME}.faiss"),
+            faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY,
+        )
+        vector_index.tune(index, self._index_spec)
+        # the docstore is written by `FAISS.save_local` from this process
+        with open(path / f"{INDEX_NAME}.pkl", "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+
+        store = FAISS(
+            embedding_function=self._embeddings,
+            index=index,
+            docstore=typing.cast(InMemoryDocstore, docstore),
+            index_to_docstore_id=index_to_docstore_id,
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
+            normalize_L2=True,
+        )
+        lexical = BM25Index.load(path)
+        if lexical is not None:
+            self._lexical[store] = lexical
+        return store
+
+    def _prune(self, keep: str) -> None:
+        """Remove indexes this process built for previous versions of the corpus.
+
+        Indexes of other processes are kept, as they may still serve them,
+        e.g. with other settings during a rolling deploy. Temporary folders
+        are only removed once stale, as another process may be writing them.
+        """
+        for path in self._index_dir.iterdir():
+            if not path.is_dir() or path.name == keep:
+                continue
+            if path.suffix != ".tmp" and path.name not in self._built:
+                continue
+            try:
+                if path.suffix == ".tmp" and (
+                    time.time() - path.stat().st_mtime < STALE_TMP_SECONDS
+                ):
+                    continue
+            except OSError:
+                # removed by another process in the meantime
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+
+    @staticmethod
+    def _read_manifest(path: Path) -> dict[str, typing.Any]:
+        try:
+            return typing.cast(
+                dict[str, typing.Any], json.loads((path / MANIFEST_FILE).read_text())
+            )
+        except (OSError, ValueError):
+            return {}
+
+
+@functools.cache
+def get_knowledge_base_index() -> KnowledgeBaseIndex:
+    """Return the knowledge base index manager shared by every session."""
+    settings.knowledge_base_dir.mkdir(parents=True, exist_ok=True)
+    return KnowledgeBaseIndex(
+        index_dir=settings.knowledge_base_dir,
+        embeddings=utils.load_embeddings_model(),
+        embeddings_model=settings.embeddings_model,
+        index_spec=IndexSpec.from_settings(),
+    )
@@ -0,0 +1,130 @@
+import heapq
+import math
+import pickle
+import re
+import typing
+from collections import Counter
+from pathlib import Path
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+LEXICAL_FILE = "lexical.pkl"
+
+# words, numbers and identifiers such as emails, SKUs or version numbers
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[@._+/-][a-z0-9]+)*")
+PART_RE = re.compile(r"[@._+/-]")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or "
+    "our the their there this to was we what when where which who why will with "
+    "you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased terms of ``text``, stop words removed.
+
+    Compound identifiers are kept whole, so an exact email or SKU is a single
+    rare term, and their parts are added so partial queries still match.
+    """
+    terms = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        if PART_RE.search(token):
+            terms.extend(part for part in PART_RE.split(token) if part)
+    return terms
+
+
+class BM25Index:
+    """In-memory inverted index scoring documents with Okapi BM25.
+
+    Postings map each term to the documents containing it and their term
+    frequency, so a query only scores documents sharing a term with it.
+    Terms found in more than ``max_df`` of the documents are skipped at
+    query time: they barely change the ranking but have the longest posting
+    lists. Documents are keyed by their docstore id and can be added and
+    removed in place, which lets the ingestion pipeline keep it next to the
+    FAISS index without rebuilding either.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, max_df: float = 0.5) -> None:
+        self.k1 = k1
+        self.b = b
+        self.max_df = max_df
+        self._postings: dict[str, dict[str, int]] = {}
+        self._lengths: dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self._lengths
+
+    def add(self, doc_id: str, text: str) -> None:
+        if doc_id in self._lengths:
+            self.remove(doc_id)
+        terms = tokenize(text)
+        for term, count in Counter(terms).items():
+            self._postings.setdefault(term, {})[doc_id] = count
+        self._lengths[doc_id] = len(terms)
+        self._total_length += len(terms)
+
+    def remove(self, doc_id: str, text: str | None = None) -> None:
+        """Remove a document, ``text`` avoids scanning every posting list."""
+        length = self._lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        terms = set(tokenize(text)) if text is not None else list(self._postings)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None and postings.pop(doc_id, None) is not None:
+                if not postings:
+                    del self._postings[term]
+
+    def search(self, query: str, k: int = 4) -> list[tuple[str, float]]:
+        """Return the ``k`` best ``(doc_id, score)`` pairs, best first."""
+        if not self._lengths:
+            return []
+        count = len(self._lengths)
+        average_length = self._total_length / count or 1
+        scores: dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings or len(postings) > self.max_df * count:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                norm = self.k1 * (
+                    1 - self.b + self.b * self._lengths[doc_id] / average_length
+                )
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (
+                    self.k1 + 1
+                ) / (frequency + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    @classmethod
+    def from_store(cls, store: FAISS) -> "BM25Index":
+        """Index every document of a FAISS store, in index order."""
+        index = cls()
+        for doc_id in store.index_to_docstore_id.values():
+            doc = store.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                index.add(doc_id, doc.page_content)
+        return index
+
+    def save(self, path: Path) -> None:
+        with open(path / LEXICAL_FILE, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index | None":
+        try:
+            # written by `save` from this process, next to the FAISS docstore
+            with open(path / LEXICAL_FILE, "rb") as f:
+                return typing.cast(BM25Index, pickle.load(f))
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
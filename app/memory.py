@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import time
+import typing
+from collections import OrderedDict
+
+from langchain_core.messages import BaseMessage
+from mem0 import Memory
+
+from app import instrumentation, utils
+from app.config import settings
+from app.recall import get_recall_cache
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryIngestionQueue:
+    """Persists conversation turns to mem0 in the background.
+
+    Writes are coalesced per user, so a user sending several messages while a
+    write is in flight results in a single follow-up ``Memory.add`` call. Only
+    messages whose ids have not been queued before are sent, failed writes are
+    retried with exponential backoff and ``flush`` drains the queue on shutdown.
+    """
+
+    def __init__(
+        self,
+        memory: Memory,
+        workers: int = 2,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        max_tracked_threads: int = 10_000,
+    ) -> None:
+        self._memory = memory
+        self._workers = workers
+        self._max_retries = max_retries
+        self._retry_backoff = retry_backoff
+        self._max_tracked_threads = max_tracked_threads
+
+        # user_id -> messages waiting to be written, and when they were queued
+        self._pending: dict[str, list[dict[str, str]]] = {}
+        self._pending_since: dict[str, float] = {}
+        # user_id -> when the messages being written were queued
+        self._in_flight: dict[str, float] = {}
+        # thread_id -> ids of messages already handed to mem0
+        self._seen: OrderedDict[str, set[str]] = OrderedDict()
+
+        self._queue: asyncio.Queue[str] | None = None
+        self._tasks: list[asyncio.Task[None]] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+        self.persisted = 0
+        self.failed = 0
+        self.retries = 0
+        self.last_lag = 0.0
+
+    @property
+    def depth(self) -> int:
+        """Number of users with writes waiting or in flight."""
+        return len(self._pending.keys() | self._in_flight.keys())
+
+    @property
+    def lag(self) -> float:
+        """Age in seconds of the oldest write waiting or in flight."""
+        queued_at = [*self._pending_since.values(), *self._in_flight.values()]
+        if not queued_at:
+            return 0.0
+        return time.monotonic() - min(queued_at)
+
+    def stats(self) -> dict[str, float | int]:
+        return {
+            "depth": self.depth,
+            "lag": round(self.lag, 3),
+            "last_lag": round(self.last_lag, 3),
+            "persisted": self.persisted,
+            "failed": self.failed,
+            "retries": self.retries,
+        }
+
+    def enqueue(
+        self, user_id: str, thread_id: str, messages: typing.Sequence[BaseMessage]
+    ) -> int:
+        """Queue the messages of a thread not yet sent to mem0.
+
+        Returns the number of messages queued.
+        """
+        seen = self._seen.setdefault(thread_id, set())
+        self._seen.move_to_end(thread_id)
+        while len(self._seen) > self._max_tracked_threads:
+            self._seen.popitem(last=False)
+
+        new_messages = [msg for msg in messages if msg.id is None or msg.id not in seen]
+        seen.update(msg.id for msg in new_messages if msg.id is not None)
+
+        payload = utils.prepare_memory_messages(new_messages)
+        if not payload:
+            return 0
+
+        queue = self._ensure_workers()
+        if user_id not in self._pending:
+            self._pending[user_id] = []
+            self._pending_since[user_id] = time.monotonic()
+            # a user already being written is re-queued once that write is done
+            if user_id not in self._in_flight:
+                queue.put_nowait(user_id)
+        self._pending[user_id].extend(payload)
+
+        return len(payload)
+
+    async def flush(self) -> None:
+        """Wait until every queued write has been persisted or given up on."""
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def aclose(self) -> None:
+        """Flush pending writes and stop the workers."""
+        await self.flush()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Memory ingestion queue stopped", extra=self.stats())
+
+    def _ensure_workers(self) -> asyncio.Queue[str]:
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._tasks = [
+                loop.create_task(self._worker()) for _ in range(self._workers)
+            ]
+        return self._queue
+
+    async def _worker(self) -> None:
+        queue = typing.cast(asyncio.Queue[str], self._queue)
+        while True:
+            user_id = await queue.get()
+            messages = self._pending.pop(user_id)
+            queued_at = self._pending_since.pop(user_id)
+            self._in_flight[user_id] = queued_at
+            try:
+                await self._persist(user_id, messages)
+                self.last_lag = time.monotonic() - queued_at
+            finally:
+                self._in_flight.pop(user_id, None)
+                if user_id in self._pending:
+                    queue.put_nowait(user_id)
+                queue.task_done()
+
+            logger.debug("Persisted memories for %s", user_id, extra=self.stats())
+
+    async def _persist(self, user_id: str, messages: list[dict[str, str]]) -> None:
+        for attempt in range(self._max_retries + 1):
+            started = time.perf_counter()
+            try:
+                await utils.run_blocking(self._memory.add, messages, user_id=user_id)
+                await get_recall_cache().ainvalidate(user_id)
+                instrumentation.memory_write_seconds.observe(
+                    time.perf_counter() - started, status="ok"
+                )
+                self.persisted += 1
+                return
+            except Exception:
+                instrumentation.memory_write_seconds.observe(
+                    time.perf_counter() - started, status="error"
+                )
+                if attempt == self._max_retries:
+                    self.failed += 1
+                    logger.exception("Giving up saving memories for %s", user_id)
+                    return
+                self.retries += 1
+                await asyncio.sleep(self._retry_backoff * 2**attempt)
+
+
+_queues: dict[int, MemoryIngestionQueue] = {}
+
+queue_depth = instrumentation.registry.gauge(
+    "agent_memory_queue_depth", "Users with memory writes waiting or in flight."
+)
+queue_depth.set_function(lambda: sum(queue.depth for queue in list(_queues.values())))
+queue_lag = instrumentation.registry.gauge(
+    "agent_memory_queue_lag_seconds",
+    "Age of the oldest memory write waiting to be persisted.",
+)
+queue_lag.set_function(
+    lambda: max((queue.lag for queue in list(_queues.values())), default=0.0)
+)
+
+
+def get_ingestion_queue(memory: Memory) -> MemoryIngestionQueue:
+    """Return the process-wide ingestion queue for a memory store."""
+    key = id(memory)
+    if key not in _queues:
+        _queues[key] = MemoryIngestionQueue(
+            memory,
+            workers=settings.memory_ingestion_workers,
+            max_retries=settings.memory_ingestion_max_retries,
+            retry_backoff=settings.memory_ingestion_retry_backoff,
+        )
+    return _queues[key]
+
+
+async def shutdown() -> None:
+    """Flush every ingestion queue, called when the app stops."""
+    await asyncio.gather(*(queue.aclose() for queue in _queues.values()))
@@ -0,0 +1,494 @@
+import abc
+import contextlib
+import hashlib
+import heapq
+import json
+import logging
+import sqlite3
+import threading
+import typing
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+from mem0 import Memory
+from mem0.configs.base import MemoryConfig
+from mem0.memory import telemetry as mem0_telemetry
+from mem0.vector_stores.base import VectorStoreBase
+from mem0.vector_stores.qdrant import Qdrant
+from qdrant_client import QdrantClient
+
+from app.sqlite import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+def disable_telemetry() -> None:
+    """Stop mem0 from sending usage events on every add and search."""
+    mem0_telemetry.telemetry.posthog.disabled = True
+
+
+class BatchingVectorStore(VectorStoreBase, abc.ABC):  # type: ignore[misc]
+    """mem0 vector store whose inserts can be buffered and written at once.
+
+    Inserts made inside ``batch`` are buffered per thread and handed to
+    ``_insert`` together when the block exits.
+    """
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def batch(self, user_id: str | None = None) -> typing.Iterator[None]:
+        """Buffer the inserts of the calling thread until the block exits.
+
+        Args:
+            user_id (str | None): The user being added to, whose memories
+                are looked up first by id.
+        """
+        inserts: list[tuple[list[float], dict[str, typing.Any], str]] = []
+        self._local.inserts = inserts
+        self._local.user_id = user_id
+        try:
+            yield
+        finally:
+            self._local.inserts = None
+            self._local.user_id = None
+            if inserts:
+                vectors, payloads, ids = map(list, zip(*inserts))
+                self._insert(vectors, payloads, ids)
+
+    def insert(
+        self,
+        vectors: list[list[float]],
+        payloads: list[dict[str, typing.Any]] | None = None,
+        ids: list[str] | None = None,
+    ) -> None:
+        payloads = payloads or [{} for _ in vectors]
+        ids = ids or [str(idx) for idx in range(len(vectors))]
+        inserts = getattr(self._local, "inserts", None)
+        if inserts is not None:
+            inserts.extend(zip(vectors, payloads, ids))
+            return
+        self._insert(vectors, payloads, ids)
+
+    @abc.abstractmethod
+    def _insert(
+        self,
+        vectors: list[list[float]],
+        payloads: list[dict[str, typing.Any]],
+        ids: list[str],
+    ) -> None:
+        """Write the vectors, a whole batch at once inside ``batch``."""
+
+
+class UserPartitionedVectorStore(BatchingVectorStore):
+    """mem0 vector store keeping each user's memories in their own collection.
+
+    A search for a user only scans that user's vectors and needs no payload
+    filter on the user id, which embedded Qdrant checks point by point in
+    Python. Collections are created on a user's first insert; memories
+    without a user go to the base collection. Calls by memory id look in the
+    collection of the user being added to first, then in every collection.
+    A batch of inserts is written with one upsert per collection.
+    """
+
+    def __init__(
+        self,
+        client: QdrantClient,
+        collection_name: str,
+        embedding_model_dims: int,
+        on_disk: bool = True,
+    ) -> None:
+        self.client = client
+        self.collection_name = collection_name
+        self._embedding_model_dims = embedding_model_dims
+        self._on_disk = on_disk
+        # collection name -> store, for the collections opened so far
+        self._stores: dict[str, Qdrant] = {}
+        self._collections = {
+            collection.name
+            for collection in client.get_collections().collections
+            if collection.name == collection_name
+            or collection.name.startswith(f"{collection_name}_")
+        }
+        self._lock = threading.Lock()
+        super().__init__()
+
+    @classmethod
+    def from_memory(cls, memory: Memory) -> "UserPartitionedVectorStore":
+        """Partition the Qdrant store mem0 was built with by user."""
+        config = memory.config.vector_store.config
+        return cls(
+            client=memory.vector_store.client,
+            collection_name=config.collection_name,
+            embedding_model_dims=config.embedding_model_dims,
+            on_disk=bool(config.on_disk),
+        )
+
+    def collection_for(self, user_id: str | None) -> str:
+        if not user_id:
+            return self.collection_name
+        digest = hashlib.sha1(user_id.encode()).hexdigest()[:16]
+        return f"{self.collection_name}_{digest}"
+
+    def _store(self, name: str, create: bool = False) -> Qdrant | None:
+        with self._lock:
+            store = self._stores.get(name)
+            if store is None and (create or name in self._collections):
+                # creates the collection unless it exists
+                store = Qdrant(
+                    collection_name=name,
+                    embedding_model_dims=self._embedding_model_dims,
+                    client=self.client,
+                    on_disk=self._on_disk,
+                )
+                self._stores[name] = store
+                self._collections.add(name)
+            return store
+
+    def _stores_for(self, filters: dict[str, typing.Any] | None) -> list[Qdrant]:
+        if filters and "user_id" in filters:
+            store = self._store(self.collection_for(filters["user_id"]))
+            return [store] if store else []
+        with self._lock:
+            names = sorted(self._collections)
+        return [store for name in names if (store := self._store(name))]
+
+    @staticmethod
+    def _without_user(
+        filters: dict[str, typing.Any] | None,
+    ) -> dict[str, typing.Any] | None:
+        # the collection already holds a single user's memories
+        rest = {
+            key: value for key, value in (filters or {}).items() if key != "user_id"
+        }
+        return rest or None
+
+    def _candidates(self) -> typing.Iterator[Qdrant]:
+        hint = getattr(self._local, "user_id", None)
+        first = self._store(self.collection_for(hint)) if hint else None
+        if first:
+            yield first
+        for store in self._stores_for(None):
+            if store is not first:
+                yield store
+
+    def _locate(self, vector_id: str) -> tuple[Qdrant, typing.Any]:
+        for store in self._candidates():
+            record = store.get(vector_id)
+            if record is not None:
+                return store, record
+        raise KeyError(vector_id)
+
+    def create_col(self, name: str, vector_size: int, distance: typing.Any) -> None:
+        # collections are created on a user's first insert
+        pass
+
+    def _insert(
+        self,
+        vectors: list[list[float]],
+        payloads: list[dict[str, typing.Any]],
+        ids: list[str],
+    ) -> None:
+        groups: dict[str, list[int]] = {}
+        for idx, payload in enumerate(payloads):
+            name = self.collection_for(payload.get("user_id"))
+            groups.setdefault(name, []).append(idx)
+        for name, indices in groups.items():
+            store = typing.cast(Qdrant, self._store(name, create=True))
+            store.insert(
+                vectors=[vectors[idx] for idx in indices],
+                payloads=[payloads[idx] for idx in indices],
+                ids=[ids[idx] for idx in indices],
+            )
+
+    def search(
+        self,
+        query: list[float],
+        limit: int = 5,
+        filters: dict[str, typing.Any] | None = None,
+    ) -> list[typing.Any]:
+        rest = self._without_user(filters)
+        # `query_points` rather than mem0's `search`, which calls an API
+        # removed from recent qdrant-client releases
+        results = [
+            hit
+            for store in self._stores_for(filters)
+            for hit in self.client.query_points(
+                collection_name=store.collection_name,
+                query=query,
+                query_filter=store._create_filter(rest) if rest else None,
+                limit=limit,
+            ).points
+        ]
+        return heapq.nlargest(limit, results, key=lambda hit: hit.score)
+
+    def delete(self, vector_id: str) -> None:
+        store, _ = self._locate(vector_id)
+        store.delete(vector_id=vector_id)
+
+    def update(
+        self,
+        vector_id: str,
+        vector: list[float] | None = None,
+        payload: dict[str, typing.Any] | None = None,
+    ) -> None:
+        store, _ = self._locate(vector_id)
+        store.update(vector_id=vector_id, vector=vector, payload=payload)
+
+    def get(self, vector_id: str) -> typing.Any:
+        try:
+            return self._locate(vector_id)[1]
+        except KeyError:
+            return None
+
+    def list_cols(self) -> typing.Any:
+        return self.client.get_collections()
+
+    def delete_col(self) -> None:
+        for store in self._stores_for(None):
+            store.delete_col()
+        with self._lock:
+            self._stores.clear()
+            self._collections.clear()
+
+    def col_info(self) -> list[typing.Any]:
+        return [store.col_info() for store in self._stores_for(None)]
+
+    def list(
+        self, filters: dict[str, typing.Any] | None = None, limit: int = 100
+    ) -> tuple[list[typing.Any], None]:
+        rest = self._without_user(filters)
+        records: list[typing.Any] = []
+        for store in self._stores_for(filters):
+            records.extend(store.list(filters=rest, limit=limit)[0])
+        return records[:limit], None
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS memory_vectors (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+);
+CREATE INDEX IF NOT EXISTS memory_vectors_user
+    ON memory_vectors (collection, user_id)
+"""
+
+
+@dataclass
+class VectorRecord:
+    id: str
+    payload: dict[str, typing.Any]
+    score: float | None = None
+
+
+class SQLiteVectorStore(BatchingVectorStore):
+    """mem0 vector store in a SQLite database shared by worker processes.
+
+    Vectors are stored normalised, as float32 blobs. A search reads the
+    user's rows through an index on the user id and scores them with one
+    matrix product, so it grows with that user's memories only. The database
+    runs in WAL mode, so workers search while another one writes. Suited to
+    up to a few thousand memories per user; larger stores belong on a Qdrant
+    server.
+    """
+
+    def __init__(
+        self, pool: ConnectionPool, collection_name: str, embedding_model_dims: int
+    ) -> None:
+        super().__init__()
+        self._pool = pool
+        self.collection_name = collection_name
+        self._dims = embedding_model_dims
+        self._pool.run(self._setup, write=True)
+
+    @staticmethod
+    def _setup(conn: sqlite3.Connection) -> None:
+        for statement in SQLITE_SCHEMA.split(";"):
+            conn.execute(statement)
+
+    @staticmethod
+    def _normalize(vector: list[float]) -> npt.NDArray[np.float32]:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    @staticmethod
+    def _matches(
+        payload: dict[str, typing.Any], filters: dict[str, typing.Any]
+    ) -> bool:
+        return all(payload.get(key) == value for key, value in filters.items())
+
+    def _select(
+        self, columns: str, filters: dict[str, typing.Any] | None
+    ) -> list[tuple[typing.Any, ...]]:
+        query = f"SELECT {columns} FROM memory_vectors WHERE collection = ?"
+        params: list[typing.Any] = [self.collection_name]
+        if filters and "user_id" in filters:
+            query += " AND user_id = ?"
+            params.append(str(filters["user_id"]))
+        return self._pool.run(lambda conn: conn.execute(query, params).fetchall())
+
+    def create_col(self, name: str, vector_size: int, distance: typing.Any) -> None:
+        # the table is created with the store
+        pass
+
+    def _insert(
+        self,
+        vectors: list[list[float]],
+        payloads: list[dict[str, typing.Any]],
+        ids: list[str],
+    ) -> None:
+        rows = [
+            (
+                self.collection_name,
+                vector_id,
+                str(payload.get("user_id") or ""),
+                self._normalize(vector).tobytes(),
+                json.dumps(payload),
+            )
+            for vector, payload, vector_id in zip(vectors, payloads, ids)
+        ]
+        self._pool.run(
+            lambda conn: conn.executemany(
+                "INSERT OR REPLACE INTO memory_vectors VALUES (?, ?, ?, ?, ?)", rows
+            ),
+            write=True,
+        )
+
+    def search(
+        self,
+        query: list[float],
+        limit: int = 5,
+        filters: dict[str, typing.Any] | None = None,
+    ) -> list[VectorRecord]:
+        rows = self._select("id, vector, payload", filters)
+        rest = {k: v for k, v in (filters or {}).items() if k != "user_id"}
+        if rest:
+            rows = [row for row in rows if self._matches(json.loads(row[2]), rest)]
+        if not rows:
+            return []
+
+        matrix = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32)
+        scores = matrix.reshape(len(rows), self._dims) @ self._normalize(query)
+        top = np.argsort(-scores)[:limit]
+        return [
+            VectorRecord(
+                id=rows[idx][0],
+                payload=json.loads(rows[idx][2]),
+                score=float(scores[idx]),
+            )
+            for idx in top
+        ]
+
+    def delete(self, vector_id: str) -> None:
+        self._pool.run(
+            lambda conn: conn.execute(
+                "DELETE FROM memory_vectors WHERE collection = ? AND id = ?",
+                (self.collection_name, vector_id),
+            ),
+            write=True,
+        )
+
+    def update(
+        self,
+        vector_id: str,
+        vector: list[float] | None = None,
+        payload: dict[str, typing.Any] | None = None,
+    ) -> None:
+        def update(conn: sqlite3.Connection) -> None:
+            key = (self.collection_name, vector_id)
+            if vector is not None:
+                conn.execute(
+                    "UPDATE memory_vectors SET vector = ?"
+                    " WHERE collection = ? AND id = ?",
+                    (self._normalize(vector).tobytes(), *key),
+                )
+            if payload is not None:
+                conn.execute(
+                    "UPDATE memory_vectors SET user_id = ?, payload = ?"
+                    " WHERE collection = ? AND id = ?",
+                    (str(payload.get("user_id") or ""), json.dumps(payload), *key),
+                )
+
+        self._pool.run(update, write=True)
+
+    def get(self, vector_id: str) -> VectorRecord | None:
+        row = self._pool.run(
+            lambda conn: conn.execute(
+                "SELECT payload FROM memory_vectors WHERE collection = ? AND id = ?",
+                (self.collection_name, vector_id),
+            ).fetchone()
+        )
+        return VectorRecord(id=vector_id, payload=json.loads(row[0])) if row else None
+
+    def list_cols(self) -> list[str]:
+        rows = self._pool.run(
+            lambda conn: conn.execute(
+                "SELECT DISTINCT collection FROM memory_vectors"
+            ).fetchall()
+        )
+        return [row[0] for row in rows]
+
+    def delete_col(self) -> None:
+        self._pool.run(
+            lambda conn: conn.execute(
+                "DELETE FROM memory_vectors WHERE collection = ?",
+                (self.collection_name,),
+            ),
+            write=True,
+        )
+
+    def col_info(self) -> dict[str, typing.Any]:
+        count = self._pool.run(
+            lambda conn: conn.execute(
+                "SELECT COUNT(*) FROM memory_vectors WHERE collection = ?",
+                (self.collection_name,),
+            ).fetchone()[0]
+        )
+        return {"name": self.collection_name, "points": count}
+
+    def list(
+        self, filters: dict[str, typing.Any] | None = None, limit: int | None = None
+    ) -> tuple[list[VectorRecord], None]:
+        rest = {k: v for k, v in (filters or {}).items() if k != "user_id"}
+        records = [
+            VectorRecord(id=vector_id, payload=payload)
+            for vector_id, raw in self._select("id, payload", filters)
+            if self._matches(payload := json.loads(raw), rest)
+        ]
+        return (records[:limit] if limit else records), None
+
+
+class LocalMemory(Memory):  # type: ignore[misc]
+    """mem0 memory on a local vector store.
+
+    The store is the Qdrant one mem0 was configured with, partitioned by
+    user, unless ``vector_store`` is given. The facts extracted from one
+    ``add`` are inserted in a single batch instead of one upsert per fact.
+    """
+
+    vector_store: BatchingVectorStore
+
+    def __init__(
+        self, config: MemoryConfig, vector_store: BatchingVectorStore | None = None
+    ) -> None:
+        super().__init__(config)
+        self.vector_store = vector_store or UserPartitionedVectorStore.from_memory(self)
+
+    def _add_to_vector_store(
+        self,
+        messages: list[dict[str, str]],
+        metadata: dict[str, typing.Any],
+        filters: dict[str, typing.Any],
+    ) -> list[dict[str, typing.Any]]:
+        with self.vector_store.batch(user_id=filters.get("user_id")):
+            return typing.cast(
+                list[dict[str, typing.Any]],
+                super()._add_to_vector_store(messages, metadata, filters),
+            )
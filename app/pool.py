@@ -0,0 +1,86 @@
+import logging
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+from app.agent import Agent
+
+logger = logging.getLogger(__name__)
+
+AgentFactory = typing.Callable[[str], Agent]
+
+
+class AgentPool:
+    """Agents shared by every session, one per chat model.
+
+    An ``Agent`` holds no conversation state, so sessions using the same
+    model share its chat model client, tools and compiled graph. Temperature
+    and max tokens are passed per request through ``configurable`` instead of
+    being baked into the model, so changing them never builds a new agent.
+    Agents unused for ``idle_ttl`` seconds, and the least recently used ones
+    beyond ``max_size``, are dropped on the next lookup.
+    """
+
+    def __init__(
+        self, factory: AgentFactory, max_size: int = 8, idle_ttl: float | None = 1800
+    ) -> None:
+        self._factory = factory
+        self._max_size = max_size
+        self._idle_ttl = idle_ttl
+        # model -> (agent, last used), least recently used first
+        self._agents: OrderedDict[str, tuple[Agent, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.builds = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "agents": len(self._agents),
+            "hits": self.hits,
+            "builds": self.builds,
+            "evictions": self.evictions,
+        }
+
+    def get(self, model: str) -> Agent:
+        """Return the agent for ``model``, building it on first use.
+
+        Args:
+            model (str): Fully specified model name, e.g. 'openai:gpt-4o'.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._agents.get(model)
+            if entry is not None:
+                self._agents[model] = (entry[0], now)
+                self._agents.move_to_end(model)
+                self.hits += 1
+                return entry[0]
+
+            # built under the lock so concurrent sessions wait for one build
+            logger.info("Building agent for model=%s", model)
+            agent = self._factory(model)
+            self.builds += 1
+            self._agents[model] = (agent, now)
+            self._evict(now)
+            return agent
+
+    def _evict(self, now: float) -> None:
+        while self._agents:
+            model, (_, last_used) = next(iter(self._agents.items()))
+            idle = self._idle_ttl is not None and now - last_used > self._idle_ttl
+            if not idle and len(self._agents) <= self._max_size:
+                break
+            del self._agents[model]
+            self.evictions += 1
+            logger.info("Evicted agent for model=%s", model)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._agents.clear()
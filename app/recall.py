@@ -0,0 +1,196 @@
+import functools
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from mem0 import Memory
+
+from app import instrumentation, utils
+from app.config import settings
+from app.sqlite import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+recall_lookups = instrumentation.registry.counter(
+    "agent_memory_recall_total",
+    "Memory searches made for the prompt or the search tool, by cache result.",
+    ("result",),
+)
+
+PUNCTUATION_RE = re.compile(r"[^\w\s@.+-]+")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase ``query`` and drop punctuation, so rephrasings share an entry."""
+    query = PUNCTUATION_RE.sub(" ", query.lower())
+    return WHITESPACE_RE.sub(" ", query).strip(" .")
+
+
+class SharedGenerations:
+    """Per-user memory generations in SQLite, shared by worker processes.
+
+    A memory write in any worker then invalidates the recall cache entries
+    of every worker. Reads and writes run on the pool's executor, off the
+    event loop.
+    """
+
+    def __init__(self, pool: ConnectionPool) -> None:
+        self._pool = pool
+        self._pool.run(
+            lambda conn: conn.execute(
+                "CREATE TABLE IF NOT EXISTS recall_generations"
+                " (user_id TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+            ),
+            write=True,
+        )
+
+    async def aget(self, user_id: str) -> int:
+        row = await self._pool.arun(
+            lambda conn: conn.execute(
+                "SELECT generation FROM recall_generations WHERE user_id = ?",
+                (user_id,),
+            ).fetchone()
+        )
+        return int(row[0]) if row else 0
+
+    async def abump(self, user_id: str) -> None:
+        await self._pool.arun(
+            lambda conn: conn.execute(
+                "INSERT INTO recall_generations VALUES (?, 1) ON CONFLICT (user_id)"
+                " DO UPDATE SET generation = generation + 1",
+                (user_id,),
+            ),
+            write=True,
+        )
+
+
+@dataclass
+class RecallEntry:
+    memories: list[str]
+    created_at: float
+    generation: int
+
+
+class RecallCache:
+    """Filtered mem0 search results per user and normalised query.
+
+    Entries expire after ``ttl`` seconds and the least recently used one is
+    dropped beyond ``max_entries``. Writing a user's memories invalidates
+    their entries by bumping the user's generation: entries from an older
+    generation, including searches that were in flight during the write,
+    are ignored and replaced on the next lookup. Generations are kept in
+    ``generations`` when several workers share the memory store.
+    """
+
+    def __init__(
+        self,
+        limit: int = 5,
+        threshold: float = 0.3,
+        max_entries: int = 10_000,
+        ttl: float | None = 300,
+        generations: SharedGenerations | None = None,
+    ) -> None:
+        self._limit = limit
+        self._threshold = threshold
+        self._max_entries = max_entries
+        self._ttl = ttl
+        # (user_id, normalised query) -> entry, least recently used first
+        self._entries: OrderedDict[tuple[str, str], RecallEntry] = OrderedDict()
+        self._generations: dict[str, int] = {}
+        self._shared_generations = generations
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    async def aget(self, user_id: str, query: str) -> list[str] | None:
+        key = (user_id, normalize_query(query))
+        generation = await self.ageneration(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._is_fresh(entry, generation):
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.memories
+
+    async def aput(
+        self, user_id: str, query: str, memories: list[str], generation: int
+    ) -> None:
+        if generation != await self.ageneration(user_id):
+            return
+        with self._lock:
+            key = (user_id, normalize_query(query))
+            self._entries[key] = RecallEntry(memories, time.monotonic(), generation)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    async def ageneration(self, user_id: str) -> int:
+        if self._shared_generations is not None:
+            return await self._shared_generations.aget(user_id)
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    async def ainvalidate(self, user_id: str) -> None:
+        """Forget the user's cached searches after their memories changed."""
+        if self._shared_generations is not None:
+            await self._shared_generations.abump(user_id)
+            return
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def _is_fresh(self, entry: RecallEntry, generation: int) -> bool:
+        if entry.generation != generation:
+            return False
+        return self._ttl is None or time.monotonic() - entry.created_at <= self._ttl
+
+    async def search(self, memory: Memory, user_id: str, query: str) -> list[str]:
+        """Memories relevant to ``query``, from the cache or a mem0 search.
+
+        Args:
+            memory (Memory): The user's memory store.
+            user_id (str): Id of the user whose memories are searched.
+            query (str): The user's message or the model's search query.
+        """
+        memories = await self.aget(user_id, query)
+        if memories is not None:
+            recall_lookups.inc(result="hit")
+            return memories
+
+        recall_lookups.inc(result="miss")
+        generation = await self.ageneration(user_id)
+        res = await utils.run_blocking(
+            memory.search, query, user_id=user_id, limit=self._limit
+        )
+        memories = utils.process_recall_memory(dict(res), threshold=self._threshold)
+        await self.aput(user_id, query, memories, generation)
+        return memories
+
+
+@functools.cache
+def get_recall_cache() -> RecallCache:
+    """Return the process-wide cache of memory searches."""
+    return RecallCache(
+        limit=settings.recall_memory_limit,
+        threshold=settings.recall_memory_threshold,
+        max_entries=settings.recall_cache_max_entries,
+        ttl=settings.recall_cache_ttl_seconds,
+        generations=(
+            SharedGenerations(ConnectionPool(settings.memory_db_path, size=2))
+            if settings.multi_worker
+            else None
+        ),
+    )
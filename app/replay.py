@@ -0,0 +1,261 @@
+import asyncio
+import json
+import logging
+import time
+import typing
+from dataclasses import dataclass
+from pathlib import Path
+
+from langchain_core.runnables import RunnableConfig
+from mem0 import Memory
+
+from app import instrumentation
+from app.agent import Agent
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_FIELDS = ("messages", "message", "input", "prompt", "body")
+ID_FIELDS = ("id", "conversation_id", "request_id")
+
+
+@dataclass
+class Conversation:
+    index: int
+    id: str
+    messages: list[str]
+    user_id: str | None = None
+
+
+@dataclass
+class ReplayStats:
+    conversations: int = 0
+    resumed: int = 0
+    skipped: int = 0
+    turns: int = 0
+    errors: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    seconds: float = 0.0
+
+
+def iter_conversations(
+    path: Path, message_field: str | None = None, id_field: str | None = None
+) -> typing.Iterator[Conversation]:
+    """Stream one conversation per JSON line.
+
+    A record holds the user messages of a conversation as a list, or a single
+    message, in ``message_field`` or the first of ``MESSAGE_FIELDS`` found.
+    List items may be strings or ``{"role": "user", "content": ...}`` dicts.
+
+    Args:
+        path (Path): The JSONL file.
+        message_field (str | None): Field holding the messages.
+        id_field (str | None): Field identifying a conversation, the line
+            number by default.
+    """
+    index = 0
+    with open(path) as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            key = message_field or next(
+                (k for k in MESSAGE_FIELDS if k in record), None
+            )
+            if key is None:
+                logger.warning("No message field in %s:%s, skipping", path, line_no)
+                continue
+            value = record[key]
+            messages = [
+                item if isinstance(item, str) else item["content"]
+                for item in (value if isinstance(value, list) else [value])
+                if isinstance(item, str) or item.get("role", "user") == "user"
+            ]
+            id_key = id_field or next((k for k in ID_FIELDS if k in record), None)
+            yield Conversation(
+                index=index,
+                id=str(record[id_key]) if id_key else str(line_no),
+                messages=messages,
+                user_id=record.get("user_id"),
+            )
+            index += 1
+
+
+def _ends_with_newline(path: Path) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, 2)
+        return f.read(1) == b"\n"
+
+
+class ReplayProgress:
+    """Turns answered by earlier runs, read back from their output.
+
+    Conversations finish roughly in input order, so those settled below a
+    watermark are forgotten, and memory is bounded by the conversations that
+    were in flight or failed rather than by the size of the output. A failed
+    conversation is settled too, so it doesn't hold the watermark back, and
+    is remembered on its own to be retried from the failed turn.
+    """
+
+    def __init__(self) -> None:
+        self._watermark = 0
+        # completed or failed conversations above the watermark
+        self._settled: set[int] = set()
+        # conversation index -> turns answered, for unfinished conversations
+        self._answered: dict[int, int] = {}
+        # conversations whose last replayed turn failed
+        self._failed: set[int] = set()
+
+    @classmethod
+    def load(cls, path: Path) -> "ReplayProgress":
+        progress = cls()
+        if not path.exists():
+            return progress
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line of a run that was killed while writing
+                    continue
+                progress.add(
+                    record["index"],
+                    record["turn"],
+                    record["turns"],
+                    failed=record.get("error") is not None,
+                )
+        return progress
+
+    def add(self, index: int, turn: int, turns: int, failed: bool = False) -> None:
+        if failed:
+            self._failed.add(index)
+            self._settle(index)
+            return
+        if turn + 1 < turns:
+            self._answered[index] = max(self._answered.get(index, 0), turn + 1)
+            return
+        self._answered.pop(index, None)
+        self._failed.discard(index)
+        self._settle(index)
+
+    def _settle(self, index: int) -> None:
+        if index < self._watermark:
+            return
+        self._settled.add(index)
+        while self._watermark in self._settled:
+            self._settled.remove(self._watermark)
+            self._watermark += 1
+
+    def answered(self, index: int) -> int | None:
+        """Turns of the conversation already answered, ``None`` once all are."""
+        if index in self._answered:
+            return self._answered[index]
+        if index in self._failed:
+            return 0
+        if index < self._watermark or index in self._settled:
+            return None
+        return 0
+
+
+class ReplayRunner:
+    """Replay conversations through the agent, ``concurrency`` at a time.
+
+    Each conversation runs in its own thread, named after ``run_id`` and the
+    conversation id so a resumed run continues the same threads from the
+    checkpointer. Every answered turn is appended to ``output`` with its
+    latency and token usage, and turns already in ``output`` are skipped.
+    Conversations are read as slots free up, so memory use does not grow
+    with the input.
+    """
+
+    def __init__(
+        self,
+        agent: Agent,
+        memory: Memory,
+        output: Path,
+        run_id: str,
+        model: str,
+        concurrency: int = 8,
+    ) -> None:
+        self._agent = agent
+        self._memory = memory
+        self._output = output
+        self._run_id = run_id
+        self._model = model
+        self._concurrency = concurrency
+        self.stats = ReplayStats()
+
+    async def run(self, conversations: typing.Iterable[Conversation]) -> ReplayStats:
+        progress = ReplayProgress.load(self._output)
+        self._output.parent.mkdir(parents=True, exist_ok=True)
+        semaphore = asyncio.Semaphore(self._concurrency)
+        tasks: set[asyncio.Task[None]] = set()
+        started = time.perf_counter()
+
+        with open(self._output, "a") as output:
+            if output.tell() and not _ends_with_newline(self._output):
+                # start after the partial line of a run that was killed
+                output.write("\n")
+            for conversation in conversations:
+                answered = progress.answered(conversation.index)
+                if answered is None or answered >= len(conversation.messages):
+                    self.stats.skipped += 1
+                    continue
+                if answered:
+                    self.stats.resumed += 1
+                await semaphore.acquire()
+                task = asyncio.create_task(self._replay(conversation, answered, output))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                task.add_done_callback(lambda _: semaphore.release())
+            await asyncio.gather(*tasks)
+
+        self.stats.seconds = round(time.perf_counter() - started, 3)
+        return self.stats
+
+    async def _replay(
+        self, conversation: Conversation, start: int, output: typing.TextIO
+    ) -> None:
+        self.stats.conversations += 1
+        thread_id = f"{self._run_id}:{conversation.id}"
+        configurable = dict(
+            thread_id=thread_id,
+            user_id=conversation.user_id or thread_id,
+            memory_store=self._memory,
+            model=self._model,
+        )
+        turns = len(conversation.messages)
+        for turn in range(start, turns):
+            message = conversation.messages[turn]
+            handler = instrumentation.InstrumentationHandler()
+            config = RunnableConfig(configurable=configurable, callbacks=[handler])
+            started = time.perf_counter()
+            answer = error = None
+            try:
+                answer = await self._agent.invoke(message, config)
+            except Exception as e:
+                logger.exception("Replay of %s failed", conversation.id)
+                error = repr(e)
+            record = {
+                "id": conversation.id,
+                "index": conversation.index,
+                "turn": turn,
+                "turns": turns,
+                "thread_id": thread_id,
+                "message": message,
+                "answer": answer,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+                "prompt_tokens": handler.prompt_tokens,
+                "completion_tokens": handler.completion_tokens,
+                "error": error,
+            }
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+
+            self.stats.turns += 1
+            self.stats.prompt_tokens += handler.prompt_tokens
+            self.stats.completion_tokens += handler.completion_tokens
+            if error is not None:
+                # later turns depend on this one, retried when resumed
+                self.stats.errors += 1
+                return
@@ -0,0 +1,172 @@
+import typing
+
+import numpy as np
+import numpy.typing as npt
+from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, Field, PrivateAttr
+
+from app import vector_index
+from app.lexical import BM25Index
+
+Matrix = npt.NDArray[np.float32]
+
+
+class VectorScoreRetriever(BaseRetriever):
+    """Retriever filtering FAISS hits by cosine similarity without re-embedding.
+
+    The index is expected to store normalised vectors with inner product
+    distance, so FAISS scores already are cosine similarities and the
+    threshold can be applied to the search results directly. This replaces
+    the ``EmbeddingsFilter`` pipeline, which embedded every candidate a second
+    time to score it against the query.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    store: FAISS = Field(exclude=True)
+    k: int = 4
+    score_threshold: float = 0.3
+
+    _vectors: Matrix | None = PrivateAttr(default=None)
+
+    @property
+    def _embeddings(self) -> Embeddings:
+        return typing.cast(Embeddings, self.store.embedding_function)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        vector = self._embeddings.embed_query(query)
+        return self._search(query, vector)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        vector = await self._embeddings.aembed_query(query)
+        return self._search(query, vector)
+
+    def _search(self, query: str, vector: list[float]) -> list[Document]:
+        docs_and_scores = self.store.similarity_search_with_score_by_vector(
+            vector, k=self.k, score_threshold=self.score_threshold
+        )
+        return [doc for doc, _ in docs_and_scores]
+
+    def batch_search(
+        self, queries: typing.Sequence[str]
+    ) -> list[list[tuple[Document, float]]]:
+        """Score a batch of queries in one embedding call and one search.
+
+        Query vectors are normalised and, for a flat index, multiplied with
+        the matrix of stored vectors in a single NumPy product. Approximate
+        indexes are searched with their own batched ``search``. The top ``k``
+        hits above the threshold are kept per query.
+
+        Args:
+            queries (Sequence[str]): Queries to search for.
+        """
+        if not queries:
+            return []
+        # one embedding round trip for the whole batch
+        queries_matrix = np.asarray(
+            self._embeddings.embed_documents(list(queries)), dtype=np.float32
+        )
+        norms = np.linalg.norm(queries_matrix, axis=1, keepdims=True)
+        queries_matrix /= np.where(norms == 0, 1, norms)
+
+        k = min(self.k, self.store.index.ntotal)
+        if vector_index.is_flat(self.store.index):
+            scores, top = self._exact_search(queries_matrix, k)
+        else:
+            scores, top = self.store.index.search(queries_matrix, k)
+
+        return [
+            [
+                (self._document(int(idx)), float(score))
+                for idx, score in zip(top[row], scores[row])
+                # FAISS pads missing hits with -1
+                if idx >= 0 and score >= self.score_threshold
+            ]
+            for row in range(len(queries))
+        ]
+
+    def _exact_search(
+        self, queries_matrix: Matrix, k: int
+    ) -> tuple[Matrix, npt.NDArray[np.int64]]:
+        """Top ``k`` scores and positions per query, best first."""
+        scores = queries_matrix @ self._stored_vectors().T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k].astype(np.int64)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return (
+            np.take_along_axis(top_scores, order, axis=1),
+            np.take_along_axis(top, order, axis=1),
+        )
+
+    def _stored_vectors(self) -> Matrix:
+        """Vectors read back from the flat index, loaded once per retriever."""
+        if self._vectors is None:
+            index = self.store.index
+            self._vectors = typing.cast(Matrix, index.reconstruct_n(0, index.ntotal))
+        return self._vectors
+
+    def _document(self, idx: int) -> Document:
+        doc_id = self.store.index_to_docstore_id[idx]
+        return typing.cast(Document, self.store.docstore.search(doc_id))
+
+
+def reciprocal_rank_fusion(
+    rankings: typing.Iterable[typing.Sequence[str]], k: int = 60
+) -> list[tuple[str, float]]:
+    """Fuse rankings of ids by summing ``1 / (k + rank)``, best first.
+
+    Args:
+        rankings (Iterable[Sequence[str]]): Ids ordered best first.
+        k (int, optional): Damping constant, 60 in the original paper.
+    """
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever(VectorScoreRetriever):
+    """Dense retrieval fused with BM25 keyword search by reciprocal rank.
+
+    Embeddings blur exact terms such as email addresses, SKUs or product
+    names, which the keyword index matches directly. Both rankings are
+    fetched ``fetch_k`` deep, dense hits below the similarity threshold are
+    dropped, and the top ``k`` documents of the fused ranking are returned
+    in that order, so a document found by both searches comes first.
+    """
+
+    lexical: BM25Index = Field(exclude=True)
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _search(self, query: str, vector: list[float]) -> list[Document]:
+        dense = self.store.similarity_search_with_score_by_vector(
+            vector, k=self.fetch_k, score_threshold=self.score_threshold
+        )
+        docs = {doc.id: doc for doc, _ in dense if doc.id is not None}
+        fused = reciprocal_rank_fusion(
+            [
+                list(docs),
+                [doc_id for doc_id, _ in self.lexical.search(query, self.fetch_k)],
+            ],
+            self.rrf_k,
+        )
+
+        results = []
+        for doc_id, _ in fused[: self.k]:
+            doc = docs.get(doc_id) or self.store.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                results.append(doc)
+        return results
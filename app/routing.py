@@ -0,0 +1,513 @@
+import asyncio
+import contextlib
+import functools
+import logging
+import os
+import statistics
+import threading
+import time
+import typing
+from collections import deque
+from dataclasses import dataclass, field
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManager,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
+from langchain_core.language_models.base import LangSmithParams
+from langchain_core.messages import AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable, RunnableConfig
+from langgraph.constants import TAG_NOSTREAM
+from pydantic import ConfigDict, Field
+
+from app import instrumentation, utils
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+RoutedModel = Runnable[LanguageModelInput, BaseMessage]
+
+router_requests = instrumentation.registry.counter(
+    "agent_router_requests_total",
+    "Requests sent by the model router, by model and outcome.",
+    ("model", "outcome"),
+)
+# environment variables holding each provider's API key, providers not listed
+# are assumed to need none
+PROVIDER_API_KEYS = {
+    "openai": "OPENAI_API_KEY",
+    "anthropic": "ANTHROPIC_API_KEY",
+    "google_genai": "GOOGLE_API_KEY",
+    "mistralai": "MISTRAL_API_KEY",
+    "groq": "GROQ_API_KEY",
+}
+
+router_hedges = instrumentation.registry.counter(
+    "agent_router_hedges_total",
+    "Requests hedged to a backup model after the first one was slow.",
+    ("model",),
+)
+
+
+def is_fallback_error(error: BaseException) -> bool:
+    """Whether another model may succeed where this request failed.
+
+    Rate limits, overloaded or failing servers and connection errors are
+    worth retrying elsewhere; bad requests and authentication errors are not.
+    """
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return type(error).__name__ in {
+        "APIConnectionError",
+        "APITimeoutError",
+    } or isinstance(error, (TimeoutError, ConnectionError))
+
+
+def has_credentials(name: str) -> bool:
+    """Whether the provider of the fully specified model ``name`` has an API key.
+
+    Clients such as ``ChatAnthropic`` build without one and only fail with an
+    authentication error on the first request.
+    """
+    provider, _, _ = name.partition(":")
+    env_var = PROVIDER_API_KEYS.get(provider)
+    return env_var is None or bool(os.environ.get(env_var))
+
+
+def retry_after(error: BaseException) -> float | None:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", ""))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_simple_turn(messages: typing.Sequence[BaseMessage], max_chars: int) -> bool:
+    """A short user message opening a turn, e.g. a greeting or a yes/no reply.
+
+    Calls after tool results are never simple: the model has to read them.
+    """
+    if not messages or not isinstance(messages[-1], HumanMessage):
+        return False
+    return len(utils.get_message_text(messages[-1])) <= max_chars
+
+
+@dataclass
+class ModelStats:
+    """Rolling latency and error rate of one model."""
+
+    window: int
+    # time to the first output: the first chunk when streaming, else the reply
+    latencies: deque[float] = field(init=False)
+    errors: deque[bool] = field(init=False)
+    cooldown_until: float = 0.0
+
+    def __post_init__(self) -> None:
+        self.latencies = deque(maxlen=self.window)
+        self.errors = deque(maxlen=self.window)
+
+    def error_rate(self) -> float:
+        return sum(self.errors) / len(self.errors) if self.errors else 0.0
+
+    def latency_quantile(self, quantile: float) -> float | None:
+        if len(self.latencies) < 2:
+            return None
+        cut_points = statistics.quantiles(self.latencies, n=100, method="inclusive")
+        return cut_points[min(98, max(0, round(quantile * 100) - 1))]
+
+
+class RouterStats:
+    """Process-wide model health, shared by every router and session.
+
+    A rate limit seen by one session puts the model in cooldown for all of
+    them, and latency quantiles are computed over all traffic to a model.
+    Until ``min_samples`` requests are seen, hedging waits ``hedge_after``
+    seconds and no model is considered unhealthy.
+    """
+
+    def __init__(
+        self,
+        window: int = 100,
+        min_samples: int = 20,
+        max_error_rate: float = 0.5,
+        cooldown: float = 30.0,
+        hedge_after: float | None = 5.0,
+        hedge_quantile: float = 0.95,
+    ) -> None:
+        self._window = window
+        self._min_samples = min_samples
+        self._max_error_rate = max_error_rate
+        self._cooldown = cooldown
+        self._hedge_after = hedge_after
+        self._hedge_quantile = hedge_quantile
+        self._models: dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, model: str) -> ModelStats:
+        if model not in self._models:
+            self._models[model] = ModelStats(self._window)
+        return self._models[model]
+
+    def record_success(self, model: str, latency: float) -> None:
+        with self._lock:
+            stats = self._get(model)
+            stats.latencies.append(latency)
+            stats.errors.append(False)
+        router_requests.inc(model=model, outcome="ok")
+
+    def record_error(self, model: str, error: BaseException) -> None:
+        rate_limited = getattr(error, "status_code", None) == 429
+        with self._lock:
+            stats = self._get(model)
+            stats.errors.append(True)
+            if rate_limited:
+                cooldown = retry_after(error) or self._cooldown
+                stats.cooldown_until = time.monotonic() + cooldown
+        router_requests.inc(
+            model=model, outcome="rate_limited" if rate_limited else "error"
+        )
+
+    def record_cancelled(self, model: str) -> None:
+        router_requests.inc(model=model, outcome="cancelled")
+
+    def is_cooling_down(self, model: str, now: float) -> bool:
+        with self._lock:
+            return self._get(model).cooldown_until > now
+
+    def is_unhealthy(self, model: str) -> bool:
+        with self._lock:
+            stats = self._get(model)
+            return (
+                len(stats.errors) >= self._min_samples
+                and stats.error_rate() > self._max_error_rate
+            )
+
+    def hedge_delay(self, model: str) -> float | None:
+        """Seconds to wait for ``model`` before hedging to the next one."""
+        if self._hedge_after is None:
+            return None
+        with self._lock:
+            stats = self._get(model)
+            if len(stats.latencies) < self._min_samples:
+                return self._hedge_after
+            return stats.latency_quantile(self._hedge_quantile)
+
+    def snapshot(self) -> dict[str, dict[str, typing.Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                model: {
+                    "samples": len(stats.latencies),
+                    "p50_seconds": stats.latency_quantile(0.5),
+                    "p95_seconds": stats.latency_quantile(0.95),
+                    "error_rate": round(stats.error_rate(), 3),
+                    "cooldown_seconds": max(0.0, round(stats.cooldown_until - now, 1)),
+                }
+                for model, stats in self._models.items()
+            }
+
+
+@functools.cache
+def get_router_stats() -> RouterStats:
+    return RouterStats(
+        window=settings.router_window,
+        min_samples=settings.router_min_samples,
+        max_error_rate=settings.router_max_error_rate,
+        cooldown=settings.router_cooldown_seconds,
+        hedge_after=settings.router_hedge_after_seconds,
+        hedge_quantile=settings.router_hedge_quantile,
+    )
+
+
+class _Attempt:
+    """One model's response, consumed until its first output arrives."""
+
+    def __init__(self, name: str, outputs: typing.AsyncIterator[BaseMessage]) -> None:
+        self.name = name
+        self.outputs = outputs
+        self.started = time.monotonic()
+        self.first: asyncio.Future[BaseMessage] = asyncio.ensure_future(anext(outputs))
+
+    async def cancel(self) -> None:
+        self.first.cancel()
+        with contextlib.suppress(BaseException):
+            await self.first
+        with contextlib.suppress(Exception):
+            await typing.cast(
+                typing.AsyncGenerator[BaseMessage, None], self.outputs
+            ).aclose()
+
+
+class RoutingChatModel(BaseChatModel):
+    """Chat model spreading requests over several providers.
+
+    Requests go to ``primary``, or to ``cheap_model`` for simple turns, and
+    move to the next model of ``fallbacks`` when a model is rate limited or
+    failing. Rate limited models are tried last until their cooldown ends,
+    after models with a high rolling error rate. When the first
+    model has not answered after the 95th percentile of its recent latency,
+    the request is hedged: the next model is called too and whichever
+    answers first is used, the other request is cancelled. Only the winning
+    model's tokens are streamed.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    primary: str
+    models: dict[str, RoutedModel] = Field(exclude=True)
+    fallbacks: list[str] = []
+    cheap_model: str | None = None
+    simple_max_chars: int = 200
+    max_tokens: int | None = None
+    stats: RouterStats = Field(default_factory=get_router_stats, exclude=True)
+
+    @classmethod
+    def from_names(
+        cls,
+        primary: str,
+        fallbacks: typing.Sequence[str] = (),
+        cheap_model: str | None = None,
+        **model_kwargs: typing.Any,
+    ) -> "RoutingChatModel":
+        """Load the primary and backup models with ``load_chat_model``.
+
+        Backup models without credentials or that cannot be loaded are left
+        out.
+
+        Args:
+            primary (str): Fully specified name of the model to use first.
+            fallbacks (Sequence[str], optional): Backup models, in order.
+            cheap_model (str | None, optional): Model answering simple turns.
+            **model_kwargs (Any): Passed to ``load_chat_model``.
+        """
+        names = list(dict.fromkeys([primary, *fallbacks, *filter(None, [cheap_model])]))
+        if len(names) > 1:
+            # a failed request moves to another model instead of being retried
+            model_kwargs.setdefault("max_retries", settings.router_model_retries)
+        models: dict[str, RoutedModel] = {
+            primary: utils.load_chat_model(primary, **model_kwargs)
+        }
+        for name in names[1:]:
+            if not has_credentials(name):
+                logger.warning("Not routing to %s: no API key configured", name)
+                continue
+            try:
+                models[name] = utils.load_chat_model(name, **model_kwargs)
+            except Exception as exc:
+                logger.warning("Not routing to %s: %s", name, exc)
+        return cls(
+            primary=primary,
+            models=models,
+            fallbacks=[name for name in fallbacks if name in models],
+            cheap_model=cheap_model if cheap_model in models else None,
+            simple_max_chars=settings.router_simple_max_chars,
+            max_tokens=model_kwargs.get("max_tokens"),
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "routing-chat-model"
+
+    def _get_ls_params(
+        self, stop: list[str] | None = None, **kwargs: typing.Any
+    ) -> LangSmithParams:
+        provider, _, model = self.primary.partition(":")
+        return LangSmithParams(
+            ls_provider=provider, ls_model_name=model, ls_model_type="chat"
+        )
+
+    def bind_tools(
+        self, tools: typing.Sequence[typing.Any], **kwargs: typing.Any
+    ) -> "RoutingChatModel":
+        models = {
+            name: typing.cast(BaseChatModel, model).bind_tools(tools, **kwargs)
+            for name, model in self.models.items()
+        }
+        return self.model_copy(update={"models": models})
+
+    def candidates(self, messages: typing.Sequence[BaseMessage]) -> list[str]:
+        """Models to try for this request, in order."""
+        names = [self.primary, *self.fallbacks]
+        if self.cheap_model and is_simple_turn(messages, self.simple_max_chars):
+            names.insert(0, self.cheap_model)
+        names = list(dict.fromkeys(names))
+
+        now = time.monotonic()
+        # stable sort: rate limited models go last, then unhealthy ones, the
+        # rest keep their order
+        return sorted(
+            names,
+            key=lambda name: (
+                self.stats.is_cooling_down(name, now),
+                self.stats.is_unhealthy(name),
+            ),
+        )
+
+    @staticmethod
+    def _attempt_config(
+        run_manager: AsyncCallbackManagerForLLMRun | CallbackManagerForLLMRun | None,
+        name: str,
+    ) -> RunnableConfig:
+        # attempts are traced under this run, but neither streamed nor
+        # measured twice: this run reports the winner's tokens and timing
+        callbacks = None
+        if run_manager is not None:
+            callbacks = CallbackManager(handlers=[], parent_run_id=run_manager.run_id)
+            callbacks.set_handlers(run_manager.inheritable_handlers)
+            callbacks.add_tags(run_manager.inheritable_tags)
+            callbacks.add_metadata(run_manager.inheritable_metadata)
+        return RunnableConfig(
+            callbacks=callbacks,
+            tags=[TAG_NOSTREAM, instrumentation.NESTED_MODEL_TAG],
+            run_name=name,
+        )
+
+    async def _route(
+        self,
+        messages: list[BaseMessage],
+        run_manager: AsyncCallbackManagerForLLMRun | None,
+        stream: bool,
+        **kwargs: typing.Any,
+    ) -> typing.AsyncIterator[BaseMessage]:
+        """Yield the outputs of the first model to answer.
+
+        Streaming yields the winner's message chunks, otherwise its reply.
+        """
+
+        async def outputs(name: str) -> typing.AsyncIterator[BaseMessage]:
+            model = self.models[name]
+            config = self._attempt_config(run_manager, name)
+            if stream:
+                async for chunk in model.astream(messages, config, **kwargs):
+                    yield chunk
+            else:
+                yield await model.ainvoke(messages, config, **kwargs)
+
+        queue = deque(self.candidates(messages))
+        pending: list[_Attempt] = [_Attempt(queue[0], outputs(queue.popleft()))]
+        hedge_delay = self.stats.hedge_delay(pending[0].name) if queue else None
+        last_error: BaseException | None = None
+
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    [attempt.first for attempt in pending],
+                    timeout=hedge_delay,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    # only hedge once, the backup load stays bounded
+                    hedge_delay = None
+                    router_hedges.inc(model=pending[0].name)
+                    name = queue.popleft()
+                    logger.info(
+                        "Hedging request to %s",
+                        name,
+                        extra={"event_name": "router_hedge", "model": pending[0].name},
+                    )
+                    pending.append(_Attempt(name, outputs(name)))
+                    continue
+
+                winner = next(a for a in pending if a.first in done)
+                pending.remove(winner)
+                try:
+                    first = winner.first.result()
+                except StopAsyncIteration:
+                    first = AIMessageChunk(content="")
+                except Exception as exc:
+                    self.stats.record_error(winner.name, exc)
+                    last_error = exc
+                    # a failed hedge must not cancel an attempt that may answer
+                    if not pending and not is_fallback_error(exc):
+                        raise
+                    logger.warning(
+                        "Model %s failed, falling back: %s",
+                        winner.name,
+                        exc,
+                        extra={"event_name": "router_fallback", "model": winner.name},
+                    )
+                    if not pending and queue:
+                        name = queue.popleft()
+                        pending.append(_Attempt(name, outputs(name)))
+                        hedge_delay = None
+                    continue
+
+                self.stats.record_success(
+                    winner.name, time.monotonic() - winner.started
+                )
+                for attempt in pending:
+                    self.stats.record_cancelled(attempt.name)
+                    await attempt.cancel()
+                pending.clear()
+
+                yield first
+                async for output in winner.outputs:
+                    yield output
+                return
+        finally:
+            for attempt in pending:
+                await attempt.cancel()
+
+        raise typing.cast(BaseException, last_error)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> ChatResult:
+        if stop is not None:
+            kwargs["stop"] = stop
+        outputs = [
+            message
+            async for message in self._route(messages, run_manager, False, **kwargs)
+        ]
+        return ChatResult(generations=[ChatGeneration(message=outputs[-1])])
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> typing.AsyncIterator[ChatGenerationChunk]:
+        if stop is not None:
+            kwargs["stop"] = stop
+        async for message in self._route(messages, run_manager, True, **kwargs):
+            chunk = ChatGenerationChunk(message=typing.cast(AIMessageChunk, message))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> ChatResult:
+        """Blocking calls fall back in order, hedging needs the event loop."""
+        if stop is not None:
+            kwargs["stop"] = stop
+        last_error: BaseException | None = None
+        for name in self.candidates(messages):
+            started = time.monotonic()
+            try:
+                message = self.models[name].invoke(
+                    messages, self._attempt_config(run_manager, name), **kwargs
+                )
+            except Exception as exc:
+                self.stats.record_error(name, exc)
+                if not is_fallback_error(exc):
+                    raise
+                last_error = exc
+                continue
+            self.stats.record_success(name, time.monotonic() - started)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+        raise typing.cast(BaseException, last_error)
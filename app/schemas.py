@@ -12,6 +12,11 @@ from app import prompts
 
 class State(AgentState):
     today: str
+    # memories recalled for the current turn's user message
+    recall_memories: list[str]
+    # id of the last message handed to mem0, so any worker continuing the
+    # thread only saves the messages after it
+    saved_message_id: str | None
 
 
 class ToolFormModel(BaseModel):
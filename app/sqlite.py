@@ -0,0 +1,78 @@
+import asyncio
+import contextlib
+import queue
+import sqlite3
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+T = typing.TypeVar("T")
+
+
+class ConnectionPool:
+    """Small pool of SQLite connections shared by threads and coroutines.
+
+    Connections use WAL mode, so readers never block the writer and several
+    processes can share one database file. Async callers run their queries on
+    a dedicated executor sized to the pool, keeping the event loop free.
+    """
+
+    def __init__(self, path: Path | str, size: int = 4, timeout: float = 30.0):
+        if str(path) != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._path = str(path)
+        self._timeout = timeout
+        self._connections: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        for _ in range(size):
+            self._connections.put(self._connect())
+        self._executor = ThreadPoolExecutor(
+            max_workers=size, thread_name_prefix="sqlite"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self._path,
+            timeout=self._timeout,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self._timeout * 1000)}")
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self, write: bool = False) -> typing.Iterator[sqlite3.Connection]:
+        """Borrow a connection, running the block in a single transaction.
+
+        Write transactions take the database lock up front so concurrent
+        writers queue on ``busy_timeout`` instead of failing on upgrade.
+        """
+        conn = self._connections.get()
+        try:
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            self._connections.put(conn)
+
+    def run(
+        self, func: typing.Callable[[sqlite3.Connection], T], write: bool = False
+    ) -> T:
+        with self.connection(write) as conn:
+            return func(conn)
+
+    async def arun(
+        self, func: typing.Callable[[sqlite3.Connection], T], write: bool = False
+    ) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.run, func, write)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        while not self._connections.empty():
+            self._connections.get_nowait().close()
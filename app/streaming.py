@@ -0,0 +1,132 @@
+import asyncio
+import functools
+import logging
+import typing
+
+from app import instrumentation
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+stream_tokens = instrumentation.registry.counter(
+    "agent_stream_tokens_total", "Tokens streamed by the agent to clients."
+)
+stream_frames = instrumentation.registry.counter(
+    "agent_stream_frames_total", "Frames sent to clients for the streamed tokens."
+)
+
+
+class _FrameBuffer:
+    """Tokens read from the agent, waiting to be sent as the next frame."""
+
+    def __init__(self, max_delay: float, max_chars: int, max_pending: int) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._max_delay = max_delay
+        self._max_chars = max_chars
+        self._max_pending = max_pending
+        self.tokens: list[str] = []
+        self.size = 0
+        self.closed = False
+        self.error: BaseException | None = None
+        self._first = True
+        # set once the pending tokens should be sent
+        self._ready: asyncio.Future[None] = self._loop.create_future()
+        self._timer: asyncio.TimerHandle | None = None
+        self._drained: asyncio.Future[None] | None = None
+
+    async def put(self, token: str) -> None:
+        if len(self.tokens) >= self._max_pending:
+            self._drained = self._loop.create_future()
+            await self._drained
+        self.tokens.append(token)
+        self.size += len(token)
+        if self._first or self.size >= self._max_chars:
+            self._first = False
+            self._wake()
+        elif self._timer is None:
+            self._timer = self._loop.call_later(self._max_delay, self._wake)
+
+    def close(self, error: BaseException | None = None) -> None:
+        self.closed = True
+        self.error = error
+        self._wake()
+
+    def _wake(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._ready.done():
+            self._ready.set_result(None)
+
+    async def take(self) -> list[str]:
+        await self._ready
+        self._ready = self._loop.create_future()
+        tokens, self.tokens, self.size = self.tokens, [], 0
+        if self._drained is not None and not self._drained.done():
+            self._drained.set_result(None)
+        return tokens
+
+
+class TokenCoalescer:
+    """Merge streamed tokens into fewer, larger frames for the client.
+
+    The first token is sent as soon as it arrives, so time to first token is
+    unchanged. The following tokens are buffered until ``max_chars`` are
+    pending or ``max_delay`` seconds passed since the oldest of them. Tokens
+    are read in a background task while a frame is being sent, so a slow
+    client gets larger frames rather than slowing the model stream, until
+    ``max_pending`` tokens are waiting.
+    """
+
+    def __init__(
+        self, max_delay: float = 0.03, max_chars: int = 64, max_pending: int = 1024
+    ) -> None:
+        self._max_delay = max_delay
+        self._max_chars = max_chars
+        self._max_pending = max_pending
+
+    async def coalesce(
+        self, tokens: typing.AsyncIterable[str]
+    ) -> typing.AsyncIterator[str]:
+        """Frames of the non-empty ``tokens``, in order.
+
+        Args:
+            tokens (typing.AsyncIterable[str]): Tokens streamed by the agent.
+        """
+        buffer = _FrameBuffer(self._max_delay, self._max_chars, self._max_pending)
+
+        async def read() -> None:
+            try:
+                async for token in tokens:
+                    if token:
+                        await buffer.put(token)
+            except Exception as e:
+                buffer.close(e)
+            else:
+                buffer.close()
+
+        reader = asyncio.ensure_future(read())
+        try:
+            while True:
+                # every token read while the last frame was sent goes in this one
+                frame = await buffer.take()
+                if frame:
+                    stream_tokens.inc(len(frame))
+                    stream_frames.inc()
+                    yield "".join(frame)
+                if buffer.closed and not buffer.tokens:
+                    if buffer.error is not None:
+                        raise buffer.error
+                    return
+        finally:
+            reader.cancel()
+
+
+@functools.cache
+def get_token_coalescer() -> TokenCoalescer:
+    """Return the process-wide coalescer of streamed tokens."""
+    return TokenCoalescer(
+        max_delay=settings.stream_frame_delay_seconds,
+        max_chars=settings.stream_frame_max_chars,
+        max_pending=settings.stream_max_pending_tokens,
+    )
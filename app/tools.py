@@ -1,15 +1,21 @@
+import asyncio
+import json
 import logging
 import typing
+import weakref
+from dataclasses import dataclass
 from datetime import datetime
 
-from langchain.retrievers import ContextualCompressionRetriever
-from langchain.retrievers.document_compressors.embeddings_filter import EmbeddingsFilter
-from langchain_community.vectorstores import FAISS
-from langchain_core.callbacks import CallbackManagerForToolRun
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForToolRun,
+    CallbackManagerForToolRun,
+)
 from langchain_core.documents import Document
 from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import ToolCall, ToolMessage
+from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables import Runnable, RunnableConfig
 from langchain_core.tools import (
     BaseTool,
     BaseToolkit,
@@ -17,19 +23,18 @@ from langchain_core.tools import (
     create_retriever_tool,
     tool,
 )
-from pydantic import BaseModel, Field
+from langgraph.prebuilt import ToolNode
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
 
 from app import prompts, schemas, utils
 from app.config import AgentConfiguration, settings
+from app.customers import get_customer_repository
+from app.knowledge_base import KnowledgeBaseIndex
+from app.recall import get_recall_cache
+from app.retrievers import HybridRetriever, VectorScoreRetriever
 
 logger = logging.getLogger(__name__)
 
-# Sample Customer Data (replace with actual database/retrieval method)
-customer_data = {
-    "123": {"name": "Alice Smith", "email": "alice@example.com", "orders": 5},
-    "456": {"name": "Bob Johnson", "email": "bob@example.com", "orders": 2},
-}
-
 # sample form data
 forms_dict = {
     "address_change": {
@@ -74,7 +79,7 @@ knowledge_base_docs = [
 
 
 @tool(parse_docstring=True)
-def get_customer_info(customer_id: str) -> str:
+async def get_customer_info(customer_id: str) -> str:
     """
     Retrieves customer information (name, orders) based on ID.
     You must ask the user to provide the ID if it's not available.
@@ -83,10 +88,10 @@ def get_customer_info(customer_id: str) -> str:
         customer_id (str): The customer ID.
     """
     logger.info("Retrieving customer information for %s", customer_id)
-    if customer_id in customer_data:
-        return str(customer_data[customer_id])
-    else:
+    record = await get_customer_repository().get(customer_id)
+    if record is None:
         raise ValueError("Customer not found.")
+    return record
 
 
 class FormTool(BaseTool):  # type: ignore[override]
@@ -99,14 +104,65 @@ class FormTool(BaseTool):  # type: ignore[override]
         logger.info("Retrieving form for %s", self.form.name)
         return self.form.to_llm()
 
+    async def _arun(
+        self, run_manager: AsyncCallbackManagerForToolRun | None = None
+    ) -> str:
+        """Retrieves form fields for the user to complete."""
+        return self._run()
+
+
+@dataclass
+class CompiledForm:
+    """Form model, parser and submission chain, built once per form."""
+
+    form: schemas.ToolFormModel
+    parser: PydanticOutputParser[schemas.BaseFormParser]
+    chain: Runnable[dict[str, str], schemas.BaseFormParser]
+
+    @classmethod
+    def build(cls, form: schemas.ToolFormModel, llm: BaseChatModel) -> "CompiledForm":
+        parser = schemas.BaseFormParser.from_config(form)
+        prompt = ChatPromptTemplate.from_messages(
+            [
+                (
+                    "system",
+                    prompts.SUBMIT_FORM_PROMPT,
+                ),
+                ("system", "Today is {today}"),
+                ("human", "{query}"),
+            ]
+        ).partial(format_instructions=parser.get_format_instructions())
+        return cls(form=form, parser=parser, chain=prompt | llm | parser)
+
+    def validate(self, user_id: str, form_data: str) -> schemas.BaseFormParser | None:
+        """Validate well-formed JSON form data without calling the model."""
+        try:
+            data = json.loads(form_data)
+        except ValueError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        try:
+            return self.parser.pydantic_object.model_validate(
+                {**data, "user_id": user_id, "form_name": self.form.name}
+            )
+        except ValidationError:
+            return None
+
+    def inputs(self, user_id: str, form_data: str) -> dict[str, str]:
+        query = f"""User ID: {user_id}.\n
+            Form ID: {self.form.name}.\n
+            Form data: {form_data}
+        """
+        return {"query": query, "today": datetime.now().isoformat()}
+
 
 class SubmitForm(BaseTool):  # type: ignore[override]
     """Tool to submit form data."""
 
     description: str = "Submits the form data collected from the user."
     args_schema: typing.Type[BaseModel] = schemas.SubmitFormInput
-    form_registry: dict[str, schemas.ToolFormModel] = Field(exclude=True)
-    llm: BaseChatModel = Field(exclude=True)
+    form_registry: dict[str, CompiledForm] = Field(exclude=True)
 
     def _run(
         self,
@@ -122,40 +178,49 @@ class SubmitForm(BaseTool):  # type: ignore[override]
             form_data (str): The form data collected from the user.
             config (RunnableConfig): The runnable config.
         """
-        cfg = AgentConfiguration.from_runnable_config(config)
-        try:
-            form = self.form_registry[form_name]
-        except KeyError as exc:
-            raise ValueError(f"Form `{form_name}` not found.") from exc
+        form, user_id = self._get_form(form_name, config)
+        res = form.validate(user_id, form_data)
+        if res is None:
+            res = form.chain.invoke(form.inputs(user_id, form_data), config)
 
-        parser = schemas.BaseFormParser.from_config(form)
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    prompts.SUBMIT_FORM_PROMPT,
-                ),
-                ("system", "Today is {today}"),
-                ("human", "{query}"),
-            ]
-        ).partial(
-            format_instructions=parser.get_format_instructions(),
-            today=datetime.now().isoformat(),
-        )
-        chain = prompt | self.llm | parser
+        logger.info("Form submitted: %s", res)
+        return "Form successfully submitted. An langgraph will get back to you shortly."
 
-        query = f"""User ID: {cfg.user_id}.\n
-            Form ID: {form.name}.\n
-            Form data: {form_data}
+    async def _arun(
+        self,
+        form_name: str,
+        form_data: str,
+        config: RunnableConfig,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,
+    ) -> str:
+        """Submits the form data collected from the user in JSON format.
+
+        Args:
+            form_name (str): Form name used to collect the information
+            form_data (str): The form data collected from the user.
+            config (RunnableConfig): The runnable config.
         """
-        res = chain.invoke({"query": query}, config)
+        form, user_id = self._get_form(form_name, config)
+        # well-formed JSON skips the extra model call
+        res = form.validate(user_id, form_data)
+        if res is None:
+            res = await form.chain.ainvoke(form.inputs(user_id, form_data), config)
 
         logger.info("Form submitted: %s", res)
         return "Form successfully submitted. An langgraph will get back to you shortly."
 
+    def _get_form(
+        self, form_name: str, config: RunnableConfig
+    ) -> tuple[CompiledForm, str]:
+        cfg = AgentConfiguration.from_runnable_config(config)
+        try:
+            return self.form_registry[form_name], cfg.user_id
+        except KeyError as exc:
+            raise ValueError(f"Form `{form_name}` not found.") from exc
+
 
 @tool(parse_docstring=True)
-def save_memory(context: str, config: RunnableConfig) -> str:
+async def save_memory(context: str, config: RunnableConfig) -> str:
     """
     Store information between conversations to memory to build a comprehensive understanding of the user.
 
@@ -164,12 +229,13 @@ def save_memory(context: str, config: RunnableConfig) -> str:
         config (RunnableConfig): The runnable config.
     """
     cfg = AgentConfiguration.from_runnable_config(config)
-    res = cfg.memory_store.add(context, user_id=cfg.user_id)
+    res = await utils.run_blocking(cfg.memory_store.add, context, user_id=cfg.user_id)
+    await get_recall_cache().ainvalidate(cfg.user_id)
     return f"Memory saved: {res}"
 
 
 @tool(parse_docstring=True)
-def search_memory(query: str, config: RunnableConfig) -> str:
+async def search_memory(query: str, config: RunnableConfig) -> str:
     """
     Search memory for relevant information about the user.
 
@@ -178,16 +244,17 @@ def search_memory(query: str, config: RunnableConfig) -> str:
         config (RunnableConfig): The runnable config.
     """
     cfg = AgentConfiguration.from_runnable_config(config)
-    res = cfg.memory_store.search(query, user_id=cfg.user_id, limit=3)
-
-    memories = utils.process_recall_memory(dict(res))
+    memories = await get_recall_cache().search(cfg.memory_store, cfg.user_id, query)
     return ".\n".join(memories)
 
 
 class AgentToolkit(BaseToolkit):
     """Toolkit for retrieving langgraph tools."""
 
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     llm: BaseChatModel = Field(exclude=True)
+    knowledge_base: KnowledgeBaseIndex = Field(exclude=True)
 
     def __init__(self, **kwargs: typing.Any) -> None:
         super().__init__(**kwargs)
@@ -200,6 +267,11 @@ class AgentToolkit(BaseToolkit):
             )
             for key, form in forms_dict.items()
         }
+        # building a form model with `create_model` is slow, done once per form
+        self._compiled_forms = {
+            key: CompiledForm.build(form, self.llm)
+            for key, form in self._form_registry.items()
+        }
 
     def get_tools(self) -> list[BaseTool]:
         retriever_tool = self._get_retriever_tool()
@@ -226,26 +298,93 @@ class AgentToolkit(BaseToolkit):
         submit_form = SubmitForm(
             name="submit_form",
             return_direct=False,
-            form_registry=self._form_registry,
-            llm=self.llm,
+            form_registry=self._compiled_forms,
         )
         return form_tools + [submit_form]
 
-    @staticmethod
-    def _get_retriever_tool() -> Tool:
-        embeddings = utils.load_embeddings_model()
-        db = FAISS.from_documents(knowledge_base_docs, embeddings)
-
-        embeddings_filter = EmbeddingsFilter(
-            embeddings=embeddings, similarity_threshold=settings.retriever_threshold
-        )
-        retriever = db.as_retriever()
-        compression_retriever = ContextualCompressionRetriever(
-            base_compressor=embeddings_filter, base_retriever=retriever
-        )
+    def _get_retriever_tool(self) -> Tool:
+        db = self.knowledge_base.load_ingested(
+            settings.ingested_knowledge_base_dir
+        ) or self.knowledge_base.load(knowledge_base_docs)
+        # scores come straight from the index, candidates are not re-embedded
+        retriever: VectorScoreRetriever
+        if settings.retriever_hybrid:
+            retriever = HybridRetriever(
+                store=db,
+                lexical=self.knowledge_base.lexical(db),
+                score_threshold=settings.retriever_threshold,
+                fetch_k=settings.retriever_fetch_k,
+                rrf_k=settings.retriever_rrf_k,
+            )
+        else:
+            retriever = VectorScoreRetriever(
+                store=db, score_threshold=settings.retriever_threshold
+            )
 
         return create_retriever_tool(
-            compression_retriever,
+            retriever,
             "company_knowledge_base",
             "Search and return all information about the company.",
         )
+
+
+# event loop -> tool name -> semaphore, shared by every agent in the process
+_semaphores: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[str, asyncio.Semaphore]
+] = weakref.WeakKeyDictionary()
+
+
+class ConcurrentToolNode(ToolNode):
+    """Tool node bounding each tool with its own timeout and concurrency limit.
+
+    Tool calls of a turn already run concurrently on the async path, the
+    per-tool semaphores keep a slow tool such as mem0 search from queueing
+    behind itself across sessions, and the timeout turns a stuck call into an
+    error message for the model instead of stalling the whole turn.
+    """
+
+    def __init__(
+        self,
+        tools: typing.Sequence[BaseTool],
+        *,
+        timeouts: dict[str, float] | None = None,
+        default_timeout: float | None = None,
+        concurrency: dict[str, int] | None = None,
+        default_concurrency: int = 16,
+        **kwargs: typing.Any,
+    ) -> None:
+        super().__init__(tools, **kwargs)
+        self._timeouts = timeouts or {}
+        self._default_timeout = default_timeout
+        self._concurrency = concurrency or {}
+        self._default_concurrency = default_concurrency
+
+    def _semaphore(self, tool_name: str) -> asyncio.Semaphore:
+        semaphores = _semaphores.setdefault(asyncio.get_running_loop(), {})
+        if tool_name not in semaphores:
+            semaphores[tool_name] = asyncio.Semaphore(
+                self._concurrency.get(tool_name, self._default_concurrency)
+            )
+        return semaphores[tool_name]
+
+    async def _arun_one(
+        self,
+        call: ToolCall,
+        input_type: typing.Literal["list", "dict"],
+        config: RunnableConfig,
+    ) -> ToolMessage:
+        timeout = self._timeouts.get(call["name"], self._default_timeout)
+        # time queued behind other calls of the tool doesn't count against its
+        # timeout, or a busy tool would time out calls before they ever run
+        async with self._semaphore(call["name"]):
+            try:
+                async with asyncio.timeout(timeout):
+                    return await super()._arun_one(call, input_type, config)
+            except TimeoutError:
+                logger.warning("Tool %s timed out after %ss", call["name"], timeout)
+                return ToolMessage(
+                    content=f"Error: {call['name']} timed out after {timeout} seconds.",
+                    name=call["name"],
+                    tool_call_id=call["id"],
+                    status="error",
+                )
@@ -1,17 +1,38 @@
+import asyncio
+import functools
+import json
+import logging
 import typing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
+import tiktoken
 from langchain.chat_models import init_chat_model
 from langchain.embeddings import init_embeddings
 from langchain_core.embeddings import Embeddings
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, trim_messages
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 from mem0 import Memory
+from mem0.configs.base import MemoryConfig
+from qdrant_client import QdrantClient
 
 from app.config import settings
+from app.embeddings import CachedEmbeddings, Mem0Embedder
+from app.http import get_http_clients
+from app.memory_store import LocalMemory, SQLiteVectorStore, disable_telemetry
+from app.sqlite import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+T = typing.TypeVar("T")
 
 
 def load_chat_model(
-    fully_specified_name: str, temperature: int = 0, max_tokens: int = 2048
+    fully_specified_name: str,
+    temperature: int = 0,
+    max_tokens: int = 2048,
+    max_retries: int = 2,
 ) -> BaseChatModel:
     """Load a chat model from a fully specified name.
 
@@ -19,49 +40,242 @@ def load_chat_model(
         fully_specified_name (str): String in the format 'provider/model'.
         temperature (int, optional): Temperature parameter. Defaults to 0.
         max_tokens (int, optional): Max number of tokens. Defaults to 2048.
+        max_retries (int, optional): Retries of failed requests. Defaults to 2.
     """
     provider, model = fully_specified_name.split(":", maxsplit=1)
-    return init_chat_model(
+    http_clients = get_http_clients()
+    llm: BaseChatModel = init_chat_model(
         model,
         model_provider=provider,
         temperature=temperature,
         max_tokens=max_tokens,
         stream_usage=True,
-        max_retries=2,
+        max_retries=max_retries,
+        **http_clients.client_kwargs(provider),
     )
+    http_clients.attach(llm, provider)
+    return llm
 
 
+@functools.cache
 def load_embeddings_model() -> Embeddings:
-    return typing.cast(Embeddings, init_embeddings(settings.embeddings_model))
+    """Process-wide embeddings model, backed by the on-disk vector cache."""
+    provider, _, _ = settings.embeddings_model.partition(":")
+    embeddings = init_embeddings(
+        settings.embeddings_model, **get_http_clients().client_kwargs(provider)
+    )
+    return CachedEmbeddings(
+        typing.cast(Embeddings, embeddings),
+        model_name=settings.embeddings_model,
+        cache_dir=settings.embeddings_cache_dir,
+        batch_size=settings.embeddings_batch_size,
+        max_queries=settings.embeddings_cache_max_queries,
+    )
 
 
+@functools.cache
 def get_memory() -> Memory:
-    config = {"version": "v1.1"}
-    return Memory.from_config(config)
+    """Process-wide mem0 memory on a local vector store."""
+    return create_memory(
+        settings.memory_dir, settings.memory_collection, settings.memory_db_path
+    )
+
+
+def create_memory(memory_dir: Path, collection: str, db_path: Path) -> Memory:
+    """mem0 memory kept apart from other memories by its folder and collection.
+
+    Args:
+        memory_dir (Path): Folder of the embedded Qdrant store and the history
+            database.
+        collection (str): Collection name, telling memories apart on a
+            Qdrant server.
+        db_path (Path): SQLite store shared by the workers in multi-worker mode.
+    """
+    memory_dir.mkdir(parents=True, exist_ok=True)
+    if settings.memory_qdrant_url:
+        client = QdrantClient(
+            url=settings.memory_qdrant_url,
+            api_key=(
+                settings.memory_qdrant_api_key.get_secret_value()
+                if settings.memory_qdrant_api_key
+                else None
+            ),
+        )
+    elif settings.multi_worker:
+        # only holds mem0's own store, replaced by the shared one below
+        client = QdrantClient(location=":memory:")
+    else:
+        client = QdrantClient(path=str(memory_dir / "qdrant"))
+
+    embeddings_provider, _, embeddings_model = settings.embeddings_model.partition(":")
+    llm_provider, _, llm_model = settings.memory_llm_model.partition(":")
+    config = MemoryConfig(
+        version="v1.1",
+        vector_store={
+            "provider": "qdrant",
+            "config": {
+                "client": client,
+                "collection_name": collection,
+                "embedding_model_dims": settings.memory_embedding_dims,
+                "on_disk": True,
+            },
+        },
+        embedder={
+            "provider": embeddings_provider,
+            "config": {
+                "model": embeddings_model,
+                "embedding_dims": settings.memory_embedding_dims,
+            },
+        },
+        llm={"provider": llm_provider, "config": {"model": llm_model}},
+        history_db_path=str(memory_dir / "history.db"),
+    )
+    if not settings.memory_telemetry:
+        disable_telemetry()
+
+    # embedded Qdrant locks its folder to one process
+    vector_store = (
+        SQLiteVectorStore(
+            ConnectionPool(db_path),
+            collection_name=collection,
+            embedding_model_dims=settings.memory_embedding_dims,
+        )
+        if settings.multi_worker and not settings.memory_qdrant_url
+        else None
+    )
+    memory = LocalMemory(config, vector_store=vector_store)
+    # share the embedding cache with mem0, it embeds with the same model
+    memory.embedding_model = Mem0Embedder(load_embeddings_model())
+    return memory
+
+
+@functools.cache
+def get_blocking_executor() -> ThreadPoolExecutor:
+    """Thread pool for blocking client calls (mem0) made from async code."""
+    return ThreadPoolExecutor(
+        max_workers=settings.blocking_io_workers, thread_name_prefix="blocking-io"
+    )
+
+
+async def run_blocking(
+    func: typing.Callable[..., T], *args: typing.Any, **kwargs: typing.Any
+) -> T:
+    """Run a blocking call on the bounded executor without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_blocking_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+class TokenCounter:
+    """Counts message tokens with a model's tokenizer.
+
+    Counts are cached by message id, so trimming a growing history only
+    tokenizes the messages added since the previous turn. Loading the
+    tokenizer may download it, so counters are built off the event loop.
+    """
+
+    # per-message framing overhead of the chat formats (role, separators)
+    message_overhead = 4
+
+    def __init__(self, model: str, max_cached: int = 100_000) -> None:
+        self._model = model
+        self._max_cached = max_cached
+        self._cache: OrderedDict[str, int] = OrderedDict()
+        self._encode = self._load_encoding(model)
+
+    @staticmethod
+    def _load_encoding(model: str) -> typing.Callable[[str], typing.Sized] | None:
+        provider, _, name = model.partition(":")
+        try:
+            if provider == "openai":
+                return tiktoken.encoding_for_model(name).encode
+            # no local tokenizer for other providers, cl100k is a close estimate
+            return tiktoken.get_encoding("cl100k_base").encode
+        except Exception:
+            # unknown model, or the encoding could not be downloaded
+            logger.warning("No tokenizer available for %s, estimating tokens", model)
+            return None
+
+    def count_text(self, text: str) -> int:
+        encode = self._encode
+        if encode is None:
+            return len(text) // 4 + 1
+        return len(encode(text))
+
+    def count(self, message: BaseMessage) -> int:
+        if message.id is not None and message.id in self._cache:
+            self._cache.move_to_end(message.id)
+            return self._cache[message.id]
+
+        text = get_message_text(message)
+        if isinstance(message, AIMessage) and message.tool_calls:
+            text += json.dumps(message.tool_calls)
+        tokens = self.count_text(text) + self.message_overhead
+
+        if message.id is not None:
+            self._cache[message.id] = tokens
+            if len(self._cache) > self._max_cached:
+                self._cache.popitem(last=False)
+        return tokens
+
+
+@functools.cache
+def get_token_counter(model: str) -> TokenCounter:
+    """Return the token counter of ``model``, blocking while it is loaded."""
+    return TokenCounter(model)
+
+
+def get_history_budget(model: str, max_tokens: int | None) -> int:
+    """Tokens available for chat history given the model's context window.
+
+    Args:
+        model (str): Fully specified model name, e.g. 'openai:gpt-4o'.
+        max_tokens (int | None): Tokens reserved for the completion.
+    """
+    context_window = settings.model_context_windows.get(
+        model, settings.default_context_window
+    )
+    available = (
+        context_window
+        - (max_tokens or settings.default_max_tokens)
+        - settings.prompt_reserved_tokens
+    )
+    return max(0, min(settings.history_max_tokens, available))
 
 
 def trim_agent_messages(
-    messages: typing.Sequence[BaseMessage], max_tokens: int = 10
+    messages: typing.Sequence[BaseMessage],
+    max_tokens: int,
+    token_counter: TokenCounter,
 ) -> typing.Sequence[BaseMessage]:
-    return typing.cast(
-        typing.Sequence[BaseMessage],
-        trim_messages(
-            messages,
-            max_tokens=max_tokens,
-            strategy="last",
-            token_counter=len,
-            # Usually, we want to keep the SystemMessage
-            # if it's present in the original history.
-            # The SystemMessage has special instructions for the model.
-            include_system=True,
-            # Most chat models expect that chat history starts with either:
-            # (1) a HumanMessage or
-            # (2) a SystemMessage followed by a HumanMessage
-            # start_on="human" makes sure we produce a valid chat history
-            start_on="human",
-            end_on=("human", "tool", "ai"),
-        ),
-    )
+    """Keep the most recent messages that fit in ``max_tokens``.
+
+    System messages are always kept. The kept history starts on a human message
+    so tool calls are never separated from their results, and the latest human
+    message is kept even if it alone exceeds the budget.
+    """
+    system = [msg for msg in messages if isinstance(msg, SystemMessage)]
+    history = [msg for msg in messages if not isinstance(msg, SystemMessage)]
+
+    budget = max_tokens - sum(token_counter.count(msg) for msg in system)
+    start = len(history)
+    for idx in range(len(history) - 1, -1, -1):
+        budget -= token_counter.count(history[idx])
+        if budget < 0:
+            break
+        start = idx
+
+    # most chat models expect the history to start with a human message
+    while start < len(history) and not isinstance(history[start], HumanMessage):
+        start += 1
+    if start == len(history):
+        human_indexes = [
+            idx for idx, msg in enumerate(history) if isinstance(msg, HumanMessage)
+        ]
+        start = human_indexes[-1] if human_indexes else 0
+
+    return system + history[start:]
 
 
 def prepare_recall_memory(recall_memories: list[str] | None = None) -> str:
@@ -0,0 +1,216 @@
+import logging
+import math
+import typing
+from dataclasses import asdict, dataclass
+
+import faiss
+import numpy as np
+import numpy.typing as npt
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+IndexType = typing.Literal["flat", "ivf_flat", "ivf_pq", "hnsw"]
+Quantizer = typing.Literal["none", "sq8", "sq4", "fp16"]
+
+# k-means wants at least this many training points per IVF list
+MIN_POINTS_PER_LIST = 39
+QUANTIZER_CODES = {"sq8": "SQ8", "sq4": "SQ4", "fp16": "SQfp16"}
+
+Matrix = npt.NDArray[np.float32]
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """Layout of a knowledge base FAISS index and its search-time parameters.
+
+    Every type stores normalised vectors searched by inner product. Approximate
+    types only kick in from ``min_vectors`` vectors, smaller collections keep
+    an exact flat index since they are fast to scan and too small to train on.
+    """
+
+    type: IndexType = "flat"
+    # scalar quantization of the stored vectors, not used by IVF-PQ
+    quantizer: Quantizer = "none"
+    min_vectors: int = 10_000
+    train_sample: int = 50_000
+    # number of IVF lists, 4 * sqrt(n) when unset
+    nlist: int | None = None
+    nprobe: int = 16
+    pq_m: int = 32
+    pq_nbits: int = 8
+    # re-rank IVF-PQ candidates with finer codes, PQ alone loses a lot of recall
+    pq_refine: Quantizer = "sq8"
+    pq_refine_k_factor: int = 10
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    ef_search: int = 64
+
+    @classmethod
+    def from_settings(cls) -> "IndexSpec":
+        return cls(
+            type=settings.knowledge_base_index_type,
+            quantizer=settings.knowledge_base_quantizer,
+            min_vectors=settings.knowledge_base_ann_min_vectors,
+            train_sample=settings.knowledge_base_train_sample,
+            nlist=settings.ivf_nlist,
+            nprobe=settings.ivf_nprobe,
+            pq_m=settings.pq_m,
+            pq_nbits=settings.pq_nbits,
+            pq_refine=settings.pq_refine,
+            pq_refine_k_factor=settings.pq_refine_k_factor,
+            hnsw_m=settings.hnsw_m,
+            ef_construction=settings.hnsw_ef_construction,
+            ef_search=settings.hnsw_ef_search,
+        )
+
+    @property
+    def is_exact(self) -> bool:
+        return self.type == "flat" and self.quantizer == "none"
+
+    def key(self) -> str:
+        """Stable description of the layout, search parameters excluded."""
+        layout = asdict(self)
+        for name in ("nprobe", "ef_search", "pq_refine_k_factor"):
+            layout.pop(name)
+        return ",".join(f"{name}={value}" for name, value in layout.items())
+
+    def factory_string(self, dimensions: int, count: int) -> str:
+        """``faiss.index_factory`` description for ``count`` vectors.
+
+        Args:
+            dimensions (int): Size of the vectors.
+            count (int): Number of vectors the index is built with.
+        """
+        storage = QUANTIZER_CODES.get(self.quantizer, "Flat")
+        if self.type == "flat":
+            return storage
+        if self.type == "hnsw":
+            return f"HNSW{self.hnsw_m},{storage}"
+
+        nlist = self.nlist or int(4 * math.sqrt(count))
+        nlist = max(1, min(nlist, count // MIN_POINTS_PER_LIST))
+        if self.type == "ivf_flat":
+            return f"IVF{nlist},{storage}"
+        if dimensions % self.pq_m:
+            raise ValueError(
+                f"pq_m={self.pq_m} must divide the {dimensions} embedding dimensions"
+            )
+        factory = f"IVF{nlist},PQ{self.pq_m}x{self.pq_nbits}"
+        if self.pq_refine != "none":
+            factory += f",Refine({QUANTIZER_CODES[self.pq_refine]})"
+        return factory
+
+
+def build(vectors: Matrix, spec: IndexSpec) -> faiss.Index:
+    """Build an index of ``spec`` holding ``vectors``, trained on a sample.
+
+    Args:
+        vectors (Matrix): Normalised float32 vectors, one per row.
+        spec (IndexSpec): Index layout.
+    """
+    count, dimensions = vectors.shape
+    factory = spec.factory_string(dimensions, count)
+    index = faiss.index_factory(dimensions, factory, faiss.METRIC_INNER_PRODUCT)
+    graph = faiss.downcast_index(index)
+    if isinstance(graph, faiss.IndexHNSW):
+        graph.hnsw.efConstruction = spec.ef_construction
+
+    if not index.is_trained:
+        sample = vectors
+        if count > spec.train_sample:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(count, spec.train_sample, replace=False)]
+        index.train(np.ascontiguousarray(sample))
+    index.add(vectors)
+
+    if spec.type in ("ivf_flat", "ivf_pq"):
+        # reconstruction and removal by id both need the direct map
+        direct_map = faiss.DirectMap.Hashtable  # type: ignore[attr-defined]
+        faiss.extract_index_ivf(index).set_direct_map_type(direct_map)
+    tune(index, spec)
+    logger.info("Built %s knowledge base index of %s vectors", factory, count)
+    return index
+
+
+def convert(index: faiss.Index, spec: IndexSpec) -> faiss.Index:
+    """Return ``index`` rebuilt as ``spec`` when it is large enough for it.
+
+    The vectors are read back from the index, so nothing is re-embedded.
+    """
+    if spec.is_exact or index.ntotal < spec.min_vectors or not is_flat(index):
+        return index
+    return build(index.reconstruct_n(0, index.ntotal), spec)
+
+
+def remove(index: faiss.Index, positions: typing.Sequence[int]) -> faiss.Index:
+    """Remove vectors by position, so later positions shift down.
+
+    Flat indexes shift the positions themselves. IVF indexes keep the ids of
+    the remaining vectors on removal, so those are renumbered in the inverted
+    lists. HNSW graphs and refined IVF-PQ indexes do not support removal, so
+    the remaining vectors are copied into a new index of the same layout.
+    """
+    ids = np.asarray(positions, dtype=np.int64)
+    try:
+        index.remove_ids(ids)  # type: ignore[arg-type]
+    except RuntimeError:
+        pass
+    else:
+        ivf = faiss.downcast_index(index)
+        if isinstance(ivf, faiss.IndexIVF):
+            _shift_ids(ivf, ids)
+        return index
+
+    keep = np.ones(index.ntotal, dtype=bool)
+    keep[ids] = False
+    vectors = index.reconstruct_n(0, index.ntotal)[keep]
+    # the clone keeps the graph parameters and the trained quantizer
+    rebuilt = faiss.clone_index(index)
+    rebuilt.reset()
+    rebuilt.add(vectors)
+    return rebuilt
+
+
+def _shift_ids(index: faiss.IndexIVF, removed: npt.NDArray[np.int64]) -> None:
+    """Renumber the ids left after ``removed`` to be consecutive again."""
+    removed = np.sort(removed)
+    invlists = typing.cast(faiss.InvertedLists, index.invlists)
+    for list_no in range(index.nlist):
+        size = invlists.list_size(list_no)
+        if not size:
+            continue
+        ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), size).copy()
+        codes = faiss.rev_swig_ptr(
+            invlists.get_codes(list_no), size * invlists.code_size
+        ).copy()
+        ids -= np.searchsorted(removed, ids)
+        invlists.update_entries(
+            list_no, 0, size, faiss.swig_ptr(ids), faiss.swig_ptr(codes)
+        )
+    # the direct map still points at the old ids
+    index.set_direct_map_type(faiss.DirectMap.NoMap)  # type: ignore[attr-defined]
+    index.set_direct_map_type(faiss.DirectMap.Hashtable)  # type: ignore[attr-defined]
+
+
+def tune(index: faiss.Index, spec: IndexSpec) -> None:
+    """Apply the search-time parameters of ``spec``, they need no rebuild."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexRefine):
+        index.k_factor = spec.pq_refine_k_factor
+        index = faiss.downcast_index(index.base_index)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = spec.ef_search
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = spec.nprobe
+
+
+def is_flat(index: faiss.Index) -> bool:
+    """Whether ``index`` is an exact, uncompressed index."""
+    return isinstance(faiss.downcast_index(index), faiss.IndexFlat)
+
+
+def describe(index: faiss.Index) -> str:
+    """Class name of ``index``, e.g. ``IndexIVFFlat``, recorded in manifests."""
+    return type(faiss.downcast_index(index)).__name__
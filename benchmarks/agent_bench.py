@@ -0,0 +1,249 @@
+"""Offline benchmarks of the agent's hot paths with scripted fakes.
+
+Measures agent construction, new chat setup through the agent pool,
+per-turn latency, time to first token from
+``Agent.stream``, tool loop overhead, retriever latency and memory retained
+per conversation thread. Each measurement is printed as one JSON object per
+line and optionally appended to ``--output`` to track regressions::
+
+    python -m benchmarks.agent_bench --output data/benchmarks.jsonl
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import typing
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.agent import Agent
+from app.fakes import FakeChatModel, FakeEmbeddings, FakeMemory
+from app.knowledge_base import KnowledgeBaseIndex
+from app.memory import get_ingestion_queue
+from app.pool import AgentPool
+from app.retrievers import VectorScoreRetriever
+from app.tools import knowledge_base_docs
+
+TOOL_CALL = {"name": "company_knowledge_base", "args": {"query": "shipping"}}
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def latency_stats(latencies: list[float]) -> dict[str, float]:
+    return {
+        "samples": len(latencies),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+    }
+
+
+def new_config(memory: FakeMemory) -> RunnableConfig:
+    return RunnableConfig(
+        configurable=dict(
+            thread_id=uuid.uuid4().hex,
+            user_id=uuid.uuid4().hex,
+            memory_store=memory,
+            model="fake",
+        )
+    )
+
+
+class Bench:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.index_dir = Path(tempfile.mkdtemp())
+        self.embeddings = FakeEmbeddings(size=args.dimensions)
+        self.knowledge_base = KnowledgeBaseIndex(
+            self.index_dir, self.embeddings, "fake"
+        )
+        self.memory = FakeMemory()
+
+    def agent(self, **llm_kwargs: typing.Any) -> Agent:
+        llm = FakeChatModel(
+            latency=self.args.llm_latency,
+            token_latency=self.args.token_latency,
+            **llm_kwargs,
+        )
+        return Agent(llm, MemorySaver(), self.memory, self.knowledge_base)
+
+    def construction(self) -> dict[str, typing.Any]:
+        started = time.perf_counter()
+        self.agent()
+        cold = time.perf_counter() - started
+
+        # a new manager memory-maps the index persisted by the cold build
+        self.knowledge_base = KnowledgeBaseIndex(
+            self.index_dir, self.embeddings, "fake"
+        )
+        started = time.perf_counter()
+        self.agent()
+        from_disk = time.perf_counter() - started
+
+        warm = []
+        for _ in range(self.args.repeat):
+            started = time.perf_counter()
+            self.agent()
+            warm.append(time.perf_counter() - started)
+
+        return {
+            "cold_ms": round(cold * 1000, 3),
+            "from_disk_ms": round(from_disk * 1000, 3),
+            **latency_stats(warm),
+        }
+
+    def new_chat(self) -> dict[str, typing.Any]:
+        """Agent lookup for a new chat or settings change, after the first."""
+        pool = AgentPool(lambda model: self.agent())
+        pool.get("fake")
+        latencies = []
+        for _ in range(self.args.repeat):
+            started = time.perf_counter()
+            pool.get("fake")
+            latencies.append(time.perf_counter() - started)
+        return {**latency_stats(latencies), "builds": pool.builds}
+
+    async def turn_latency(self) -> dict[str, typing.Any]:
+        agent = self.agent()
+        config = new_config(self.memory)
+        latencies = []
+        for _ in range(self.args.turns):
+            started = time.perf_counter()
+            await agent.invoke("How long is shipping?", config)
+            latencies.append(time.perf_counter() - started)
+        return latency_stats(latencies)
+
+    async def time_to_first_token(self) -> dict[str, typing.Any]:
+        agent = self.agent()
+        config = new_config(self.memory)
+        first_tokens = []
+        totals = []
+        for _ in range(self.args.turns):
+            started = time.perf_counter()
+            first_token = None
+            async for _ in agent.stream("How long is shipping?", config):
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+            totals.append(time.perf_counter() - started)
+            first_tokens.append(typing.cast(float, first_token))
+        return {
+            "ttft": latency_stats(first_tokens),
+            "total": latency_stats(totals),
+        }
+
+    async def tool_loop(self) -> dict[str, typing.Any]:
+        plain = await self.turn_latency()
+        agent = self.agent(tool_calls=[TOOL_CALL])
+        config = new_config(self.memory)
+        latencies = []
+        for _ in range(self.args.turns):
+            started = time.perf_counter()
+            await agent.invoke("How long is shipping?", config)
+            latencies.append(time.perf_counter() - started)
+        stats = latency_stats(latencies)
+        # a tool turn makes one extra model call, the rest is tool node overhead
+        overhead = stats["p50_ms"] - plain["p50_ms"] - self.args.llm_latency * 1000
+        return {**stats, "overhead_p50_ms": round(overhead, 3)}
+
+    async def retriever(self) -> dict[str, typing.Any]:
+        store = self.knowledge_base.load(knowledge_base_docs)
+        retriever = VectorScoreRetriever(store=store)
+        self.embeddings.latency = self.args.embed_latency
+        latencies = []
+        for idx in range(self.args.turns):
+            started = time.perf_counter()
+            await retriever.ainvoke(f"shipping question {idx}")
+            latencies.append(time.perf_counter() - started)
+        self.embeddings.latency = 0.0
+        return latency_stats(latencies)
+
+    async def memory_per_thread(self) -> dict[str, typing.Any]:
+        agent = self.agent()
+        await agent.invoke("warm up", new_config(self.memory))
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(self.args.threads):
+            config = new_config(self.memory)
+            for _ in range(self.args.turns_per_thread):
+                await agent.invoke("How long is shipping?", config)
+        await get_ingestion_queue(self.memory).flush()
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return {
+            "threads": self.args.threads,
+            "turns_per_thread": self.args.turns_per_thread,
+            "bytes_per_thread": (after - before) // self.args.threads,
+        }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args: argparse.Namespace) -> None:
+    bench = Bench(args)
+    metadata = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "llm_latency_ms": args.llm_latency * 1000,
+        "token_latency_ms": args.token_latency * 1000,
+    }
+    results = {
+        "construction": bench.construction(),
+        "new_chat": bench.new_chat(),
+        "turn_latency": await bench.turn_latency(),
+        "time_to_first_token": await bench.time_to_first_token(),
+        "tool_loop": await bench.tool_loop(),
+        "retriever": await bench.retriever(),
+        "memory_per_thread": await bench.memory_per_thread(),
+    }
+    await get_ingestion_queue(bench.memory).aclose()
+
+    lines = [
+        json.dumps({"benchmark": f"agent.{name}", **metadata, **result})
+        for name, result in results.items()
+    ]
+    print("\n".join(lines))
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "a") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=50)
+    parser.add_argument("--turns-per-thread", type=int, default=3)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--output", type=Path, default=None)
+    asyncio.run(main(parser.parse_args()))
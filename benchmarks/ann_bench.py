@@ -0,0 +1,151 @@
+"""Recall and latency of the knowledge base index types against exact search.
+
+Vectors are drawn around random cluster centres, like embeddings of a corpus
+covering a number of topics, and normalised. Each layout is built once, then
+searched with every ``nprobe`` or ``efSearch`` value, which need no rebuild.
+Recall@k is measured against the flat index. Results are printed one JSON
+object per line::
+
+    python -m benchmarks.ann_bench --vectors 200000 --dimensions 256
+"""
+
+import argparse
+import json
+import statistics
+import time
+import typing
+
+import faiss
+import numpy as np
+import numpy.typing as npt
+
+from app import vector_index
+from app.vector_index import IndexSpec, Matrix
+
+Ids = npt.NDArray[np.int64]
+
+LAYOUTS: dict[str, dict[str, typing.Any]] = {
+    "flat": {"type": "flat"},
+    "flat_sq8": {"type": "flat", "quantizer": "sq8"},
+    "ivf_flat": {"type": "ivf_flat"},
+    "ivf_sq8": {"type": "ivf_flat", "quantizer": "sq8"},
+    "ivf_pq": {"type": "ivf_pq"},
+    "hnsw": {"type": "hnsw"},
+    "hnsw_sq8": {"type": "hnsw", "quantizer": "sq8"},
+}
+
+
+def clustered(count: int, centres: Matrix, noise: float, seed: int) -> Matrix:
+    rng = np.random.default_rng(seed)
+    assignment = rng.integers(len(centres), size=count)
+    vectors = centres[assignment] + noise * rng.standard_normal(
+        (count, centres.shape[1]), dtype=np.float32
+    )
+    faiss.normalize_L2(vectors)
+    return typing.cast(Matrix, vectors)
+
+
+def recall(found: Ids, truth: Ids) -> float:
+    k = truth.shape[1]
+    hits = sum(
+        len(np.intersect1d(row, expected)) for row, expected in zip(found, truth)
+    )
+    return hits / (len(truth) * k)
+
+
+def search(
+    index: faiss.Index, queries: Matrix, k: int
+) -> tuple[Ids, list[float], float]:
+    """Search one query at a time for latency, then all at once for throughput."""
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    _, found = index.search(queries, k)
+    return found, latencies, time.perf_counter() - started
+
+
+def main(args: argparse.Namespace) -> None:
+    faiss.omp_set_num_threads(args.threads)
+    rng = np.random.default_rng(0)
+    centres = rng.standard_normal((args.clusters, args.dimensions), dtype=np.float32)
+    vectors = clustered(args.vectors, centres, args.noise, seed=1)
+    queries = clustered(args.queries, centres, args.noise, seed=2)
+
+    exact = faiss.IndexFlatIP(args.dimensions)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+
+    for name in args.layouts:
+        spec = IndexSpec(
+            **LAYOUTS[name],
+            min_vectors=0,
+            train_sample=args.train_sample,
+            pq_m=args.pq_m,
+            pq_refine_k_factor=args.k_factor,
+            hnsw_m=args.hnsw_m,
+        )
+        started = time.perf_counter()
+        index = vector_index.build(vectors, spec)
+        build_seconds = time.perf_counter() - started
+        size = len(faiss.serialize_index(index))
+
+        if spec.type in ("ivf_flat", "ivf_pq"):
+            sweep = [{"nprobe": nprobe} for nprobe in args.nprobe]
+        elif spec.type == "hnsw":
+            sweep = [{"ef_search": ef} for ef in args.ef_search]
+        else:
+            sweep = [{}]
+
+        for params in sweep:
+            tuned = IndexSpec(
+                **{**LAYOUTS[name], "pq_refine_k_factor": args.k_factor, **params}
+            )
+            vector_index.tune(index, tuned)
+            found, latencies, batch_seconds = search(index, queries, args.k)
+            print(
+                json.dumps(
+                    {
+                        "benchmark": "ann",
+                        "layout": name,
+                        "index": spec.factory_string(args.dimensions, args.vectors),
+                        **params,
+                        "vectors": args.vectors,
+                        "dimensions": args.dimensions,
+                        f"recall_at_{args.k}": round(recall(found, truth), 4),
+                        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+                        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+                        "batch_qps": round(len(queries) / batch_seconds),
+                        "build_s": round(build_seconds, 2),
+                        "size_mb": round(size / 2**20, 1),
+                    }
+                )
+            )
+
+
+def int_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.5)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--train-sample", type=int, default=50_000)
+    parser.add_argument("--pq-m", type=int, default=32)
+    parser.add_argument("--k-factor", type=int, default=10)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--nprobe", type=int_list, default=[1, 4, 16, 64])
+    parser.add_argument("--ef-search", type=int_list, default=[16, 64, 128])
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument(
+        "--layouts", nargs="+", choices=list(LAYOUTS), default=list(LAYOUTS)
+    )
+    main(parser.parse_args())
@@ -0,0 +1,145 @@
+"""Knowledge base tool calls per answer: dense vs hybrid BM25 retrieval.
+
+The corpus is the built-in knowledge base plus generated product and contact
+documents, with questions naming an exact SKU, email address or product.
+Each question replays the agent's tool loop: the model searches the
+knowledge base with the question, and while the results miss the answer it
+searches again with a narrower query, up to ``--max-calls`` times. Every extra
+call is one more model round trip in the turn. Embeddings are hashed
+character trigrams, which blur identifiers the way real embeddings do.
+Results are printed one JSON object per line::
+
+    python -m benchmarks.hybrid_bench --products 2000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import tempfile
+import time
+import typing
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+from app.fakes import NgramEmbeddings
+from app.knowledge_base import KnowledgeBaseIndex
+from app.retrievers import HybridRetriever, VectorScoreRetriever
+from app.tools import knowledge_base_docs
+
+DEPARTMENTS = ["billing", "returns", "warranty", "wholesale", "privacy", "press"]
+REGIONS = ["us", "eu", "uk", "apac"]
+
+
+class Question(typing.NamedTuple):
+    # queries the model tries in order, the answer is found when a result
+    # contains `answer`
+    queries: list[str]
+    answer: str
+
+
+def corpus(products: int, rng: random.Random) -> tuple[list[Document], list[Question]]:
+    docs = list(knowledge_base_docs)
+    questions = [
+        Question(["Can I pay with Apple Pay?", "Apple Pay payment"], "Apple Pay"),
+        Question(
+            ["What is techsupport@company.com for?", "techsupport@company.com"],
+            "techsupport@company.com",
+        ),
+    ]
+
+    for idx in range(products):
+        sku = f"SKU-{idx:05d}"
+        docs.append(
+            Document(
+                page_content=f"Product {sku} costs ${rng.randint(5, 500)} and "
+                f"ships in {rng.randint(1, 9)} days."
+            )
+        )
+        if idx % max(1, products // 50) == 0:
+            questions.append(
+                Question([f"How much does {sku} cost?", f"{sku} price", sku], sku)
+            )
+
+    for department in DEPARTMENTS:
+        for region in REGIONS:
+            email = f"{department}-{region}@company.com"
+            docs.append(
+                Document(
+                    page_content=f"For {department} questions in {region.upper()}, "
+                    f"email {email}."
+                )
+            )
+            questions.append(Question([f"What is {email} for?", email], email))
+    return docs, questions
+
+
+async def answer(
+    retriever: VectorScoreRetriever, question: Question, max_calls: int
+) -> tuple[int, bool, list[float]]:
+    """Replay the tool loop, returning the calls made and whether it answered."""
+    latencies = []
+    for calls in range(1, max_calls + 1):
+        query = question.queries[min(calls, len(question.queries)) - 1]
+        started = time.perf_counter()
+        docs = await retriever.ainvoke(query)
+        latencies.append(time.perf_counter() - started)
+        if any(question.answer in doc.page_content for doc in docs):
+            return calls, True, latencies
+    return max_calls, False, latencies
+
+
+async def main(args: argparse.Namespace) -> None:
+    docs, questions = corpus(args.products, random.Random(0))
+    embeddings = NgramEmbeddings(size=args.dimensions)
+    knowledge_base = KnowledgeBaseIndex(
+        Path(tempfile.mkdtemp()), embeddings, "fake-ngram"
+    )
+    store = knowledge_base.load(docs)
+
+    retrievers: dict[str, VectorScoreRetriever] = {
+        "dense": VectorScoreRetriever(
+            store=store, k=args.k, score_threshold=args.threshold
+        ),
+        "hybrid": HybridRetriever(
+            store=store,
+            lexical=knowledge_base.lexical(store),
+            k=args.k,
+            score_threshold=args.threshold,
+        ),
+    }
+    for name, retriever in retrievers.items():
+        calls, answered, latencies = [], 0, []
+        for question in questions:
+            used, found, question_latencies = await answer(
+                retriever, question, args.max_calls
+            )
+            calls.append(used)
+            answered += found
+            latencies.extend(question_latencies)
+        print(
+            json.dumps(
+                {
+                    "benchmark": "hybrid_retrieval",
+                    "retriever": name,
+                    "documents": len(docs),
+                    "questions": len(questions),
+                    "tool_calls_per_answer": round(statistics.fmean(calls), 2),
+                    "first_call_answered": round(calls.count(1) / len(calls), 3),
+                    "answered": round(answered / len(questions), 3),
+                    "p50_ms": round(statistics.median(latencies) * 1000, 3),
+                }
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--threshold", type=float, default=0.3)
+    parser.add_argument("--max-calls", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
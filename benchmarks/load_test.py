@@ -0,0 +1,113 @@
+"""Concurrent session load test for the async agent graph.
+
+Runs N sessions against one agent with a fake LLM and a blocking fake mem0
+and reports per-turn latency percentiles and event loop lag per concurrency
+level, one JSON object per line::
+
+    python -m benchmarks.load_test --concurrency 1 8 32 64
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+import typing
+import uuid
+from pathlib import Path
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.agent import Agent
+from app.fakes import FakeChatModel, FakeMemory
+from app.knowledge_base import KnowledgeBaseIndex
+from app.memory import get_ingestion_queue
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def measure_loop_lag(stop: asyncio.Event, lags: list[float]) -> None:
+    """Record how late a 5 ms ticker wakes up, i.e. how long the loop was blocked."""
+    interval = 0.005
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def run_session(
+    agent: Agent, memory: FakeMemory, turns: int, latencies: list[float]
+) -> None:
+    config = RunnableConfig(
+        configurable=dict(
+            thread_id=uuid.uuid4().hex,
+            user_id=uuid.uuid4().hex,
+            memory_store=memory,
+            model="fake",
+        )
+    )
+    for _ in range(turns):
+        started = time.perf_counter()
+        await agent.invoke("How long is shipping?", config)
+        latencies.append(time.perf_counter() - started)
+
+
+async def run_level(
+    agent: Agent, memory: FakeMemory, concurrency: int, turns: int
+) -> dict[str, typing.Any]:
+    latencies: list[float] = []
+    lags: list[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_loop_lag(stop, lags))
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(run_session(agent, memory, turns, latencies) for _ in range(concurrency))
+    )
+    elapsed = time.perf_counter() - started
+    # memories are written in the background, off the measured turn latency
+    memory_queue = get_ingestion_queue(memory)
+    await memory_queue.flush()
+    stop.set()
+    await ticker
+
+    return {
+        "benchmark": "load_test",
+        "concurrency": concurrency,
+        "turns": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_loop_lag_ms": round(max(lags, default=0.0) * 1000, 2),
+        "memory_writes_total": memory_queue.persisted,
+        "memory_last_lag_ms": round(memory_queue.last_lag * 1000, 2),
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    index_dir = Path(tempfile.mkdtemp())
+    knowledge_base = KnowledgeBaseIndex(
+        index_dir, DeterministicFakeEmbedding(size=256), "fake"
+    )
+    llm = FakeChatModel(latency=args.llm_latency)
+    memory = FakeMemory(latency=args.memory_latency)
+    agent = Agent(llm, MemorySaver(), memory, knowledge_base)
+
+    for concurrency in args.concurrency:
+        result = await run_level(agent, memory, concurrency, args.turns)
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--memory-latency", type=float, default=0.01)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,165 @@
+"""mem0 add and search latency as a user's memory count grows.
+
+Memories are stored in the embedded Qdrant database the app uses, on disk in
+a temporary directory, with fake embeddings and a fake mem0 LLM extracting
+``--facts`` facts per add. The user's memories are grown to each of
+``--sizes`` by bulk inserts, while ``--other-users`` users hold the same
+number of memories in total, then ``--samples`` searches and adds are timed.
+Adds are timed with the facts inserted in one batch and one by one. The
+app's collection per user is compared with a single collection shared by
+all users and filtered by user id, as mem0 stores them, up to
+``--shared-max-size`` memories since embedded Qdrant filters in Python.
+Results are printed one JSON object per line::
+
+    python -m benchmarks.memory_bench --sizes 1000 10000 100000
+"""
+
+import argparse
+import json
+import logging
+import statistics
+import tempfile
+import time
+import typing
+import uuid
+
+from mem0 import Memory
+from mem0.configs.base import MemoryConfig
+from qdrant_client import QdrantClient
+
+from app.embeddings import Mem0Embedder
+from app.fakes import FakeEmbeddings, FakeMem0LLM
+from app.memory_store import LocalMemory, UserPartitionedVectorStore, disable_telemetry
+
+USER_ID = "user-0"
+
+
+class SharedVectorStore(UserPartitionedVectorStore):
+    """Every user in one collection, searched with a user id filter."""
+
+    def collection_for(self, user_id: str | None) -> str:
+        return self.collection_name
+
+    @staticmethod
+    def _without_user(
+        filters: dict[str, typing.Any] | None,
+    ) -> dict[str, typing.Any] | None:
+        return filters or None
+
+
+def build_memory(args: argparse.Namespace, layout: str) -> LocalMemory:
+    path = tempfile.mkdtemp()
+    config = MemoryConfig(
+        version="v1.1",
+        vector_store={
+            "provider": "qdrant",
+            "config": {
+                "client": QdrantClient(path=f"{path}/qdrant"),
+                "collection_name": "memories",
+                "embedding_model_dims": args.dimensions,
+                "on_disk": True,
+            },
+        },
+        # replaced by fakes below, the key only satisfies the OpenAI clients
+        embedder={"provider": "openai", "config": {"api_key": "unused"}},
+        llm={"provider": "openai", "config": {"api_key": "unused"}},
+        history_db_path=f"{path}/history.db",
+    )
+    memory = LocalMemory(config)
+    if layout == "shared":
+        memory.vector_store = SharedVectorStore.from_memory(memory)
+    memory.embedding_model = Mem0Embedder(FakeEmbeddings(size=args.dimensions))
+    memory.llm = FakeMem0LLM(facts=args.facts)
+    return memory
+
+
+def grow(memory: LocalMemory, user_id: str, count: int, dimensions: int) -> None:
+    embeddings = FakeEmbeddings(size=dimensions)
+    for start in range(0, count, 1000):
+        texts = [
+            f"{user_id} fact {idx}" for idx in range(start, min(count, start + 1000))
+        ]
+        memory.vector_store.insert(
+            vectors=embeddings.embed_documents(texts),
+            payloads=[{"data": text, "user_id": user_id} for text in texts],
+            ids=[str(uuid.uuid4()) for _ in texts],
+        )
+
+
+def timings(fn: typing.Callable[[], typing.Any], samples: int) -> dict[str, float]:
+    durations = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+    durations.sort()
+    return {
+        "p50_ms": round(statistics.median(durations) * 1000, 2),
+        "p95_ms": round(durations[int(len(durations) * 0.95)] * 1000, 2),
+    }
+
+
+def add_unbatched(memory: LocalMemory, message: str) -> None:
+    """``Memory.add`` as mem0 does it, one upsert per extracted fact."""
+    metadata = {"user_id": USER_ID}
+    Memory._add_to_vector_store(
+        memory, [{"role": "user", "content": message}], metadata, dict(metadata)
+    )
+
+
+def main(args: argparse.Namespace) -> None:
+    disable_telemetry()
+    for layout in ["shared", "per_user"]:
+        memory = build_memory(args, layout)
+        other_users = [f"user-{idx}" for idx in range(1, args.other_users + 1)]
+        count = 0
+        for size in sorted(args.sizes):
+            if layout == "shared" and size > args.shared_max_size:
+                break
+            grow(memory, USER_ID, size - count, args.dimensions)
+            for user_id in other_users:
+                grow(
+                    memory, user_id, (size - count) // len(other_users), args.dimensions
+                )
+            count = size
+
+            search = timings(
+                lambda: memory.search(
+                    "Where does the user live?", user_id=USER_ID, limit=3
+                ),
+                args.samples,
+            )
+            add = timings(
+                lambda: memory.add("I moved to Lisbon last month.", user_id=USER_ID),
+                args.samples,
+            )
+            add_one_by_one = timings(
+                lambda: add_unbatched(memory, "I moved to Lisbon last month."),
+                args.samples,
+            )
+            print(
+                json.dumps(
+                    {
+                        "benchmark": "memory",
+                        "layout": layout,
+                        "user_memories": size,
+                        "total_memories": size * (2 if other_users else 1),
+                        "search": search,
+                        "add_batched": add,
+                        "add_unbatched": add_one_by_one,
+                    }
+                )
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    parser.add_argument("--other-users", type=int, default=15)
+    parser.add_argument("--shared-max-size", type=int, default=10_000)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--facts", type=int, default=5)
+    parser.add_argument("--samples", type=int, default=20)
+    # mem0 logs every fact it adds
+    logging.getLogger().setLevel(logging.WARNING)
+    main(parser.parse_args())
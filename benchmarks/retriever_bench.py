@@ -0,0 +1,106 @@
+"""Knowledge base retriever latency: EmbeddingsFilter vs precomputed vectors.
+
+The ``EmbeddingsFilter`` pipeline embeds the query for the FAISS search and
+then embeds the query and every candidate again to score them. The
+``VectorScoreRetriever`` embeds the query once and reads the scores from the
+index. Results are printed one JSON object per line::
+
+    python -m benchmarks.retriever_bench --documents 1000 --embed-latency 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+import typing
+from pathlib import Path
+
+from langchain.retrievers import ContextualCompressionRetriever
+from langchain.retrievers.document_compressors.embeddings_filter import EmbeddingsFilter
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from app.fakes import FakeEmbeddings
+from app.knowledge_base import KnowledgeBaseIndex
+from app.retrievers import VectorScoreRetriever
+
+
+async def time_queries(
+    retriever: BaseRetriever, queries: list[str]
+) -> tuple[list[float], int]:
+    latencies = []
+    hits = 0
+    for query in queries:
+        started = time.perf_counter()
+        docs = await retriever.ainvoke(query)
+        latencies.append(time.perf_counter() - started)
+        hits += len(docs)
+    return latencies, hits
+
+
+def summarize(
+    name: str,
+    latencies: list[float],
+    embed_calls: int,
+    hits: int,
+    args: argparse.Namespace,
+) -> dict[str, typing.Any]:
+    return {
+        "benchmark": "retriever",
+        "pipeline": name,
+        "documents": args.documents,
+        "queries": args.queries,
+        "embed_latency_ms": args.embed_latency * 1000,
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "embed_calls_per_query": round(embed_calls / args.queries, 2),
+        "hits": hits,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    embeddings = FakeEmbeddings(size=args.dimensions)
+    docs = [Document(page_content=f"document {idx}") for idx in range(args.documents)]
+    store = KnowledgeBaseIndex(Path(tempfile.mkdtemp()), embeddings, "fake").load(docs)
+    queries = [f"document {idx}" for idx in range(args.queries)]
+    embeddings.latency = args.embed_latency
+
+    pipelines: dict[str, BaseRetriever] = {
+        "embeddings_filter": ContextualCompressionRetriever(
+            base_compressor=EmbeddingsFilter(
+                embeddings=embeddings, similarity_threshold=args.threshold
+            ),
+            base_retriever=store.as_retriever(search_kwargs={"k": args.k}),
+        ),
+        "vector_score": VectorScoreRetriever(
+            store=store, k=args.k, score_threshold=args.threshold
+        ),
+    }
+    for name, retriever in pipelines.items():
+        embeddings.calls = 0
+        latencies, hits = await time_queries(retriever, queries)
+        print(json.dumps(summarize(name, latencies, embeddings.calls, hits, args)))
+
+    # batched scoring against the stored vectors, one matrix product per batch
+    vector_score = typing.cast(VectorScoreRetriever, pipelines["vector_score"])
+    embeddings.calls = 0
+    started = time.perf_counter()
+    results = vector_score.batch_search(queries)
+    elapsed = time.perf_counter() - started
+    batch = summarize("vector_score_batch", [elapsed / len(queries)], 0, 0, args)
+    batch["embed_calls_per_query"] = round(embeddings.calls / args.queries, 2)
+    batch["hits"] = sum(len(hits) for hits in results)
+    print(json.dumps(batch))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--threshold", type=float, default=0.3)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    asyncio.run(main(parser.parse_args()))
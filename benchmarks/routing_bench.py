@@ -0,0 +1,135 @@
+"""Tail latency of a pinned model vs the model router, with fake providers.
+
+Each provider answers after ``--latency`` seconds, but ``--tail-probability``
+of its requests take ``--tail-latency`` and ``--rate-limit`` of them fail
+with HTTP 429. The pinned model retries rate limits after a backoff like the
+provider SDKs do. The router falls back to the backup provider instead, and
+with hedging also calls the backup when the primary is slower than its
+recent 95th percentile. Requests run ``--concurrency`` at a time and every
+scenario sends the same seeded traffic. Results are printed one JSON object
+per line::
+
+    python -m benchmarks.routing_bench --requests 500
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+
+from langchain_core.messages import HumanMessage
+
+from app.fakes import FakeRateLimitError, FlakyChatModel
+from app.routing import RoutedModel, RouterStats, RoutingChatModel, router_hedges
+
+MODELS = ["fake:primary", "fake:backup", "fake:cheap"]
+LONG_QUESTION = "I ordered a jacket last week and it arrived in the wrong size. " * 4
+
+
+def providers(args: argparse.Namespace) -> dict[str, RoutedModel]:
+    common = dict(
+        tail_latency=args.tail_latency,
+        tail_probability=args.tail_probability,
+        rate_limit_probability=args.rate_limit,
+    )
+    # the backup is slower and the cheap model faster than the primary
+    latencies = [args.latency, args.latency * 1.5, args.latency / 2]
+    return {
+        name: FlakyChatModel(latency=latency, seed=seed, **common)
+        for seed, (name, latency) in enumerate(zip(MODELS, latencies))
+    }
+
+
+def scenarios(args: argparse.Namespace) -> dict[str, RoutedModel]:
+    def router(hedge: bool, cheap: bool) -> RoutingChatModel:
+        models = providers(args)
+        return RoutingChatModel(
+            primary="fake:primary",
+            models=models,
+            fallbacks=["fake:backup"],
+            cheap_model="fake:cheap" if cheap else None,
+            stats=RouterStats(
+                min_samples=20,
+                cooldown=args.cooldown,
+                hedge_after=args.latency * 4 if hedge else None,
+            ),
+        )
+
+    pinned = providers(args)["fake:primary"].with_retry(
+        retry_if_exception_type=(FakeRateLimitError,), stop_after_attempt=3
+    )
+    return {
+        "pinned": pinned,
+        "fallback": router(hedge=False, cheap=False),
+        "hedged": router(hedge=True, cheap=False),
+        "hedged_cheap": router(hedge=True, cheap=True),
+    }
+
+
+def hedges() -> int:
+    return sum(int(router_hedges.value(model=name)) for name in MODELS)
+
+
+async def run(model: RoutedModel, args: argparse.Namespace) -> dict[str, float]:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def request(idx: int) -> None:
+        nonlocal errors
+        # every other turn is a short message the cheap model may answer
+        message = "Thanks!" if idx % 2 else LONG_QUESTION
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await model.ainvoke([HumanMessage(content=message)])
+            except FakeRateLimitError:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(request(idx) for idx in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    cut_points = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(cut_points[94] * 1000, 1),
+        "p99_ms": round(cut_points[98] * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+        "errors": errors,
+        "requests_per_second": round(args.requests / elapsed, 1),
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    for name, model in scenarios(args).items():
+        hedges_before = hedges()
+        result = await run(model, args)
+        print(
+            json.dumps(
+                {
+                    "benchmark": "model_routing",
+                    "scenario": name,
+                    "requests": args.requests,
+                    **result,
+                    "hedged": hedges() - hedges_before,
+                }
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--tail-latency", type=float, default=1.0)
+    parser.add_argument("--tail-probability", type=float, default=0.02)
+    parser.add_argument("--rate-limit", type=float, default=0.03)
+    parser.add_argument("--cooldown", type=float, default=0.2)
+    # fallbacks are logged as warnings, one per failed request
+    logging.getLogger("app.routing").setLevel(logging.ERROR)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,145 @@
+"""Frames, CPU time and time to first token of streamed replies.
+
+Replies of ``--words`` words are streamed from a fake model through
+``Agent.stream``, ``--concurrency`` conversations at a time, to a fake
+client socket that encodes each frame as a Socket.IO event, like Chainlit's
+``stream_token``, and takes ``--send-latency`` seconds to send it. Each
+token is sent as its own frame, as before, or coalesced by
+``TokenCoalescer``.
+Results are printed one JSON object per line::
+
+    python -m benchmarks.streaming_bench --replies 200 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+import typing
+import uuid
+from pathlib import Path
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.agent import Agent
+from app.fakes import FakeChatModel, FakeEmbeddings, FakeMemory
+from app.knowledge_base import KnowledgeBaseIndex
+from app.streaming import TokenCoalescer
+
+
+def build_agent(args: argparse.Namespace) -> tuple[Agent, FakeMemory]:
+    memory = FakeMemory()
+    llm = FakeChatModel(
+        reply=" ".join(f"word{idx}" for idx in range(args.words)),
+        latency=args.llm_latency,
+        token_latency=args.token_latency,
+    )
+    knowledge_base = KnowledgeBaseIndex(
+        Path(tempfile.mkdtemp()), FakeEmbeddings(size=32), "fake"
+    )
+    return Agent(llm, MemorySaver(), memory, knowledge_base), memory
+
+
+async def send(message_id: str, token: str, latency: float) -> None:
+    """The client socket, encoding frames as Chainlit does."""
+    payload = {"id": message_id, "token": token, "isSequence": False, "isInput": False}
+    packet = "42" + json.dumps(["stream_token", payload], separators=(",", ":"))
+    packet.encode()
+    await asyncio.sleep(latency)
+
+
+async def reply(
+    agent: Agent,
+    memory: FakeMemory,
+    coalescer: TokenCoalescer | None,
+    args: argparse.Namespace,
+) -> tuple[float, int]:
+    config = RunnableConfig(
+        configurable=dict(
+            thread_id=uuid.uuid4().hex,
+            user_id=uuid.uuid4().hex,
+            memory_store=memory,
+            model="fake",
+        )
+    )
+    started = time.perf_counter()
+    first_token = 0.0
+    frames = 0
+    tokens: typing.AsyncIterator[str] = agent.stream("Tell me a story", config)
+    if coalescer is not None:
+        tokens = coalescer.coalesce(tokens)
+    message_id = uuid.uuid4().hex
+    async for token in tokens:
+        if not frames:
+            first_token = time.perf_counter() - started
+        frames += 1
+        await send(message_id, token, args.send_latency)
+    return first_token, frames
+
+
+async def run(
+    agent: Agent,
+    memory: FakeMemory,
+    coalescer: TokenCoalescer | None,
+    args: argparse.Namespace,
+) -> dict[str, float]:
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited() -> tuple[float, int]:
+        async with semaphore:
+            return await reply(agent, memory, coalescer, args)
+
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    results = await asyncio.gather(*(limited() for _ in range(args.replies)))
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    first_tokens = sorted(first_token for first_token, _ in results)
+    return {
+        "frames_per_reply": round(statistics.fmean(f for _, f in results), 1),
+        "ttft_p50_ms": round(statistics.median(first_tokens) * 1000, 2),
+        "ttft_p95_ms": round(first_tokens[int(len(first_tokens) * 0.95)] * 1000, 2),
+        "cpu_ms_per_reply": round(cpu / args.replies * 1000, 2),
+        "replies_per_second": round(args.replies / elapsed, 1),
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    agent, memory = build_agent(args)
+    scenarios = {
+        "per_token": None,
+        "coalesced": TokenCoalescer(
+            max_delay=args.frame_delay, max_chars=args.frame_chars
+        ),
+    }
+    # warm up the graph and the model
+    await run(agent, memory, None, argparse.Namespace(**{**vars(args), "replies": 2}))
+    for name, coalescer in scenarios.items():
+        result = await run(agent, memory, coalescer, args)
+        print(
+            json.dumps(
+                {
+                    "benchmark": "streaming",
+                    "scenario": name,
+                    "replies": args.replies,
+                    "words": args.words,
+                    **result,
+                }
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--replies", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--words", type=int, default=300)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--token-latency", type=float, default=0.002)
+    parser.add_argument("--send-latency", type=float, default=0.001)
+    parser.add_argument("--frame-delay", type=float, default=0.03)
+    parser.add_argument("--frame-chars", type=int, default=64)
+    asyncio.run(main(parser.parse_args()))
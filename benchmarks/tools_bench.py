@@ -0,0 +1,137 @@
+"""Latency of a turn calling several tools: sequential vs concurrent tool node.
+
+The model requests ``search_memory``, ``company_knowledge_base`` and
+``get_customer_info`` in one message. The sequential baseline runs the calls
+one after another, the ``ConcurrentToolNode`` runs them together, and a last
+run makes mem0 slower than its timeout to show the other tools are not held
+up. Results are printed one JSON object per line::
+
+    python -m benchmarks.tools_bench --memory-latency 0.2 --embed-latency 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+import typing
+import uuid
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.agent import Agent
+from app.fakes import FakeChatModel, FakeEmbeddings, FakeMemory
+from app.knowledge_base import KnowledgeBaseIndex
+from app.tools import AgentToolkit, ConcurrentToolNode
+
+TOOL_CALLS = [
+    {"name": "search_memory", "args": {"query": "preferences"}},
+    {"name": "company_knowledge_base", "args": {"query": "shipping"}},
+    {"name": "get_customer_info", "args": {"customer_id": "123"}},
+]
+
+
+def tool_message(calls: list[dict[str, typing.Any]]) -> AIMessage:
+    return AIMessage(
+        content="",
+        tool_calls=[{**call, "id": f"call_{idx}"} for idx, call in enumerate(calls)],
+    )
+
+
+def new_config(memory: FakeMemory) -> RunnableConfig:
+    return RunnableConfig(
+        configurable=dict(
+            thread_id=uuid.uuid4().hex,
+            user_id="123",
+            memory_store=memory,
+            model="fake",
+        )
+    )
+
+
+async def time_it(
+    func: typing.Callable[[], typing.Awaitable[typing.Any]], repeat: int
+) -> tuple[list[float], typing.Any]:
+    latencies = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = await func()
+        latencies.append(time.perf_counter() - started)
+    return latencies, result
+
+
+def report(name: str, latencies: list[float], **extra: typing.Any) -> None:
+    print(
+        json.dumps(
+            {
+                "benchmark": "tools",
+                "mode": name,
+                "p50_ms": round(statistics.median(latencies) * 1000, 2),
+                "max_ms": round(max(latencies) * 1000, 2),
+                **extra,
+            }
+        )
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    embeddings = FakeEmbeddings(size=64)
+    knowledge_base = KnowledgeBaseIndex(Path(tempfile.mkdtemp()), embeddings, "fake")
+    llm = FakeChatModel(latency=args.llm_latency, tool_calls=TOOL_CALLS)
+    tools = AgentToolkit(llm=llm, knowledge_base=knowledge_base).get_tools()
+    memory = FakeMemory(latency=args.memory_latency)
+    embeddings.latency = args.embed_latency
+    message = tool_message(TOOL_CALLS)
+    config = new_config(memory)
+
+    node = ConcurrentToolNode(tools, default_timeout=None)
+    tools_by_name = node.tools_by_name
+
+    async def sequential() -> list[ToolMessage]:
+        return [
+            await tools_by_name[call["name"]].ainvoke(
+                {**call, "type": "tool_call"}, config
+            )
+            for call in message.tool_calls
+        ]
+
+    async def concurrent() -> typing.Any:
+        return await node.ainvoke({"messages": [message]}, config)
+
+    latencies, _ = await time_it(sequential, args.repeat)
+    report("sequential", latencies)
+    latencies, _ = await time_it(concurrent, args.repeat)
+    report("concurrent", latencies)
+
+    # mem0 slower than its timeout: the other tools still answer in time
+    memory.latency = args.slow_memory_latency
+    bounded = ConcurrentToolNode(tools, timeouts={"search_memory": args.timeout})
+    latencies, result = await time_it(
+        lambda: bounded.ainvoke({"messages": [message]}, config), args.repeat
+    )
+    statuses = {msg.name: msg.status for msg in result["messages"]}
+    report("concurrent_with_timeout", latencies, statuses=statuses)
+    memory.latency = args.memory_latency
+
+    # end to end: model call, the three tools, then the final answer
+    agent = Agent(llm, MemorySaver(), memory, knowledge_base)
+    latencies, _ = await time_it(
+        lambda: agent.invoke("Where is my order?", new_config(memory)), args.repeat
+    )
+    report("agent_turn", latencies, llm_latency_ms=args.llm_latency * 1000)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=0.1)
+    parser.add_argument("--memory-latency", type=float, default=0.2)
+    parser.add_argument("--slow-memory-latency", type=float, default=2.0)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=0.5)
+    asyncio.run(main(parser.parse_args()))
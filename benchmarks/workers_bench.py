@@ -0,0 +1,197 @@
+"""Throughput of several worker processes serving the same conversations.
+
+Each worker process builds its own agent with a fake model, on the SQLite
+checkpoints and the SQLite memory store of ``MULTI_WORKER`` mode, with
+fake mem0 embeddings and LLM. ``--conversations`` conversations of
+``--turns`` turns are replayed in rounds: every round sends each
+conversation's next turn to whichever worker picks it up, so consecutive
+turns of a thread run in different processes. Afterwards every thread's
+history, the messages handed to mem0 and every user's memories are checked
+for lost or duplicated turns. Results are printed one JSON object per line::
+
+    python -m benchmarks.workers_bench --workers 1 2 4
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+import typing
+from pathlib import Path
+
+from langchain_core.runnables import RunnableConfig
+
+from app.agent import Agent
+from app.checkpoint import SQLiteCheckpointSaver
+from app.sqlite import ConnectionPool
+
+_agent: Agent | None = None
+_memory: typing.Any = None
+_handed_to_mem0 = 0
+
+
+def init_worker(args: dict[str, typing.Any]) -> None:
+    """Build the worker's agent from the shared stores, like ``main`` does."""
+    global _agent, _memory
+    # settings are read from the environment set by `main`
+    from app import utils
+    from app.config import settings
+    from app.embeddings import Mem0Embedder
+    from app.fakes import FakeChatModel, FakeEmbeddings, FakeMem0LLM
+    from app.knowledge_base import KnowledgeBaseIndex
+
+    memory = utils.get_memory()
+    memory.embedding_model = Mem0Embedder(
+        FakeEmbeddings(size=settings.memory_embedding_dims)
+    )
+    memory.llm = FakeMem0LLM(facts=args["facts"])
+    add = memory.add
+
+    def counted_add(messages: list[typing.Any], **kwargs: typing.Any) -> typing.Any:
+        global _handed_to_mem0
+        _handed_to_mem0 += len(messages)
+        return add(messages, **kwargs)
+
+    memory.add = counted_add
+    _memory = memory
+
+    checkpoint = SQLiteCheckpointSaver(
+        ConnectionPool(settings.checkpoint_db_path, size=settings.checkpoint_pool_size)
+    )
+    knowledge_base = KnowledgeBaseIndex(
+        Path(tempfile.mkdtemp()), FakeEmbeddings(size=32), "fake"
+    )
+    llm = FakeChatModel(latency=args["llm_latency"])
+    _agent = Agent(llm, checkpoint, memory, knowledge_base)
+
+
+def ready(_: int) -> int:
+    time.sleep(0.2)
+    return os.getpid()
+
+
+def run_turns(batch: list[str], turn: int) -> tuple[list[float], int, int]:
+    """Send the ``turn``-th message of each conversation in ``batch``."""
+    from app import memory as memory_ingestion
+
+    agent = typing.cast(Agent, _agent)
+
+    async def run() -> list[float]:
+        async def send(conversation: str) -> float:
+            config = RunnableConfig(
+                configurable=dict(
+                    thread_id=conversation,
+                    user_id=conversation,
+                    memory_store=_memory,
+                    model="fake",
+                )
+            )
+            started = time.perf_counter()
+            await agent.invoke(f"Message {turn}: I live in Lisbon.", config)
+            return time.perf_counter() - started
+
+        latencies = await asyncio.gather(*(send(c) for c in batch))
+        # the next turn may run in another worker
+        await memory_ingestion.shutdown()
+        return list(latencies)
+
+    latencies = asyncio.run(run())
+    return latencies, os.getpid(), _handed_to_mem0
+
+
+def check(path: Path, conversations: list[str], turns: int) -> dict[str, int]:
+    """Count threads and users whose history or memories are off."""
+    checkpoint = SQLiteCheckpointSaver(ConnectionPool(path / "checkpoints.sqlite"))
+    bad_threads = 0
+    for conversation in conversations:
+        saved = checkpoint.get_tuple(
+            RunnableConfig(configurable={"thread_id": conversation})
+        )
+        messages = saved.checkpoint["channel_values"]["messages"] if saved else []
+        bad_threads += len(messages) != 2 * turns
+
+    with sqlite3.connect(path / "memory" / "memory.sqlite") as conn:
+        counts = dict(
+            conn.execute(
+                "SELECT user_id, COUNT(*) FROM memory_vectors GROUP BY user_id"
+            ).fetchall()
+        )
+    return {
+        "bad_threads": bad_threads,
+        "users_with_memories": len(counts),
+        "memories": sum(counts.values()),
+    }
+
+
+def run(args: argparse.Namespace, workers: int) -> dict[str, typing.Any]:
+    path = Path(tempfile.mkdtemp())
+    os.environ.update(
+        MULTI_WORKER="true",
+        CHECKPOINT_DB_PATH=str(path / "checkpoints.sqlite"),
+        MEMORY_DIR=str(path / "memory"),
+        MEMORY_DB_PATH=str(path / "memory" / "memory.sqlite"),
+        MEMORY_EMBEDDING_DIMS=str(args.dimensions),
+        # the OpenAI clients mem0 builds are replaced by fakes
+        OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "unused"),
+        LOG_LEVEL="WARNING",
+    )
+    conversations = [f"conversation-{idx}" for idx in range(args.conversations)]
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, init_worker, (vars(args),)) as pool:
+        pool.map(ready, range(workers * 4), chunksize=1)
+
+        latencies: list[float] = []
+        # conversation -> worker pids that served its turns
+        served: dict[str, list[int]] = {c: [] for c in conversations}
+        handed: dict[int, int] = {}
+        started = time.perf_counter()
+        for turn in range(args.turns):
+            # rotate the batches, so a thread's next turn goes to another batch
+            shifted = conversations[turn:] + conversations[:turn]
+            batches = [shifted[idx :: workers * 2] for idx in range(workers * 2)]
+            results = pool.starmap(
+                run_turns, [(batch, turn) for batch in batches], chunksize=1
+            )
+            for batch, (batch_latencies, pid, total) in zip(batches, results):
+                latencies.extend(batch_latencies)
+                handed[pid] = total
+                for conversation in batch:
+                    served[conversation].append(pid)
+        elapsed = time.perf_counter() - started
+
+    turns = args.conversations * args.turns
+    latencies.sort()
+    return {
+        "benchmark": "workers",
+        "workers": workers,
+        "turns": turns,
+        "turns_per_second": round(turns / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+        "threads_on_several_workers": sum(len(set(p)) > 1 for p in served.values()),
+        "messages_to_mem0": sum(handed.values()),
+        "expected_messages_to_mem0": 2 * turns,
+        "expected_memories": turns * args.facts,
+        **check(path, conversations, args.turns),
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    for workers in args.workers:
+        print(json.dumps(run(args, workers)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--conversations", type=int, default=64)
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--facts", type=int, default=2)
+    parser.add_argument("--dimensions", type=int, default=64)
+    main(parser.parse_args())
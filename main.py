@@ -1,21 +1,66 @@
+import contextlib
 import logging
 import typing
 
 import chainlit as cl
+import structlog
 from chainlit import ChatSettings, input_widget
+from chainlit.server import app
+from fastapi import FastAPI, Response
+from langchain_core.language_models import BaseChatModel
 from langchain_core.runnables import RunnableConfig
 from langgraph.checkpoint.base import BaseCheckpointSaver
-from langgraph.checkpoint.memory import MemorySaver
 from mem0 import Memory
 
-from app import logging_config, utils
+from app import instrumentation, logging_config
+from app import memory as memory_ingestion
+from app import utils
 from app.agent import Agent
+from app.checkpoint import SQLiteCheckpointSaver
+from app.config import settings
+from app.customers import get_customer_repository
+from app.http import get_http_clients
+from app.pool import AgentPool
+from app.recall import get_recall_cache
+from app.routing import RoutingChatModel
+from app.sqlite import ConnectionPool
+from app.streaming import get_token_coalescer
 from app.utils import load_chat_model
 
 logging_config.configure()
 
 logger = logging.getLogger(__name__)
 
+_chainlit_lifespan = app.router.lifespan_context
+
+
+@contextlib.asynccontextmanager
+async def lifespan(fastapi_app: FastAPI) -> typing.AsyncIterator[typing.Any]:
+    """Chainlit lifespan extended to export the graph and flush background work."""
+    async with _chainlit_lifespan(fastapi_app) as state:
+        if settings.export_graph_on_startup:
+            await utils.run_blocking(export_graph)
+        yield state
+    await memory_ingestion.shutdown()
+    await get_http_clients().aclose()
+
+
+app.router.lifespan_context = lifespan
+
+
+async def metrics() -> Response:
+    """Prometheus metrics of agent turns, nodes, tools and model calls."""
+    return Response(
+        instrumentation.registry.render(), media_type=instrumentation.CONTENT_TYPE
+    )
+
+
+if settings.metrics_enabled:
+    instrumentation.install_retry_counters()
+    app.add_api_route("/metrics", metrics, methods=["GET"], include_in_schema=False)
+    # chainlit serves its frontend from a catch-all route, which must come last
+    app.router.routes.insert(0, app.router.routes.pop())
+
 
 def get_settings() -> ChatSettings:
     return cl.ChatSettings(
@@ -23,11 +68,7 @@ def get_settings() -> ChatSettings:
             input_widget.Select(
                 id="Model",
                 label="LLM - Model",
-                values=[
-                    "openai:gpt-4o",
-                    "anthropic:claude-3-5-sonnet-20241022",
-                    "openai:gpt-4o-mini",
-                ],
+                values=settings.router_models,
                 initial_index=0,
             ),
             input_widget.Slider(
@@ -52,7 +93,15 @@ def get_settings() -> ChatSettings:
 
 @cl.cache
 def get_checkpoint() -> BaseCheckpointSaver[str]:
-    return MemorySaver()
+    pool = ConnectionPool(
+        settings.checkpoint_db_path, size=settings.checkpoint_pool_size
+    )
+    return SQLiteCheckpointSaver(
+        pool,
+        ttl=settings.checkpoint_ttl_seconds,
+        max_threads=settings.checkpoint_max_threads,
+        max_checkpoints_per_thread=settings.checkpoint_max_per_thread,
+    )
 
 
 @cl.cache
@@ -60,28 +109,60 @@ def get_memory() -> Memory:
     return utils.get_memory()
 
 
+def build_agent(model: str) -> Agent:
+    """Build the agent shared by every session chatting with ``model``."""
+    llm_model: BaseChatModel
+    if settings.router_enabled:
+        llm_model = RoutingChatModel.from_names(
+            model,
+            fallbacks=[name for name in settings.router_models if name != model],
+            cheap_model=settings.router_cheap_model,
+            temperature=settings.default_temperature,
+            max_tokens=settings.default_max_tokens,
+        )
+    else:
+        llm_model = load_chat_model(
+            fully_specified_name=model,
+            temperature=settings.default_temperature,
+            max_tokens=settings.default_max_tokens,
+        )
+    # load the tokenizer and open the shared recall generations and customer
+    # database with the agent, off the event loop and before a turn needs them
+    utils.get_token_counter(model)
+    get_recall_cache()
+    get_customer_repository()
+    return Agent(llm_model, get_checkpoint(), get_memory())
+
+
+agent_pool = AgentPool(
+    build_agent,
+    max_size=settings.agent_pool_max_size,
+    idle_ttl=settings.agent_pool_idle_seconds,
+)
+
+
+def export_graph() -> None:
+    """Render the graph of the default model's agent, once per process."""
+    try:
+        agent_pool.get(settings.default_model).export_graph()
+    except Exception:
+        # the default renderer calls a remote API, which must not stop startup
+        logger.exception("Could not export the agent graph")
+
+
 @cl.on_settings_update
 async def setup_agent(chat_settings: dict[str, typing.Any]) -> None:
     logger.info("Setting up agent with following settings:\n %s", chat_settings)
-    llm_model = load_chat_model(
-        fully_specified_name=chat_settings["Model"],
-        temperature=chat_settings["Temperature"],
-        max_tokens=chat_settings["MaximumTokens"],
-    )
-    checkpoint_memory = cl.user_session.get(
-        "checkpoint_memory", default=get_checkpoint()
-    )
+    # temperature and max tokens are applied per request, only a new model
+    # builds an agent, off the event loop
+    await utils.run_blocking(agent_pool.get, chat_settings["Model"])
     cl.user_session.set("model", chat_settings["Model"])
-
-    memory = cl.user_session.get("memory", default=get_memory())
-
-    agent = Agent(llm_model, checkpoint_memory, memory)
-    cl.user_session.set("agent", agent)
+    cl.user_session.set("temperature", chat_settings["Temperature"])
+    cl.user_session.set("max_tokens", int(chat_settings["MaximumTokens"]))
 
 
 @cl.on_chat_start
 async def on_chat_start() -> None:
-    cl.user_session.set("memory", get_memory())
     chat_settings = await get_settings().send()
     await setup_agent(chat_settings)
 
@@ -110,11 +191,16 @@ async def set_starters():
 
 @cl.on_message
 async def main(message: cl.Message) -> None:
-    agent = typing.cast(Agent, cl.user_session.get("agent"))
-    chat_model = typing.cast(str, cl.user_session.get("model"))
-    memory = typing.cast(Memory, cl.user_session.get("memory", default=get_memory()))
+    # the session only holds the chat settings, with defaults for sessions
+    # another worker started, the rest is rebuilt from the shared stores
+    chat_model = typing.cast(
+        str, cl.user_session.get("model") or settings.default_model
+    )
+    agent = await utils.run_blocking(agent_pool.get, chat_model)
+    memory = get_memory()
 
-    user_id = "123"
+    user = cl.user_session.get("user")
+    user_id = user.identifier if user else settings.default_user_id
     cb = cl.AsyncLangchainCallbackHandler()
 
     config = RunnableConfig(
@@ -123,11 +209,20 @@ async def main(message: cl.Message) -> None:
             user_id=user_id,
             memory_store=memory,
             model=chat_model,
+            temperature=cl.user_session.get("temperature"),
+            max_tokens=cl.user_session.get("max_tokens"),
         ),
-        callbacks=[cb],
+        callbacks=[cb, instrumentation.InstrumentationHandler()],
     )
     response = cl.Message(content="")
-    async for event in agent.stream(message.content, config):
-        # Send a response back to the user
-        await response.stream_token(event)
+    with structlog.contextvars.bound_contextvars(
+        thread_id=message.thread_id, user_id=user_id, model=chat_model
+    ):
+        tokens = agent.stream(message.content, config)
+        if settings.stream_coalesce_enabled:
+            # one websocket frame per batch of tokens rather than per token
+            tokens = get_token_coalescer().coalesce(tokens)
+        async for event in tokens:
+            # Send a response back to the user
+            await response.stream_token(event)
     await response.send()
@@ -0,0 +1,68 @@
+import asyncio
+import uuid
+from pathlib import Path
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.memory import MemorySaver
+
+from app import memory as memory_ingestion
+from app.agent import Agent
+from app.config import settings
+from app.fakes import FakeChatModel, FakeMemory
+from app.knowledge_base import KnowledgeBaseIndex
+
+
+@pytest.fixture
+def memory() -> FakeMemory:
+    return FakeMemory()
+
+
+@pytest.fixture
+def agent(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, memory: FakeMemory) -> Agent:
+    monkeypatch.setattr(settings, "semantic_cache_enabled", True)
+    monkeypatch.setattr(settings, "recall_memory_enabled", True)
+    llm = FakeChatModel(
+        tool_calls=[{"name": "company_knowledge_base", "args": {"query": "returns"}}]
+    )
+    knowledge_base = KnowledgeBaseIndex(
+        tmp_path, DeterministicFakeEmbedding(size=16), "fake"
+    )
+    return Agent(llm, MemorySaver(), memory, knowledge_base)
+
+
+def ask(agent: Agent, memory: FakeMemory, user_id: str) -> None:
+    config = RunnableConfig(
+        configurable=dict(
+            thread_id=uuid.uuid4().hex,
+            user_id=user_id,
+            memory_store=memory,
+            model="fake",
+        )
+    )
+
+    async def turn() -> None:
+        await agent.invoke("What is your return policy?", config)
+        await memory_ingestion.shutdown()
+
+    asyncio.run(turn())
+
+
+def test_knowledge_base_answers_are_cached(agent: Agent, memory: FakeMemory) -> None:
+    ask(agent, memory, user_id=uuid.uuid4().hex)
+
+    assert agent.cache is not None
+    assert agent.cache.stats()["entries"] == 1
+
+
+def test_answers_with_recalled_memories_are_not_cached(
+    agent: Agent, memory: FakeMemory
+) -> None:
+    user_id = uuid.uuid4().hex
+    memory.memories[user_id] = ["Lives at 12 Baker Street"]
+
+    ask(agent, memory, user_id)
+
+    assert agent.cache is not None
+    assert agent.cache.stats()["entries"] == 0
@@ -0,0 +1,148 @@
+import sqlite3
+import typing
+import uuid
+from pathlib import Path
+
+import pytest
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import END, START, MessagesState, StateGraph
+from langgraph.graph.state import CompiledStateGraph
+
+from app.checkpoint import SQLiteCheckpointSaver
+from app.sqlite import ConnectionPool
+
+
+def build_graph(saver: SQLiteCheckpointSaver) -> CompiledStateGraph:
+    def reply(state: MessagesState) -> dict[str, typing.Any]:
+        return {"messages": [AIMessage(f"Reply {len(state['messages'])}")]}
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("reply", reply)
+    graph.add_edge(START, "reply")
+    graph.add_edge("reply", END)
+    return graph.compile(checkpointer=saver)
+
+
+def saver_at(path: Path, **kwargs: typing.Any) -> SQLiteCheckpointSaver:
+    return SQLiteCheckpointSaver(ConnectionPool(path / "checkpoints.sqlite"), **kwargs)
+
+
+def config_for(thread_id: str) -> RunnableConfig:
+    return RunnableConfig(configurable={"thread_id": thread_id})
+
+
+def chat(graph: CompiledStateGraph, thread_id: str, turns: int) -> None:
+    for turn in range(turns):
+        graph.invoke(
+            {"messages": [HumanMessage(f"Message {turn}")]}, config_for(thread_id)
+        )
+
+
+def count(path: Path, table: str, thread_id: str) -> int:
+    with sqlite3.connect(path / "checkpoints.sqlite") as conn:
+        return int(
+            conn.execute(
+                f"SELECT COUNT(*) FROM {table} WHERE thread_id = ?", (thread_id,)
+            ).fetchone()[0]
+        )
+
+
+def test_history_survives_a_new_saver(tmp_path: Path) -> None:
+    chat(build_graph(saver_at(tmp_path)), "thread", turns=6)
+
+    graph = build_graph(saver_at(tmp_path))
+    messages = graph.get_state(config_for("thread")).values["messages"]
+    assert [m.content for m in messages[-2:]] == ["Message 5", "Reply 11"]
+
+    chat(graph, "thread", turns=1)
+    messages = graph.get_state(config_for("thread")).values["messages"]
+    assert len(messages) == 14
+    assert messages[-1].content == "Reply 13"
+
+
+def test_only_new_messages_are_serialized(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    saver = saver_at(tmp_path)
+    graph = build_graph(saver)
+    chat(graph, "thread", turns=5)
+
+    dumped: list[BaseMessage] = []
+    dumps_typed = saver.serde.dumps_typed
+
+    def counting_dumps(value: typing.Any) -> tuple[str, bytes]:
+        if isinstance(value, BaseMessage):
+            dumped.append(value)
+        return dumps_typed(value)
+
+    monkeypatch.setattr(saver.serde, "dumps_typed", counting_dumps)
+    chat(graph, "thread", turns=1)
+
+    assert [m.content for m in dumped] == ["Message 0", "Reply 11"]
+
+
+def test_pruning_keeps_recent_checkpoints(tmp_path: Path) -> None:
+    graph = build_graph(saver_at(tmp_path, max_checkpoints_per_thread=4, prune_batch=3))
+    chat(graph, "thread", turns=10)
+
+    # every turn writes 3 checkpoints: input, start and the reply
+    assert count(tmp_path, "checkpoints", "thread") < 4 + 3
+    saver = saver_at(tmp_path)
+    latest, *older = saver.list(config_for("thread"), limit=3)
+    assert len(older) == 2
+    before = saver.list(config_for("thread"), before=latest.config, limit=2)
+    assert [t.config for t in before] == [t.config for t in older]
+    messages = latest.checkpoint["channel_values"]["messages"]
+    assert len(messages) == 20
+    # messages of pruned checkpoints are still referenced by the latest one
+    assert count(tmp_path, "messages", "thread") == 20
+
+
+def test_put_writes_are_returned_as_pending(tmp_path: Path) -> None:
+    saver = saver_at(tmp_path)
+    chat(build_graph(saver), "thread", turns=1)
+    latest = saver.get_tuple(config_for("thread"))
+    assert latest is not None
+
+    saver.put_writes(latest.config, [("messages", ["pending"])], task_id="task")
+
+    reloaded = saver_at(tmp_path).get_tuple(latest.config)
+    assert reloaded is not None
+    assert reloaded.pending_writes == [("task", "messages", ["pending"])]
+
+
+def test_idle_and_least_recent_threads_are_evicted(tmp_path: Path) -> None:
+    saver = saver_at(tmp_path, ttl=60, max_threads=2, eviction_interval=1)
+    graph = build_graph(saver)
+    threads = [uuid.uuid4().hex for _ in range(4)]
+    chat(graph, threads[0], turns=1)
+    with sqlite3.connect(tmp_path / "checkpoints.sqlite") as conn:
+        conn.execute(
+            "UPDATE threads SET last_access = 0 WHERE thread_id = ?", (threads[0],)
+        )
+    for thread_id in threads[1:]:
+        chat(graph, thread_id, turns=1)
+
+    # the first expired, the second was the least recently written of the rest
+    assert [count(tmp_path, "checkpoints", t) > 0 for t in threads] == [
+        False,
+        False,
+        True,
+        True,
+    ]
+    assert count(tmp_path, "messages", threads[0]) == 0
+    assert saver.get_tuple(config_for(threads[1])) is None
+
+
+def test_messages_updated_by_id_are_stored_again(tmp_path: Path) -> None:
+    graph = build_graph(saver_at(tmp_path))
+    chat(graph, "thread", turns=2)
+    first = graph.get_state(config_for("thread")).values["messages"][0]
+
+    graph.update_state(
+        config_for("thread"), {"messages": [HumanMessage("Edited", id=first.id)]}
+    )
+
+    state = build_graph(saver_at(tmp_path)).get_state(config_for("thread"))
+    assert state.values["messages"][0].content == "Edited"
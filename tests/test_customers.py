@@ -0,0 +1,57 @@
+import asyncio
+
+from app.customers import CachedCustomerRepository, CustomerRepository
+
+
+class CountingRepository(CustomerRepository):
+    def __init__(self, records: dict[str, str]) -> None:
+        self.records = records
+        self.lookups: list[str] = []
+
+    async def get(self, customer_id: str) -> str | None:
+        self.lookups.append(customer_id)
+        return self.records.get(customer_id)
+
+
+def lookup(repository: CustomerRepository, *customer_ids: str) -> list[str | None]:
+    async def run() -> list[str | None]:
+        return [await repository.get(customer_id) for customer_id in customer_ids]
+
+    return asyncio.run(run())
+
+
+def test_records_and_unknown_ids_are_cached() -> None:
+    backend = CountingRepository({"123": '{"name":"Alice"}'})
+    cache = CachedCustomerRepository(backend)
+
+    assert lookup(cache, "123", "999", "123", "999") == [
+        '{"name":"Alice"}',
+        None,
+        '{"name":"Alice"}',
+        None,
+    ]
+    assert backend.lookups == ["123", "999"]
+    assert cache.stats() == {"entries": 2, "hits": 2, "misses": 2}
+
+
+def test_expired_entries_are_looked_up_again() -> None:
+    backend = CountingRepository({"123": '{"name":"Alice"}'})
+    cache = CachedCustomerRepository(backend, ttl=0)
+
+    lookup(cache, "123")
+    backend.records["123"] = '{"name":"Alice Smith"}'
+
+    assert lookup(cache, "123") == ['{"name":"Alice Smith"}']
+    assert backend.lookups == ["123", "123"]
+
+
+def test_least_recently_used_entries_are_evicted() -> None:
+    backend = CountingRepository({"1": "a", "2": "b", "3": "c"})
+    cache = CachedCustomerRepository(backend, max_entries=2)
+
+    # "1" is used again, so "2" is the least recently used when "3" is added
+    lookup(cache, "1", "2", "1", "3")
+    backend.lookups.clear()
+    lookup(cache, "1", "3", "2")
+
+    assert backend.lookups == ["2"]
@@ -0,0 +1,92 @@
+from pathlib import Path
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.ingestion import KnowledgeBaseIngestor, Source
+from app.knowledge_base import KnowledgeBaseIndex
+from app.vector_index import IndexSpec
+
+
+def documents(prefix: str, count: int) -> list[Source]:
+    return [
+        (f"{prefix}-{idx}", [Document(page_content=f"{prefix} document {idx}")])
+        for idx in range(count)
+    ]
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "ivf_pq", "hnsw"])
+def test_search_after_deleting_documents(tmp_path: Path, index_type: str) -> None:
+    embeddings = DeterministicFakeEmbedding(size=16)
+    spec = IndexSpec(
+        type=index_type,  # type: ignore[arg-type]
+        min_vectors=100,
+        nlist=4,
+        # fine enough codes for exact results on this small collection
+        pq_m=16,
+        pq_nbits=6,
+    )
+    ingestor = KnowledgeBaseIngestor(
+        tmp_path / "ingested", embeddings, "fake", index_spec=spec
+    )
+    sources = documents("old", 400)
+    ingestor.ingest(sources)
+    # drop every other document, then add documents after the deletions
+    kept = sources[1::2]
+    assert ingestor.ingest(kept, prune=True).chunks_deleted == 200
+    kept += documents("new", 50)
+    ingestor.ingest(kept)
+    ingestor.close()
+
+    kb_index = KnowledgeBaseIndex(tmp_path / "kb", embeddings, "fake", spec)
+    store = kb_index.load_ingested(tmp_path / "ingested")
+    assert store is not None
+    assert store.index.ntotal == len(kept)
+    for _, (doc,) in kept:
+        (found,) = store.similarity_search(doc.page_content, k=1)
+        assert found.page_content == doc.page_content
+
+
+def test_pruning_a_source_keeps_identical_chunks_of_others(tmp_path: Path) -> None:
+    embeddings = DeterministicFakeEmbedding(size=16)
+    ingestor = KnowledgeBaseIngestor(tmp_path / "ingested", embeddings, "fake")
+    text = "Returns are accepted within 30 days."
+    ingestor.ingest(
+        [
+            ("faq.md", [Document(page_content=text, metadata={"source": "faq.md"})]),
+            (
+                "policy.md",
+                [Document(page_content=text, metadata={"source": "policy.md"})],
+            ),
+        ]
+    )
+    stats = ingestor.ingest(
+        [
+            (
+                "policy.md",
+                [Document(page_content=text, metadata={"source": "policy.md"})],
+            )
+        ],
+        prune=True,
+    )
+    ingestor.close()
+
+    assert stats.sources_deleted == 1
+    kb_index = KnowledgeBaseIndex(tmp_path / "kb", embeddings, "fake")
+    store = kb_index.load_ingested(tmp_path / "ingested")
+    assert store is not None
+    (found,) = store.similarity_search(text, k=2)
+    assert found.metadata["source"] == "policy.md"
+
+
+def test_unchanged_corpus_does_not_load_the_index(tmp_path: Path) -> None:
+    embeddings = DeterministicFakeEmbedding(size=16)
+    sources = documents("doc", 10)
+    KnowledgeBaseIngestor(tmp_path, embeddings, "fake").ingest(sources)
+
+    ingestor = KnowledgeBaseIngestor(tmp_path, embeddings, "fake")
+    stats = ingestor.ingest(sources, prune=True)
+
+    assert stats.unchanged == 10
+    assert ingestor._store is None
@@ -0,0 +1,43 @@
+from pathlib import Path
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.knowledge_base import KnowledgeBaseIndex
+
+DOCS = [Document("Returns are accepted within 30 days.", metadata={"id": 1})]
+
+
+def index(path: Path) -> KnowledgeBaseIndex:
+    return KnowledgeBaseIndex(path, DeterministicFakeEmbedding(size=16), "fake")
+
+
+def test_build_serves_the_index_another_worker_published(tmp_path: Path) -> None:
+    first, second = index(tmp_path), index(tmp_path)
+    first.load(DOCS)
+    key = second.content_hash(DOCS)
+    published = (tmp_path / key / "manifest.json").read_text()
+
+    # the second worker finished building the same corpus after the first
+    store = second._build(DOCS, tmp_path / key, key)
+
+    assert (
+        store.similarity_search("returns", k=1)[0].page_content == DOCS[0].page_content
+    )
+    assert [path.name for path in tmp_path.iterdir()] == [key]
+    # the published index is left alone, a reader may be loading it
+    assert (tmp_path / key / "manifest.json").read_text() == published
+
+
+def test_prune_keeps_indexes_of_other_workers(tmp_path: Path) -> None:
+    other = index(tmp_path)
+    other.load(DOCS)
+    new_docs = [Document("Shipping takes 2-3 days.", metadata={"id": 2})]
+    worker = index(tmp_path)
+    worker.load([Document("Old shipping policy.", metadata={"id": 3})])
+
+    worker.load(new_docs)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        [other.content_hash(DOCS), worker.content_hash(new_docs)]
+    )
@@ -0,0 +1,27 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app import instrumentation
+from app import memory as memory_ingestion
+from app.fakes import FakeMemory
+
+
+def test_queue_depth_and_lag_are_exported() -> None:
+    queue = memory_ingestion.get_ingestion_queue(FakeMemory(latency=0.2))
+    messages = [HumanMessage("I live in Lisbon", id="1"), AIMessage("Noted", id="2")]
+
+    async def run() -> tuple[float, float, float]:
+        queue.enqueue("alice", "thread", messages)
+        await asyncio.sleep(0.1)
+        depth = memory_ingestion.queue_depth.value()
+        lag = memory_ingestion.queue_lag.value()
+        await memory_ingestion.shutdown()
+        return depth, lag, memory_ingestion.queue_depth.value()
+
+    depth, lag, drained = asyncio.run(run())
+
+    assert depth == 1
+    assert lag >= 0.1
+    assert drained == 0
+    assert "agent_memory_queue_depth 0" in instrumentation.registry.render()
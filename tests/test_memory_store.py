@@ -0,0 +1,65 @@
+import uuid
+from pathlib import Path
+
+import pytest
+from qdrant_client import QdrantClient
+
+from app.memory_store import (
+    BatchingVectorStore,
+    SQLiteVectorStore,
+    UserPartitionedVectorStore,
+)
+from app.sqlite import ConnectionPool
+
+DIMS = 8
+
+
+@pytest.fixture(params=["qdrant", "sqlite"])
+def store(request: pytest.FixtureRequest, tmp_path: Path) -> BatchingVectorStore:
+    if request.param == "sqlite":
+        return SQLiteVectorStore(
+            ConnectionPool(tmp_path / "memory.sqlite"), "memories", DIMS
+        )
+    return UserPartitionedVectorStore(
+        QdrantClient(location=":memory:"), "memories", DIMS, on_disk=False
+    )
+
+
+def add(store: BatchingVectorStore, user_id: str, count: int) -> set[str]:
+    ids = [str(uuid.uuid4()) for _ in range(count)]
+    # every user's memories have the same vectors, only the user tells them apart
+    vectors = [[1.0 + idx] + [0.5] * (DIMS - 1) for idx in range(count)]
+    payloads = [
+        {"user_id": user_id, "data": f"{user_id} {idx}"} for idx in range(count)
+    ]
+    with store.batch(user_id):
+        store.insert(vectors, payloads, ids)
+    return set(ids)
+
+
+def test_search_only_returns_the_users_memories(store: BatchingVectorStore) -> None:
+    alice = add(store, "alice", 5)
+    bob = add(store, "bob", 5)
+
+    query = [1.0] * DIMS
+    alice_hits = store.search(query, limit=100, filters={"user_id": "alice"})
+    bob_hits = store.search(query, limit=100, filters={"user_id": "bob"})
+
+    assert {str(hit.id) for hit in alice_hits} == alice
+    assert {str(hit.id) for hit in bob_hits} == bob
+    assert all(hit.payload["user_id"] == "alice" for hit in alice_hits)
+    assert store.search(query, limit=100, filters={"user_id": "carol"}) == []
+
+
+def test_list_only_returns_the_users_memories(store: BatchingVectorStore) -> None:
+    alice = add(store, "alice", 3)
+    add(store, "bob", 3)
+
+    records, _ = store.list(filters={"user_id": "alice"})
+
+    assert {str(record.id) for record in records} == alice
+
+
+def test_batching_stores_must_implement_insert() -> None:
+    with pytest.raises(TypeError):
+        BatchingVectorStore()  # type: ignore[abstract]
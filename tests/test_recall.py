@@ -0,0 +1,24 @@
+import asyncio
+from pathlib import Path
+
+from app.recall import RecallCache, SharedGenerations
+from app.sqlite import ConnectionPool
+
+
+def test_memory_writes_invalidate_every_workers_cache(tmp_path: Path) -> None:
+    pool = ConnectionPool(tmp_path / "memory.sqlite")
+    # one cache per worker process, sharing the generations
+    first = RecallCache(generations=SharedGenerations(pool))
+    second = RecallCache(generations=SharedGenerations(pool))
+
+    async def run() -> tuple[list[str] | None, list[str] | None]:
+        generation = await first.ageneration("alice")
+        await first.aput("alice", "Where do I live?", ["Lives in Lisbon"], generation)
+        cached = await first.aget("alice", "where do I live")
+        await second.ainvalidate("alice")
+        return cached, await first.aget("alice", "where do I live")
+
+    cached, invalidated = asyncio.run(run())
+
+    assert cached == ["Lives in Lisbon"]
+    assert invalidated is None
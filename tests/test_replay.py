@@ -0,0 +1,71 @@
+import asyncio
+import json
+import typing
+from pathlib import Path
+
+from langchain_core.runnables import RunnableConfig
+from mem0 import Memory
+
+from app.agent import Agent
+from app.fakes import FakeMemory
+from app.replay import ReplayProgress, ReplayRunner, iter_conversations
+
+
+class ScriptedAgent:
+    """Answers every message, failing those listed in ``failing``."""
+
+    def __init__(self, failing: set[str]) -> None:
+        self.failing = failing
+        self.messages: list[str] = []
+
+    async def invoke(self, message: str, config: RunnableConfig) -> str:
+        self.messages.append(message)
+        if message in self.failing:
+            raise RuntimeError("model unavailable")
+        return f"answer to {message}"
+
+
+def replay(agent: ScriptedAgent, conversations: Path, output: Path) -> None:
+    runner = ReplayRunner(
+        typing.cast(Agent, agent),
+        typing.cast(Memory, FakeMemory()),
+        output,
+        run_id="test",
+        model="fake",
+        concurrency=4,
+    )
+    asyncio.run(runner.run(iter_conversations(conversations)))
+
+
+def test_failed_conversations_do_not_hold_back_the_watermark(tmp_path: Path) -> None:
+    output = tmp_path / "replay.jsonl"
+    records = [
+        {"index": 0, "turn": 0, "turns": 2, "error": None},
+        {"index": 0, "turn": 1, "turns": 2, "error": "RuntimeError()"},
+    ]
+    records += [
+        {"index": idx, "turn": 0, "turns": 1, "error": None} for idx in range(1, 1000)
+    ]
+    output.write_text("".join(json.dumps(record) + "\n" for record in records))
+
+    progress = ReplayProgress.load(output)
+
+    assert progress.answered(0) == 1
+    assert progress.answered(500) is None
+    assert progress.answered(1000) == 0
+    assert not progress._settled
+
+
+def test_resumed_replay_retries_failed_turns_only(tmp_path: Path) -> None:
+    conversations = tmp_path / "conversations.jsonl"
+    lines = [
+        {"id": f"c{idx}", "messages": [f"c{idx} hi", f"c{idx} bye"]} for idx in range(5)
+    ]
+    conversations.write_text("".join(json.dumps(line) + "\n" for line in lines))
+    output = tmp_path / "replay.jsonl"
+
+    replay(ScriptedAgent(failing={"c1 bye"}), conversations, output)
+    retry = ScriptedAgent(failing=set())
+    replay(retry, conversations, output)
+
+    assert retry.messages == ["c1 bye"]
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from app.routing import RouterStats, RoutingChatModel, has_credentials
+
+
+class AuthenticationError(Exception):
+    status_code = 401
+
+
+def router(primary_latency: float) -> RoutingChatModel:
+    async def primary(messages: list[BaseMessage]) -> AIMessageChunk:
+        await asyncio.sleep(primary_latency)
+        return AIMessageChunk(content="from primary")
+
+    async def backup(messages: list[BaseMessage]) -> AIMessageChunk:
+        raise AuthenticationError("invalid x-api-key")
+
+    return RoutingChatModel(
+        primary="fake:primary",
+        models={
+            "fake:primary": RunnableLambda(primary),
+            "fake:backup": RunnableLambda(backup),
+        },
+        fallbacks=["fake:backup"],
+        stats=RouterStats(hedge_after=0.05),
+    )
+
+
+def test_failed_hedge_waits_for_primary() -> None:
+    model = router(primary_latency=0.3)
+
+    reply = asyncio.run(model.ainvoke([HumanMessage(content="Hi")]))
+
+    assert reply.content == "from primary"
+
+
+def test_failed_hedge_waits_for_primary_stream() -> None:
+    model = router(primary_latency=0.3)
+
+    async def stream() -> str:
+        chunks = [chunk async for chunk in model.astream([HumanMessage("Hi")])]
+        return "".join(str(chunk.content) for chunk in chunks)
+
+    assert asyncio.run(stream()) == "from primary"
+
+
+def test_error_is_raised_once_no_attempt_remains() -> None:
+    model = router(primary_latency=0.01).model_copy(
+        update={"primary": "fake:backup", "fallbacks": []}
+    )
+
+    with pytest.raises(AuthenticationError):
+        asyncio.run(model.ainvoke([HumanMessage(content="Hi")]))
+
+
+def test_has_credentials(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+
+    assert not has_credentials("anthropic:claude-3-5-sonnet-20241022")
+    assert has_credentials("openai:gpt-4o")
+    assert has_credentials("ollama:llama3")
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import tool
+
+from app.tools import ConcurrentToolNode
+
+
+@tool
+async def slow_tool(seconds: float) -> str:
+    """Sleep for ``seconds``."""
+    await asyncio.sleep(seconds)
+    return "done"
+
+
+def run_tools(node: ConcurrentToolNode, *seconds: float) -> list[ToolMessage]:
+    message = AIMessage(
+        content="",
+        tool_calls=[
+            {"name": "slow_tool", "args": {"seconds": value}, "id": f"call_{idx}"}
+            for idx, value in enumerate(seconds)
+        ],
+    )
+    result = asyncio.run(node.ainvoke({"messages": [message]}))
+    return list(result["messages"])
+
+
+def test_tool_call_times_out() -> None:
+    # fails if langgraph stops calling the `_arun_one` hook
+    node = ConcurrentToolNode([slow_tool], timeouts={"slow_tool": 0.05})
+
+    started = time.perf_counter()
+    (message,) = run_tools(node, 5)
+
+    assert time.perf_counter() - started < 1
+    assert message.status == "error"
+    assert "timed out" in str(message.content)
+
+
+def test_tool_calls_are_bounded_by_concurrency() -> None:
+    node = ConcurrentToolNode([slow_tool], concurrency={"slow_tool": 1})
+
+    started = time.perf_counter()
+    messages = run_tools(node, 0.05, 0.05, 0.05)
+
+    assert time.perf_counter() - started >= 0.15
+    assert [message.content for message in messages] == ["done"] * 3
+
+
+def test_time_queued_for_the_tool_is_not_timed() -> None:
+    node = ConcurrentToolNode(
+        [slow_tool], timeouts={"slow_tool": 0.2}, concurrency={"slow_tool": 1}
+    )
+
+    # the last call waits 0.2s for the others, longer than its timeout
+    messages = run_tools(node, 0.1, 0.1, 0.1)
+
+    assert [message.content for message in messages] == ["done"] * 3